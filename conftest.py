@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# проект лежит в yatube/: плагин pytest подключается из приложения posts
+# pytester нужен тестам самого плагина
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'yatube')
+)
+
+pytest_plugins = ['posts.pytest_plugin', 'pytester']
+
+
+@pytest.fixture(autouse=True)
+def synchronous_thumbnails(settings):
+    # картинки тестов обрабатываются сразу, без пула потоков
+    settings.THUMBNAIL_ASYNC = False
@@ -0,0 +1,189 @@
+"""
+Версионированный JSON API лент только для чтения.
+
+Ответы собираются из строк .values(), без создания объектов моделей.
+Параметры: fields — поля через запятую, limit — размер страницы
+(не больше API_MAX_LIMIT), cursor — курсор из next/previous.
+"""
+from functools import wraps
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import require_safe
+
+from .caching import cached_feed, feed_condition
+from .models import TIMELINE_POSITION, Group, Post, TimelineEntry, User
+from .paginators import CursorPaginator
+
+# публичное имя поля → путь для .values()
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comments_count': 'comments_count',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'created': 'created',
+    'author': 'author__username',
+}
+JSON_PARAMS = {'ensure_ascii': False, 'separators': (',', ':')}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def error_response(message, status):
+    return JsonResponse(
+        {'error': message}, status=status, json_dumps_params=JSON_PARAMS
+    )
+
+
+def api_view(public=True):
+    """
+    Ошибки отдаются в JSON. Общие ленты кэшируются клиентами и
+    прокси на API_CACHE_MAX_AGE секунд, личные — только клиентом.
+    """
+    def decorator(view):
+        @require_safe
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            try:
+                response = view(request, *args, **kwargs)
+            except ApiError as error:
+                return error_response(str(error), error.status)
+            except Http404:
+                return error_response('Не найдено', 404)
+            if response.status_code in (200, 304):
+                if public:
+                    patch_cache_control(
+                        response, public=True,
+                        max_age=settings.API_CACHE_MAX_AGE
+                    )
+                else:
+                    patch_cache_control(response, private=True, max_age=0)
+                    patch_vary_headers(response, ['Cookie'])
+            return response
+        return wrapper
+    return decorator
+
+
+def selected_fields(request, available):
+    value = request.GET.get('fields')
+    if not value:
+        return list(available)
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ApiError('Неизвестные поля: {}'.format(', '.join(unknown)))
+    return names
+
+
+def page_limit(request):
+    try:
+        limit = int(request.GET.get('limit', settings.POSTS_PER_PAGE))
+    except ValueError:
+        raise ApiError('limit должен быть числом')
+    return max(1, min(limit, settings.API_MAX_LIMIT))
+
+
+def page_url(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return '{}?{}'.format(request.path, params.urlencode())
+
+
+def page_response(request, queryset, available, field, position=None):
+    """
+    Страница ленты с курсорами соседних страниц. Поля для курсора
+    (дата и id) читаются всегда, в ответ попадают только выбранные.
+    position — поля, по которым выбирается страница, если это не
+    field и id (лента подписок).
+    """
+    names = selected_fields(request, available)
+    if 'comments_count' in names:
+        queryset = queryset.with_comments_count()
+    paths = {available[name] for name in names} | {'id', field}
+    paginator = CursorPaginator(
+        queryset.values(*paths), page_limit(request),
+        key=itemgetter(field, 'id'), **(position or {'field': field})
+    )
+    page = paginator.get_page(request.GET.get('cursor'))
+    storage = Post._meta.get_field('image').storage
+    results = []
+    for row in page:
+        item = {name: row[available[name]] for name in names}
+        if item.get('image'):
+            item['image'] = storage.url(item['image'])
+        elif 'image' in item:
+            item['image'] = None
+        results.append(item)
+    return JsonResponse(
+        {
+            'results': results,
+            'next': page_url(request, page.next_cursor),
+            'previous': page_url(request, page.previous_cursor),
+        },
+        encoder=DjangoJSONEncoder,
+        json_dumps_params=JSON_PARAMS,
+    )
+
+
+@api_view()
+@feed_condition('index')
+@cached_feed('index')
+def posts(request):
+    return page_response(request, Post.objects.all(), POST_FIELDS, 'pub_date')
+
+
+@api_view()
+@feed_condition('group:{slug}')
+@cached_feed('group:{slug}')
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return page_response(
+        request, Post.objects.filter(group=group), POST_FIELDS, 'pub_date'
+    )
+
+
+@api_view()
+@feed_condition('profile:{username}')
+@cached_feed('profile:{username}')
+def profile_posts(request, username):
+    author = get_object_or_404(User, username=username)
+    return page_response(
+        request, Post.objects.filter(author=author), POST_FIELDS, 'pub_date'
+    )
+
+
+@api_view(public=False)
+def follow_posts(request):
+    if not request.user.is_authenticated:
+        raise ApiError('Нужна авторизация', 401)
+    TimelineEntry.objects.pull(request.user)
+    return page_response(
+        request, Post.objects.timeline(request.user), POST_FIELDS,
+        'pub_date', TIMELINE_POSITION
+    )
+
+
+@api_view()
+@feed_condition('post:{post_id}')
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    return page_response(
+        request, post.comments.all(), COMMENT_FIELDS, 'created'
+    )
@@ -0,0 +1,504 @@
+import copy
+import json
+import platform
+import random
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import (
+    DEFAULT_DB_ALIAS, DatabaseError, connection, connections, reset_queries,
+    transaction
+)
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from faker import Faker
+
+from .models import (
+    Comment, Follow, Group, Post, TimelineEntry, User, UserStats,
+    bulk_create_chunked, explicit_dates
+)
+from .recommendations import MILLION_EDGES_SECONDS, FollowGraph
+from .search import rebuild_index
+
+SCENARIOS = (
+    'index', 'group_posts', 'profile', 'post_view', 'follow_index',
+    'add_comment',
+)
+PERCENTILES = (50, 90, 95, 99)
+BATCH_SIZE = 2000
+
+# профили базы для прогона под конкурентной нагрузкой: прежние
+# настройки (журнал отката, соединение на каждый запрос) и текущая
+# конфигурация из окружения
+DATABASE_PROFILES = {
+    'baseline': {
+        'CONN_MAX_AGE': 0,
+        'PRAGMAS': {'journal_mode': 'DELETE', 'synchronous': 'FULL'},
+    },
+    'tuned': {},
+}
+# доли чтения ленты и записи комментариев
+LOAD_MIX = (('index', 4), ('add_comment', 1))
+# под нагрузкой меряется база, а не кэш лент
+NO_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+# задержки меряются на своём кэше в памяти процесса: cache.clear()
+# холодного режима не должен стирать общий кэш работающего сайта
+PRIVATE_CACHE = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark',
+    },
+}
+
+
+def _bulk(model, objects):
+    bulk_create_chunked(model.objects, objects, chunk_size=BATCH_SIZE)
+
+
+def zipf_sampler(rng, population):
+    """
+    Выбирает k разных элементов с весами по закону Ципфа: у немногих
+    авторов много записей и подписчиков, как в настоящем графе.
+    """
+    cum_weights, total = [], 0
+    for rank in range(1, len(population) + 1):
+        total += 1 / rank
+        cum_weights.append(total)
+
+    def sample(k):
+        chosen = set()
+        while len(chosen) < min(k, len(population)):
+            chosen.update(rng.choices(
+                population, cum_weights=cum_weights, k=k - len(chosen)
+            ))
+        return chosen
+    return sample
+
+
+def seed(users=2000, groups=1000, posts=200000, comments=200000,
+         follows=20, days=365, random_seed=42, stdout=None):
+    """
+    Заполняет базу синтетическими данными. При одинаковом random_seed
+    набор данных получается одинаковым. Производные таблицы (счётчики,
+    ленты, поисковый индекс) пересобираются в конце.
+    """
+    def log(message):
+        if stdout is not None:
+            stdout.write(message)
+
+    rng = random.Random(random_seed)
+    fake = Faker('ru_RU')
+    fake.seed_instance(random_seed)
+    now = timezone.now()
+    password = make_password(None)
+
+    def moment():
+        return now - timedelta(seconds=rng.randint(0, days * 24 * 3600))
+
+    log(f'Пользователи: {users}')
+    _bulk(User, (
+        User(
+            username=f'user{i}',
+            first_name=fake.first_name(),
+            last_name=fake.last_name(),
+            password=password,
+        )
+        for i in range(users)
+    ))
+    user_ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+
+    log(f'Сообщества: {groups}')
+    _bulk(Group, (
+        Group(
+            title=fake.sentence(nb_words=3)[:200],
+            slug=f'group-{i}',
+            description=fake.paragraph(),
+        )
+        for i in range(groups)
+    ))
+    group_ids = list(
+        Group.objects.order_by('pk').values_list('pk', flat=True)
+    )
+
+    log(f'Записи: {posts}')
+    authors = zipf_sampler(rng, rng.sample(user_ids, len(user_ids)))
+    with explicit_dates(Post._meta.get_field('pub_date')):
+        _bulk(Post, (
+            Post(
+                text=fake.paragraph(nb_sentences=rng.randint(1, 8)),
+                author_id=authors(1).pop(),
+                group_id=rng.choice(group_ids) if rng.random() < 0.7 else None,
+                pub_date=moment(),
+            )
+            for _ in range(posts)
+        ))
+    post_ids = list(Post.objects.order_by('pk').values_list('pk', flat=True))
+
+    log(f'Комментарии: {comments}')
+    with explicit_dates(Comment._meta.get_field('created')):
+        _bulk(Comment, (
+            Comment(
+                post_id=rng.choice(post_ids),
+                author_id=rng.choice(user_ids),
+                text=fake.sentence(),
+                created=moment(),
+            )
+            for _ in range(comments)
+        ))
+
+    log(f'Подписки: по {follows} на пользователя')
+    _bulk(Follow, (
+        Follow(user_id=user_id, author_id=author_id)
+        for user_id in user_ids
+        for author_id in authors(follows)
+        if author_id != user_id
+    ))
+
+    log('Счётчики, ленты и поисковый индекс')
+    UserStats.objects.rebuild()
+    TimelineEntry.objects.rebuild()
+    rebuild_index()
+
+
+def dataset_size():
+    return {
+        'users': User.objects.count(),
+        'groups': Group.objects.count(),
+        'posts': Post.objects.count(),
+        'comments': Comment.objects.count(),
+        'follows': Follow.objects.count(),
+    }
+
+
+class Sampler:
+    """Случайные, но воспроизводимые адреса для каждого сценария."""
+    def __init__(self, random_seed=42):
+        self.rng = random.Random(random_seed)
+        self.usernames = list(
+            User.objects.order_by('pk').values_list('username', flat=True)
+        )
+        self.slugs = list(
+            Group.objects.order_by('pk').values_list('slug', flat=True)
+        )
+        self.posts = list(
+            Post.objects.order_by('pk').values_list('author__username', 'pk')
+        )
+        self.followers = list(
+            Follow.objects.order_by('user_id')
+            .values_list('user__username', flat=True).distinct()
+        )
+        self.pages = max(1, min(len(self.posts) // 10, 20))
+
+    def fork(self, random_seed):
+        """Копия с собственным генератором для отдельного потока."""
+        sampler = copy.copy(self)
+        sampler.rng = random.Random(random_seed)
+        return sampler
+
+    def page(self):
+        return {'page': self.rng.randint(1, self.pages)}
+
+    def request(self, scenario):
+        """Пользователь (или None), метод, адрес и данные запроса."""
+        rng = self.rng
+        if scenario == 'index':
+            return None, 'get', reverse('index'), self.page()
+        if scenario == 'group_posts':
+            url = reverse('group_posts', args=[rng.choice(self.slugs)])
+            return None, 'get', url, self.page()
+        if scenario == 'profile':
+            url = reverse('profile', args=[rng.choice(self.usernames)])
+            return None, 'get', url, {}
+        if scenario == 'post_view':
+            url = reverse('post', args=rng.choice(self.posts))
+            return None, 'get', url, {}
+        if scenario == 'follow_index':
+            user = rng.choice(self.followers or self.usernames)
+            return user, 'get', reverse('follow_index'), self.page()
+        if scenario == 'add_comment':
+            url = reverse('add_comment', args=rng.choice(self.posts))
+            return (
+                rng.choice(self.usernames), 'post', url,
+                {'text': 'Комментарий из бенчмарка'}
+            )
+        raise ValueError(f'Неизвестный сценарий: {scenario}')
+
+
+def percentile(values, p):
+    """Перцентиль методом ближайшего ранга."""
+    values = sorted(values)
+    rank = max(1, -(-len(values) * p // 100))
+    return values[int(rank) - 1]
+
+
+def _client(username, clients):
+    if username not in clients:
+        client = Client()
+        if username is not None:
+            client.force_login(User.objects.get(username=username))
+        clients[username] = client
+    return clients[username]
+
+
+def _perform(client, method, url, data):
+    # запись откатывается, чтобы прогоны шли на одном наборе данных
+    with transaction.atomic():
+        response = getattr(client, method)(url, data)
+        transaction.set_rollback(True)
+    if response.status_code >= 400:
+        raise RuntimeError(f'{url}: статус {response.status_code}')
+
+
+def measure(scenario, sampler, iterations=50, warmup=5, cold=True,
+            memory_iterations=5):
+    """
+    Задержки, число запросов и пиковая память одного сценария.
+    Память меряется отдельным проходом: tracemalloc замедляет код.
+    """
+    clients = {}
+    latencies, queries = [], []
+    for i in range(warmup + iterations):
+        user, method, url, data = sampler.request(scenario)
+        client = _client(user, clients)
+        if cold:
+            cache.clear()
+        # журнал запросов ограничен по длине, иначе счётчик обнулится
+        reset_queries()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            _perform(client, method, url, data)
+            elapsed = time.perf_counter() - started
+        if i >= warmup:
+            latencies.append(elapsed * 1000)
+            queries.append(len(captured))
+
+    peak = 0
+    for _ in range(memory_iterations):
+        user, method, url, data = sampler.request(scenario)
+        client = _client(user, clients)
+        if cold:
+            cache.clear()
+        tracemalloc.start()
+        try:
+            _perform(client, method, url, data)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+
+    latency = {f'p{p}': percentile(latencies, p) for p in PERCENTILES}
+    latency['mean'] = sum(latencies) / len(latencies)
+    latency['max'] = max(latencies)
+    return {
+        'latency_ms': {key: round(value, 3) for key, value in latency.items()},
+        'queries': {
+            'mean': round(sum(queries) / len(queries), 2),
+            'max': max(queries),
+        },
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def run(scenarios=SCENARIOS, iterations=50, warmup=5, cold=True,
+        random_seed=42, stdout=None):
+    sampler = Sampler(random_seed)
+    results = {}
+    for scenario in scenarios:
+        results[scenario] = measure(
+            scenario, sampler, iterations=iterations, warmup=warmup,
+            cold=cold
+        )
+        if stdout is not None:
+            latency = results[scenario]['latency_ms']
+            stdout.write(
+                f'{scenario}: p50 {latency["p50"]} мс, '
+                f'p95 {latency["p95"]} мс, '
+                f'запросов {results[scenario]["queries"]["max"]}, '
+                f'память {results[scenario]["peak_memory_kb"]} КБ'
+            )
+    return {
+        'meta': {
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'iterations': iterations,
+            'warmup': warmup,
+            'cache': 'cold' if cold else 'warm',
+            'seed': random_seed,
+            'dataset': dataset_size(),
+        },
+        'results': results,
+    }
+
+
+@contextmanager
+def database_profile(name, using=DEFAULT_DB_ALIAS):
+    """
+    Временно применяет профиль из DATABASE_PROFILES. Соединения
+    открываются заново, чтобы прагмы и CONN_MAX_AGE вступили в силу.
+    """
+    settings_dict = connections.databases[using]
+    saved = dict(settings_dict)
+    connections[using].close()
+    settings_dict.update(DATABASE_PROFILES[name])
+    try:
+        # режим журнала меняется, пока других соединений нет
+        connections[using].ensure_connection()
+        yield
+    finally:
+        connections[using].close()
+        settings_dict.clear()
+        settings_dict.update(saved)
+
+
+def load_worker(sampler, requests, mix=LOAD_MIX):
+    """
+    Запросы одного потока: пары (сценарий, задержка в мс), задержка
+    None — запрос завершился ошибкой базы.
+    """
+    scenarios, weights = zip(*mix)
+    clients = {}
+    timings = []
+    for _ in range(requests):
+        [scenario] = sampler.rng.choices(scenarios, weights)
+        user, method, url, data = sampler.request(scenario)
+        started = time.perf_counter()
+        try:
+            response = getattr(_client(user, clients), method)(url, data)
+        except DatabaseError:
+            timings.append((scenario, None))
+            continue
+        elapsed = (time.perf_counter() - started) * 1000
+        timings.append(
+            (scenario, elapsed if response.status_code < 400 else None)
+        )
+    return timings
+
+
+def _in_thread(sampler, requests, mix):
+    try:
+        return load_worker(sampler, requests, mix)
+    finally:
+        connections.close_all()
+
+
+def throughput(profile, threads=4, requests=100, mix=LOAD_MIX,
+               random_seed=42):
+    """
+    Пропускная способность чтения и записи при threads параллельных
+    клиентах, каждый выполняет requests запросов. Записи сохраняются:
+    прогон нужен на отдельной файловой базе.
+    """
+    sampler = Sampler(random_seed)
+    samplers = [sampler.fork(random_seed + i) for i in range(threads)]
+    with database_profile(profile), override_settings(CACHES=NO_CACHE):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            results = list(pool.map(
+                _in_thread, samplers, [requests] * threads, [mix] * threads
+            ))
+        elapsed = time.perf_counter() - started
+
+    by_scenario = {}
+    for timings in results:
+        for scenario, latency in timings:
+            by_scenario.setdefault(scenario, []).append(latency)
+    report = {}
+    for scenario, latencies in by_scenario.items():
+        done = [latency for latency in latencies if latency is not None]
+        report[scenario] = {
+            'requests': len(latencies),
+            'errors': len(latencies) - len(done),
+            'rps': round(len(done) / elapsed, 1),
+            'latency_ms': {
+                f'p{p}': round(percentile(done, p), 3) if done else None
+                for p in (50, 95)
+            },
+        }
+    report['total'] = {
+        'threads': threads,
+        'seconds': round(elapsed, 3),
+        'rps': round(sum(
+            result['rps'] for result in report.values()
+        ), 1),
+    }
+    return report
+
+
+def recommendations(users=50000, follows=20, random_seed=42):
+    """
+    Время загрузки графа подписок и расчёта рекомендаций на
+    синтетическом графе в памяти (без базы): follows подписок на
+    пользователя по закону Ципфа. Время пересчитывается на миллион
+    подписок и сравнивается с MILLION_EDGES_SECONDS.
+    """
+    sample = zipf_sampler(random.Random(random_seed), range(1, users + 1))
+    edges = [
+        (user, author)
+        for user in range(1, users + 1)
+        for author in sample(follows) if author != user
+    ]
+    limit = settings.SUGGESTIONS_PER_USER
+    started = time.perf_counter()
+    graph = FollowGraph(edges)
+    loaded = time.perf_counter()
+    for node in range(len(graph)):
+        if graph.has_following(node):
+            graph.scores(node).most_common(limit)
+    finished = time.perf_counter()
+    million_edges = (finished - started) * 10 ** 6 / len(edges)
+    return {
+        'edges': len(edges),
+        'load_s': round(loaded - started, 3),
+        'score_s': round(finished - loaded, 3),
+        'million_edges_s': round(million_edges, 3),
+        'target_s': MILLION_EDGES_SECONDS,
+        'passed': million_edges <= MILLION_EDGES_SECONDS,
+    }
+
+
+def compare(baseline, current, threshold=0.2):
+    """
+    Регрессии относительно прошлого прогона: рост задержки p50/p95
+    и памяти больше чем на threshold, любой рост числа запросов.
+    """
+    regressions = []
+    for scenario, result in current['results'].items():
+        before = baseline['results'].get(scenario)
+        if before is None:
+            continue
+        metrics = [
+            ('latency_ms.p50', before['latency_ms']['p50'],
+             result['latency_ms']['p50'], threshold),
+            ('latency_ms.p95', before['latency_ms']['p95'],
+             result['latency_ms']['p95'], threshold),
+            ('peak_memory_kb', before['peak_memory_kb'],
+             result['peak_memory_kb'], threshold),
+            ('queries.max', before['queries']['max'],
+             result['queries']['max'], 0),
+        ]
+        for name, old, new, allowed in metrics:
+            if new > old * (1 + allowed):
+                regressions.append(f'{scenario} {name}: {old} → {new}')
+    return regressions
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def dump(report, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
@@ -0,0 +1,387 @@
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache '
+    '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+)
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+)
+# лимит переменных в одном запросе SQLite
+CHUNK_SIZE = 500
+# размер проверяется раз в столько записей, а не при каждой
+CULL_EVERY = 100
+
+
+def _dump(value):
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def _alive(expires, now):
+    return expires is None or expires > now
+
+
+class SQLiteCache(BaseCache):
+    """
+    Общий для всех воркеров кэш в отдельном файле SQLite: работает без
+    внешних сервисов, add и incr атомарны между процессами.
+    """
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.location = location
+        self._local = threading.local()
+        self._writes = 0
+
+    @property
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(
+                self.location, timeout=5, isolation_level=None
+            )
+            for statement in PRAGMAS + SCHEMA:
+                db.execute(statement)
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def get(self, key, default=None, version=None):
+        row = self._db.execute(
+            'SELECT value, expires FROM cache WHERE key = ?',
+            (self._key(key, version),)
+        ).fetchone()
+        if row is None or not _alive(row[1], time.time()):
+            return default
+        return pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        names = {self._key(key, version): key for key in keys}
+        now = time.time()
+        found = {}
+        chunk = list(names)
+        for start in range(0, len(chunk), CHUNK_SIZE):
+            part = chunk[start:start + CHUNK_SIZE]
+            rows = self._db.execute(
+                'SELECT key, value, expires FROM cache WHERE key IN ({})'
+                .format(', '.join('?' * len(part))),
+                part
+            )
+            for key, value, expires in rows:
+                if _alive(expires, now):
+                    found[names[key]] = pickle.loads(value)
+        return found
+
+    def has_key(self, key, version=None):
+        row = self._db.execute(
+            'SELECT expires FROM cache WHERE key = ?',
+            (self._key(key, version),)
+        ).fetchone()
+        return row is not None and _alive(row[0], time.time())
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._db.execute(
+            'INSERT OR REPLACE INTO cache VALUES (?, ?, ?)',
+            (self._key(key, version), _dump(value),
+             self.get_backend_timeout(timeout))
+        )
+        self._maybe_cull()
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        with self._transaction() as db:
+            db.executemany(
+                'INSERT OR REPLACE INTO cache VALUES (?, ?, ?)',
+                [
+                    (self._key(key, version), _dump(value), expires)
+                    for key, value in data.items()
+                ]
+            )
+        self._maybe_cull()
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._transaction() as db:
+            db.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, time.time())
+            )
+            added = db.execute(
+                'INSERT OR IGNORE INTO cache VALUES (?, ?, ?)',
+                (key, _dump(value), self.get_backend_timeout(timeout))
+            ).rowcount == 1
+        if added:
+            self._maybe_cull()
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        name = self._key(key, version)
+        with self._transaction() as db:
+            row = db.execute(
+                'SELECT value, expires FROM cache WHERE key = ?', (name,)
+            ).fetchone()
+            if row is None or not _alive(row[1], time.time()):
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            db.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (_dump(value), name)
+            )
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._db.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), self._key(key, version),
+             time.time())
+        ).rowcount == 1
+
+    def delete(self, key, version=None):
+        self._db.execute(
+            'DELETE FROM cache WHERE key = ?', (self._key(key, version),)
+        )
+
+    def delete_many(self, keys, version=None):
+        with self._transaction() as db:
+            db.executemany(
+                'DELETE FROM cache WHERE key = ?',
+                [(self._key(key, version),) for key in keys]
+            )
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def _maybe_cull(self):
+        self._writes += 1
+        if self._writes % CULL_EVERY == 0:
+            self.cull()
+
+    def cull(self):
+        """
+        Удаляет истёкшие записи, а при переполнении — долю
+        1/CULL_FREQUENCY записей, которые истекут раньше других.
+        """
+        with self._transaction() as db:
+            db.execute(
+                'DELETE FROM cache WHERE expires <= ?', (time.time(),)
+            )
+            [count] = db.execute('SELECT COUNT(*) FROM cache').fetchone()
+            if count <= self._max_entries:
+                return
+            # CULL_FREQUENCY = 0 очищает всё, как в бэкендах Django
+            limit = count
+            if self._cull_frequency:
+                limit //= self._cull_frequency
+            db.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)', (limit,)
+            )
+
+
+# локальные уровни живут на уровне процесса: экземпляры бэкендов
+# создаются в каждом потоке свои
+_local_tiers = {}
+_local_tiers_lock = threading.Lock()
+
+
+class TwoTierCache(BaseCache):
+    """
+    Небольшой LRU в памяти процесса перед общим кэшем (OPTIONS['SHARED']
+    — его псевдоним в CACHES). Рядом со значением общий кэш хранит штамп
+    версии, и локальная копия отдаётся, только пока её штамп совпадает
+    с общим: проверка штампа дешевле передачи и распаковки страницы,
+    а запись из любого процесса меняет штамп и гасит чужие копии.
+    """
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.shared_alias = params.get('OPTIONS', {}).get('SHARED', 'shared')
+        with _local_tiers_lock:
+            self._entries, self._lock = _local_tiers.setdefault(
+                location or self.shared_alias,
+                (OrderedDict(), threading.Lock())
+            )
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    @staticmethod
+    def _stamp_key(key):
+        return '{}:stamp'.format(key)
+
+    def _remember(self, key, value, stamp):
+        with self._lock:
+            self._entries[key] = (_dump(value), stamp)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def _forget(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_key(key, version)
+        stamp_key = self._stamp_key(key)
+        with self._lock:
+            entry = self._entries.get(local_key)
+        if entry is not None:
+            value, stamp = entry
+            if self.shared.get(stamp_key, version=version) == stamp:
+                with self._lock:
+                    if local_key in self._entries:
+                        self._entries.move_to_end(local_key)
+                return pickle.loads(value)
+        found = self.shared.get_many([key, stamp_key], version=version)
+        if key not in found:
+            self._forget(local_key)
+            return default
+        if stamp_key in found:
+            self._remember(local_key, found[key], found[stamp_key])
+        else:
+            self._forget(local_key)
+        return found[key]
+
+    def _with_stamps(self, keys):
+        return [*keys, *map(self._stamp_key, keys)]
+
+    def _take(self, found, keys, version):
+        """
+        Значения keys из ответа общего кэша; копии со штампом
+        запоминаются в локальном уровне.
+        """
+        values = {}
+        for key in keys:
+            local_key = self.make_key(key, version)
+            if key not in found:
+                self._forget(local_key)
+                continue
+            values[key] = found[key]
+            stamp = found.get(self._stamp_key(key))
+            if stamp is None:
+                self._forget(local_key)
+            else:
+                self._remember(local_key, found[key], stamp)
+        return values
+
+    def get_many(self, keys, version=None):
+        """
+        Штампы локальных копий и значения остальных ключей читаются
+        одним запросом к общему кэшу; второй нужен, только если
+        какая-то копия устарела.
+        """
+        keys = list(keys)
+        if not keys:
+            return {}
+        with self._lock:
+            entries = {
+                key: self._entries.get(self.make_key(key, version))
+                for key in keys
+            }
+        local = [key for key in keys if entries[key] is not None]
+        missing = [key for key in keys if entries[key] is None]
+        found = self.shared.get_many(
+            self._with_stamps(missing) + [
+                self._stamp_key(key) for key in local
+            ],
+            version=version
+        )
+        values = self._take(found, missing, version)
+        stale = []
+        for key in local:
+            value, stamp = entries[key]
+            if found.get(self._stamp_key(key)) == stamp:
+                values[key] = pickle.loads(value)
+            else:
+                stale.append(key)
+        if stale:
+            values.update(self._take(
+                self.shared.get_many(
+                    self._with_stamps(stale), version=version
+                ),
+                stale, version
+            ))
+        return values
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        stamp = uuid.uuid4().hex
+        self.shared.set_many(
+            {key: value, self._stamp_key(key): stamp}, timeout, version
+        )
+        self._remember(self.make_key(key, version), value, stamp)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        stamps = {key: uuid.uuid4().hex for key in data}
+        failed = self.shared.set_many({
+            **data,
+            **{self._stamp_key(key): stamp for key, stamp in stamps.items()}
+        }, timeout, version)
+        for key, value in data.items():
+            if key not in failed:
+                self._remember(
+                    self.make_key(key, version), value, stamps[key]
+                )
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if not self.shared.add(key, value, timeout, version):
+            return False
+        stamp = uuid.uuid4().hex
+        self.shared.set(self._stamp_key(key), stamp, timeout, version)
+        self._remember(self.make_key(key, version), value, stamp)
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version)
+        # без штампа копии не кэшируются: счётчики версий читаются
+        # из общего кэша при каждом обращении
+        self.shared.delete(self._stamp_key(key), version)
+        self._forget(self.make_key(key, version))
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        touched = self.shared.touch(key, timeout, version)
+        self.shared.touch(self._stamp_key(key), timeout, version)
+        return touched
+
+    def delete(self, key, version=None):
+        self.shared.delete_many([key, self._stamp_key(key)], version)
+        self._forget(self.make_key(key, version))
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.shared.delete_many(self._with_stamps(keys), version)
+        for key in keys:
+            self._forget(self.make_key(key, version))
+
+    def clear(self):
+        self.shared.clear()
+        with self._lock:
+            self._entries.clear()
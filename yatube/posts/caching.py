@@ -0,0 +1,255 @@
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.views.decorators.http import condition
+
+from .replicas import read_from_primary
+
+POST_CARD_VERSION_KEY = 'post_card_version:post:{}'
+GROUP_CARD_VERSION_KEY = 'post_card_version:group:{}'
+AUTHOR_CARD_VERSION_KEY = 'post_card_version:author:{}'
+
+
+def new_version():
+    """
+    Новая версия уникальна во времени: если счётчик вытеснен из кэша,
+    старые фрагменты с прежней версией не будут переиспользованы.
+    """
+    return time.time_ns()
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, new_version(), None)
+
+
+def bump_post_card(post_id):
+    bump_version(POST_CARD_VERSION_KEY.format(post_id))
+
+
+def bump_group_cards(group_id):
+    bump_version(GROUP_CARD_VERSION_KEY.format(group_id))
+
+
+def bump_author_cards(author_id):
+    bump_version(AUTHOR_CARD_VERSION_KEY.format(author_id))
+
+
+def card_version_keys(post):
+    keys = [
+        POST_CARD_VERSION_KEY.format(post.pk),
+        AUTHOR_CARD_VERSION_KEY.format(post.author_id),
+    ]
+    if post.group_id is not None:
+        keys.append(GROUP_CARD_VERSION_KEY.format(post.group_id))
+    return keys
+
+
+def attach_card_versions(posts):
+    """
+    Проставляет постам атрибут card_version, которым версионируется
+    кэш карточки. Все счётчики читаются из кэша одним запросом.
+    """
+    posts = list(posts)
+    keys = {key for post in posts for key in card_version_keys(post)}
+    versions = cache.get_many(keys)
+    missing = {key: new_version() for key in keys - versions.keys()}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    for post in posts:
+        post.card_version = '.'.join(
+            str(versions[key]) for key in card_version_keys(post)
+        )
+    return posts
+
+
+FEED_GENERATION_KEY = 'feed_generation:{}'
+# время последнего изменения области: по нему отдаётся Last-Modified
+FEED_CHANGED_KEY = 'feed_changed:{}'
+FEED_PAGE_KEY = 'feed_page:{}:{}:{}'
+FEED_LOCK_KEY = 'feed_page_lock:{}'
+# поколение, общее для всех лент: сбрасывает их все разом
+GLOBAL_SCOPE = 'all'
+
+
+def post_scopes(post):
+    scopes = [
+        'index',
+        'profile:{}'.format(post.author.username),
+        'post:{}'.format(post.pk),
+    ]
+    if post.group_id is not None:
+        scopes.append('group:{}'.format(post.group.slug))
+    return scopes
+
+
+def bump_feeds(*scopes):
+    for scope in scopes:
+        bump_version(FEED_GENERATION_KEY.format(scope))
+    now = time.time()
+    cache.set_many(
+        {FEED_CHANGED_KEY.format(scope): now for scope in scopes}, None
+    )
+
+
+def feed_generation(scopes):
+    keys = [FEED_GENERATION_KEY.format(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = {key: new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return tuple(versions[key] for key in keys)
+
+
+def _cached_response(entry):
+    return HttpResponse(
+        entry['content'],
+        status=entry['status'],
+        content_type=entry['content_type']
+    )
+
+
+def is_cacheable(response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+    )
+
+
+def cached_feed(scope, timeout=None):
+    """
+    Кэширует страницу ленты до изменения её содержимого.
+
+    Актуальность определяется счётчиками поколений, которые сигналы
+    увеличивают при изменении постов, комментариев, подписок и
+    сообществ. Устаревшую страницу перестраивает один воркер (под
+    блокировкой в кэше), остальные тем временем отдают старую копию.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            page_scope = scope.format(**kwargs)
+            generation = feed_generation([GLOBAL_SCOPE, page_scope])
+            key = FEED_PAGE_KEY.format(
+                page_scope,
+                request.user.pk or 0,
+                md5(request.get_full_path().encode()).hexdigest()
+            )
+            lock_key = FEED_LOCK_KEY.format(key)
+            entry = cache.get(key)
+            now = time.time()
+            if (
+                entry is not None
+                and entry['generation'] == generation
+                and entry['expires'] > now
+            ):
+                return _cached_response(entry)
+            locked = cache.add(
+                lock_key, 1, settings.FEED_CACHE_LOCK_TIMEOUT
+            )
+            if not locked:
+                if entry is not None:
+                    return _cached_response(entry)
+                entry = _wait_for_entry(key, generation)
+                if entry is not None:
+                    return _cached_response(entry)
+            try:
+                # страница живёт под новым поколением до следующего
+                # изменения: строим её по основной базе, а не по реплике
+                with read_from_primary():
+                    response = view(request, *args, **kwargs)
+                if is_cacheable(response):
+                    page_timeout = timeout or settings.FEED_CACHE_TIMEOUT
+                    cache.set(key, {
+                        'generation': generation,
+                        'expires': now + page_timeout,
+                        'status': response.status_code,
+                        'content': response.content,
+                        'content_type': response['Content-Type'],
+                    }, page_timeout * 2)
+                return response
+            finally:
+                if locked:
+                    cache.delete(lock_key)
+        return wrapper
+    return decorator
+
+
+def _wait_for_entry(key, generation):
+    """
+    Холодный кэш: ждём, пока страницу построит воркер, взявший
+    блокировку, но не дольше FEED_CACHE_LOCK_WAIT секунд.
+    """
+    deadline = time.time() + settings.FEED_CACHE_LOCK_WAIT
+    while time.time() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None and entry['generation'] == generation:
+            return entry
+    return None
+
+
+def _page_scopes(scopes, kwargs):
+    return [GLOBAL_SCOPE] + [scope.format(**kwargs) for scope in scopes]
+
+
+def feed_etag(*scopes):
+    """
+    ETag страницы по поколениям её областей: вычисляется без запросов
+    к базе и без рендеринга шаблона. Учитывает и правки, которые не
+    меняют даты публикации.
+    """
+    def etag(request, *args, **kwargs):
+        generation = feed_generation(_page_scopes(scopes, kwargs))
+        raw = '{}:{}:{}'.format(
+            generation, request.user.pk or 0, request.get_full_path()
+        )
+        return md5(raw.encode()).hexdigest()
+    return etag
+
+
+def feed_last_modified(*scopes):
+    """
+    Last-Modified страницы по времени последнего изменения её областей,
+    которое bump_feeds записывает рядом с поколением: оно сдвигается
+    и на комментариях, правках и удалениях. Вытесненное из кэша время
+    считается текущим.
+    """
+    def last_modified(request, *args, **kwargs):
+        keys = [
+            FEED_CHANGED_KEY.format(name)
+            for name in _page_scopes(scopes, kwargs)
+        ]
+        changed = cache.get_many(keys)
+        now = time.time()
+        missing = {key: now for key in keys if key not in changed}
+        if missing:
+            cache.set_many(missing, None)
+            changed.update(missing)
+        moment = int(max(changed.values()))
+        if moment >= int(now):
+            # If-Modified-Since точен до секунды, а в текущую секунду
+            # область ещё может измениться: проверять остаётся ETag
+            return None
+        return datetime.fromtimestamp(moment, timezone.utc)
+    return last_modified
+
+
+def feed_condition(*scopes):
+    """
+    Ответ 304 по ETag и Last-Modified областей страницы: страница
+    зависит от всех областей, данные которых показывает.
+    """
+    return condition(feed_etag(*scopes), feed_last_modified(*scopes))
@@ -0,0 +1,163 @@
+"""
+Обработка загруженных картинок постов.
+
+Форма сохраняет файл как есть, а перекодирование идёт в пуле потоков
+миниатюр уже после ответа: картинка поворачивается по EXIF,
+уменьшается до IMAGE_MAX_SIZE точек по большей стороне и
+сохраняется прогрессивным JPEG (или WebP) без метаданных. В пост
+записываются новое имя файла и SHA-256 его содержимого, исходный
+файл освобождается, а миниатюры строятся уже по обработанной картинке.
+Существующие картинки обрабатывает manage.py process_images.
+"""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections
+from PIL import Image, ImageOps, features
+
+from .media import refresh_posts, release_image
+from .models import Post
+from .thumbnails import generate_thumbnails, submit
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {'JPEG': '.jpg', 'WEBP': '.webp'}
+
+
+def output_format():
+    """IMAGE_FORMAT, если Pillow умеет его записывать, иначе JPEG."""
+    name = settings.IMAGE_FORMAT.upper()
+    if name == 'WEBP' and not features.check('webp'):
+        return 'JPEG'
+    return name
+
+
+def _flatten(image, image_format):
+    """
+    Картинка в режиме цвета, который поддерживает формат: у JPEG
+    прозрачность заменяется белым фоном.
+    """
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        image = image.convert('RGBA')
+        if image_format == 'WEBP':
+            return image
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    if image.mode != 'RGB':
+        return image.convert('RGB')
+    return image
+
+
+def encode_image(source):
+    """
+    Перекодированная картинка из файла source: пара (байты,
+    расширение). Анимация не перекодируется — результат (None, None).
+    """
+    size = settings.IMAGE_MAX_SIZE
+    image_format = output_format()
+    with Image.open(source) as image:
+        if getattr(image, 'is_animated', False):
+            return None, None
+        # JPEG декодируется сразу в уменьшенном в 2–8 раз виде
+        image.draft('RGB', (size, size))
+        icc_profile = image.info.get('icc_profile')
+        image = ImageOps.exif_transpose(image)
+    image.thumbnail((size, size), Image.LANCZOS)
+    image = _flatten(image, image_format)
+    options = {'quality': settings.IMAGE_QUALITY}
+    if image_format == 'JPEG':
+        options.update(optimize=True, progressive=True)
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    output = BytesIO()
+    # EXIF не передаётся в save и в файл не попадает
+    image.save(output, image_format, **options)
+    return output.getvalue(), EXTENSIONS[image_format]
+
+
+def process_image(image_name):
+    """
+    Перекодирует файл image_name и переводит на результат все посты
+    с этой картинкой. Возвращает имя обработанного файла или None,
+    если файл не удалось прочитать или посты сменили картинку.
+    """
+    field = Post._meta.get_field('image')
+    storage = field.storage
+    try:
+        with storage.open(image_name) as source:
+            content, extension = encode_image(source)
+            if content is None:
+                source.seek(0)
+                digest = hashlib.sha256(source.read()).hexdigest()
+    except Exception:
+        logger.exception('Не удалось обработать картинку %s', image_name)
+        return None
+    name = image_name
+    if content is not None:
+        digest = hashlib.sha256(content).hexdigest()
+        name = storage.save(
+            field.generate_filename(None, 'image' + extension),
+            ContentFile(content)
+        )
+    updated = Post.objects.filter(image=image_name).update(
+        image=name, image_hash=digest
+    )
+    if name != image_name:
+        # если пост успел сменить картинку, лишним оказывается результат
+        release_image(image_name if updated else name)
+    return name if updated else None
+
+
+def prepare_image(image_name):
+    """Обработка картинки и миниатюры по её результату."""
+    name = process_image(image_name)
+    if name is None:
+        return False
+    generate_thumbnails(name)
+    refresh_posts(name)
+    return True
+
+
+def enqueue_image(post):
+    """
+    Ставит обработку новой картинки поста в очередь пула после
+    коммита транзакции.
+    """
+    image_name = post.image.name if post.image else None
+    if image_name:
+        submit(image_name, prepare_image, image_name)
+
+
+def _prepare_in_worker(image_name):
+    try:
+        return prepare_image(image_name)
+    finally:
+        # у каждого потока пула своё соединение с базой
+        connections.close_all()
+
+
+def reprocess_images(workers=None, force=False):
+    """
+    Обрабатывает картинки постов параллельно в пуле из workers потоков
+    (Pillow отпускает GIL на декодировании и сжатии). Без force —
+    только ещё не обработанные. Возвращает пару (обработано, ошибок).
+    """
+    workers = workers or settings.THUMBNAIL_WORKERS
+    posts = Post.objects.exclude(image='').exclude(image__isnull=True)
+    if not force:
+        posts = posts.filter(image_hash='')
+    names = list(
+        posts.order_by('image').values_list('image', flat=True).distinct()
+    )
+    if workers == 1:
+        results = [prepare_image(name) for name in names]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_prepare_in_worker, names))
+    processed = sum(results)
+    return processed, len(results) - processed
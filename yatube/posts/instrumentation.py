@@ -0,0 +1,220 @@
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache
+from django.db import connections
+from django.template.backends.django import Template
+
+logger = logging.getLogger('posts.slow_requests')
+
+_recorder = ContextVar('request_recorder', default=None)
+_MISSING = object()
+
+
+class RequestRecorder:
+    """Счётчики одного запроса: база, шаблоны, кэш."""
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # двухуровневый кэш сам обращается к общему: считается только
+        # внешнее обращение
+        self.cache_depth = 0
+        self.started = time.perf_counter()
+        self.total_time = None
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обёртка для connection.execute_wrapper."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+    def finish(self):
+        self.total_time = time.perf_counter() - self.started
+
+    def server_timing(self):
+        return ', '.join([
+            'db;dur={:.1f};desc="{} queries"'.format(
+                self.db_time * 1000, self.queries
+            ),
+            'tpl;dur={:.1f}'.format(self.template_time * 1000),
+            'cache;desc="hits={} misses={}"'.format(
+                self.cache_hits, self.cache_misses
+            ),
+            'total;dur={:.1f}'.format(self.total_time * 1000),
+        ])
+
+    def as_dict(self):
+        return {
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 2),
+            'template_ms': round(self.template_time * 1000, 2),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'total_ms': round(self.total_time * 1000, 2),
+        }
+
+
+def current_recorder():
+    return _recorder.get()
+
+
+def _timed_render(render):
+    @wraps(render)
+    def wrapper(self, *args, **kwargs):
+        recorder = _recorder.get()
+        if recorder is None:
+            return render(self, *args, **kwargs)
+        # вложенные render_to_string не считаются дважды
+        recorder.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            recorder.template_depth -= 1
+            if not recorder.template_depth:
+                recorder.template_time += time.perf_counter() - started
+    wrapper.instrumented = True
+    return wrapper
+
+
+def _counted_get(get):
+    @wraps(get)
+    def wrapper(self, key, default=None, version=None, **kwargs):
+        recorder = _recorder.get()
+        if recorder is None or recorder.cache_depth:
+            return get(self, key, default, version, **kwargs)
+        recorder.cache_depth += 1
+        try:
+            value = get(self, key, _MISSING, version, **kwargs)
+        finally:
+            recorder.cache_depth -= 1
+        if value is _MISSING:
+            recorder.cache_misses += 1
+            return default
+        recorder.cache_hits += 1
+        return value
+    wrapper.instrumented = True
+    return wrapper
+
+
+def _counted_get_many(get_many):
+    @wraps(get_many)
+    def wrapper(self, keys, version=None, **kwargs):
+        recorder = _recorder.get()
+        if recorder is None or recorder.cache_depth:
+            return get_many(self, keys, version, **kwargs)
+        keys = list(keys)
+        recorder.cache_depth += 1
+        try:
+            found = get_many(self, keys, version, **kwargs)
+        finally:
+            recorder.cache_depth -= 1
+        recorder.cache_hits += len(found)
+        recorder.cache_misses += len(keys) - len(found)
+        return found
+    wrapper.instrumented = True
+    return wrapper
+
+
+def _patch(cls, name, decorator):
+    """Оборачивает метод в том классе иерархии, где он определён."""
+    for owner in cls.__mro__:
+        if name in owner.__dict__:
+            break
+    # BaseCache.get_many сам вызывает get: его попадания уже посчитаны
+    if owner is BaseCache and name == 'get_many':
+        return
+    method = owner.__dict__[name]
+    if not getattr(method, 'instrumented', False):
+        setattr(owner, name, decorator(method))
+
+
+def install():
+    """
+    Подключает счётчики шаблонов и кэша. Без активного замера
+    обёртки только читают пустую контекстную переменную.
+    """
+    _patch(Template, 'render', _timed_render)
+    for alias in settings.CACHES:
+        backend = type(caches[alias])
+        _patch(backend, 'get', _counted_get)
+        _patch(backend, 'get_many', _counted_get_many)
+
+
+def view_budget(request):
+    """Бюджет вьюхи в миллисекундах по имени маршрута."""
+    match = getattr(request, 'resolver_match', None)
+    name = match.url_name if match is not None else None
+    return settings.REQUEST_TIMING_BUDGETS.get(
+        name, settings.REQUEST_TIMING_DEFAULT_BUDGET
+    )
+
+
+class RequestTimingMiddleware:
+    """
+    Замеряет выборку запросов: число и время SQL-запросов, время
+    рендеринга шаблонов, попадания в кэш и общее время. Результат
+    отдаётся в заголовке Server-Timing, а запросы дольше бюджета
+    вьюхи пишутся в журнал posts.slow_requests.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.REQUEST_TIMING_SAMPLE_RATE
+        if not rate or random.random() >= rate:
+            return self.get_response(request)
+
+        recorder = RequestRecorder()
+        token = _recorder.set(recorder)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(recorder)
+                    )
+                response = self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        recorder.finish()
+
+        response['Server-Timing'] = recorder.server_timing()
+        budget = view_budget(request)
+        if recorder.total_time * 1000 > budget:
+            match = getattr(request, 'resolver_match', None)
+            logger.warning('slow request', extra={'timing': {
+                'method': request.method,
+                'path': request.get_full_path(),
+                'view': match.view_name if match is not None else None,
+                'status': response.status_code,
+                'budget_ms': budget,
+                **recorder.as_dict(),
+            }})
+        return response
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись журнала — одна строка JSON."""
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        data.update(getattr(record, 'timing', {}))
+        return json.dumps(data, ensure_ascii=False)
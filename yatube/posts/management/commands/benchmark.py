@@ -0,0 +1,184 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон основных страниц на синтетических данных '
+        'в отдельной базе; результаты сохраняются в JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--groups', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=200000)
+        parser.add_argument('--comments', type=int, default=200000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Подписок на пользователя'
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--warm-cache', action='store_true',
+            help='Не сбрасывать кэш перед каждым запросом'
+        )
+        parser.add_argument(
+            '--scenario', action='append', choices=benchmark.SCENARIOS,
+            dest='scenarios', help='Сценарий (можно несколько раз)'
+        )
+        parser.add_argument(
+            '--threads', type=int, default=0,
+            help='Параллельных клиентов для замера пропускной способности '
+                 'index и add_comment в каждом профиле базы (0 — без него)'
+        )
+        parser.add_argument(
+            '--load-requests', type=int, default=200,
+            help='Запросов на одного клиента при замере под нагрузкой'
+        )
+        parser.add_argument(
+            '--graph-users', type=int, default=0,
+            help='Пользователей синтетического графа подписок для замера '
+                 'рекомендаций против MILLION_EDGES_SECONDS (0 — без него)'
+        )
+        parser.add_argument(
+            '--database',
+            default=os.path.join(
+                tempfile.gettempdir(), 'yatube_benchmark.sqlite3'
+            ),
+            help='Файл базы SQLite для прогона'
+        )
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help='Не удалять базу и переиспользовать уже заполненную'
+        )
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument(
+            '--compare', metavar='BASELINE',
+            help='JSON прошлого прогона для поиска регрессий'
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Допустимый рост задержки и памяти (доля)'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            connection.settings_dict['TEST']['NAME'] = options['database']
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False,
+            keepdb=options['keepdb']
+        )
+        # без setup_test_environment: его инструментирование шаблонов
+        # и включённый DEBUG (debug_toolbar) исказили бы замеры; реплики
+        # не участвуют — прогон идёт на одной отдельной базе, а кэш
+        # свой, в памяти процесса
+        production = override_settings(
+            DEBUG=False,
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            DATABASE_REPLICAS=[],
+            CACHES=benchmark.PRIVATE_CACHE,
+        )
+        try:
+            with production:
+                report = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options['keepdb']
+            )
+
+        benchmark.dump(report, options['output'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Результаты записаны в {options["output"]}'
+        ))
+        if not report.get('recommendations', {}).get('passed', True):
+            raise CommandError(
+                'Рекомендации медленнее цели MILLION_EDGES_SECONDS'
+            )
+        if options['compare']:
+            self.check_regressions(report, options)
+
+    def run(self, options):
+        if benchmark.dataset_size()['posts']:
+            self.stdout.write('Используются уже заполненные данные')
+        else:
+            with transaction.atomic():
+                benchmark.seed(
+                    users=options['users'],
+                    groups=options['groups'],
+                    posts=options['posts'],
+                    comments=options['comments'],
+                    follows=options['follows'],
+                    random_seed=options['seed'],
+                    stdout=self.stdout,
+                )
+        report = benchmark.run(
+            scenarios=options['scenarios'] or benchmark.SCENARIOS,
+            iterations=options['iterations'],
+            warmup=options['warmup'],
+            cold=not options['warm_cache'],
+            random_seed=options['seed'],
+            stdout=self.stdout,
+        )
+        if options['threads']:
+            report['load'] = self.run_load(options)
+        if options['graph_users']:
+            report['recommendations'] = self.run_recommendations(options)
+        return report
+
+    def run_recommendations(self, options):
+        result = benchmark.recommendations(
+            users=options['graph_users'],
+            follows=options['follows'],
+            random_seed=options['seed'],
+        )
+        style = self.style.SUCCESS if result['passed'] else self.style.ERROR
+        self.stdout.write(style(
+            'Рекомендации: подписок {edges}, загрузка {load_s} с, расчёт '
+            '{score_s} с; на миллион подписок {million_edges_s} с при '
+            'цели {target_s} с'.format(**result)
+        ))
+        return result
+
+    def run_load(self, options):
+        results = {}
+        for profile in benchmark.DATABASE_PROFILES:
+            results[profile] = benchmark.throughput(
+                profile,
+                threads=options['threads'],
+                requests=options['load_requests'],
+                random_seed=options['seed'],
+            )
+            for scenario, result in results[profile].items():
+                if scenario == 'total':
+                    continue
+                self.stdout.write(
+                    f'{profile} {scenario}: {result["rps"]} запр/с, '
+                    f'p95 {result["latency_ms"]["p95"]} мс, '
+                    f'ошибок {result["errors"]}'
+                )
+        return results
+
+    def check_regressions(self, report, options):
+        baseline = benchmark.load(options['compare'])
+        if baseline['meta']['dataset'] != report['meta']['dataset']:
+            self.stdout.write(self.style.WARNING(
+                'Наборы данных прогонов различаются'
+            ))
+        regressions = benchmark.compare(
+            baseline, report, options['threshold']
+        )
+        if regressions:
+            raise CommandError(
+                'Регрессии производительности:\n' + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
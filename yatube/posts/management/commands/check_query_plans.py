@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.queryplans import check_feeds
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет через EXPLAIN QUERY PLAN, что страницы лент читаются '
+        'по индексам: без полного прохода таблиц и сортировки во '
+        'временном B-дереве, а страницы после курсора — с его позиции'
+    )
+
+    def handle(self, *args, **options):
+        try:
+            results = check_feeds()
+        except ValueError as error:
+            raise CommandError(error)
+        failed = []
+        for name, details, problems in results:
+            if problems:
+                failed.append(name)
+                self.stdout.write(self.style.ERROR('{}: {}'.format(
+                    name, '; '.join(problems)
+                )))
+            else:
+                self.stdout.write(self.style.SUCCESS(name + ': OK'))
+            if options['verbosity'] > 1 or problems:
+                for detail in details:
+                    self.stdout.write('    ' + detail)
+        if failed:
+            raise CommandError(
+                'Планы с проходом без границы или сортировкой: {}'.format(
+                    ', '.join(failed)
+                )
+            )
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from posts.media import dedup_media
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов в хранилище по содержимому и удаляет '
+        'файлы, на которые не ссылается ни один пост'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Число потоков для подсчёта хешей'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать, ничего не меняя'
+        )
+
+    def handle(self, *args, **options):
+        stats = dedup_media(
+            workers=options['workers'], dry_run=options['dry_run']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            'Перенесено: {moved} (совпадений: {duplicates}), файлов нет: '
+            '{missing}, удалено без ссылок: {removed}, освобождено байт: '
+            '{freed}'.format(**stats)
+        ))
@@ -0,0 +1,57 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts.transfer import Progress, detect_format, export_posts
+
+
+class Command(BaseCommand):
+    help = 'Выгружает посты в NDJSON или CSV потоком, не загружая их в память'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл (.ndjson, .jsonl, .csv) или - для stdout'
+        )
+        parser.add_argument('--format', choices=('ndjson', 'csv'))
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Строк, читаемых из базы за раз'
+        )
+        parser.add_argument(
+            '--media-dir',
+            help='Каталог, куда скопировать картинки постов'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Потоков для копирования картинок'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or detect_format(path)
+        # при выгрузке в stdout отчёт о ходе идёт в stderr
+        log = self.stderr if path == '-' else self.stdout
+        progress = Progress(lambda progress: log.write(
+            f'Выгружено: {progress}'
+        ))
+        stream = sys.stdout if path == '-' else open(
+            path, 'w', encoding='utf-8', newline=''
+        )
+        try:
+            result = export_posts(
+                stream, fmt,
+                chunk_size=options['chunk_size'],
+                media_dir=options['media_dir'],
+                workers=options['workers'],
+                progress=progress,
+            )
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        log.write(self.style.SUCCESS(
+            f'Выгружено постов: {result["posts"]} ({progress.rate:.0f} зап/с)'
+        ))
+        if result['missing_images']:
+            log.write(self.style.WARNING(
+                f'Не найдено картинок: {result["missing_images"]}'
+            ))
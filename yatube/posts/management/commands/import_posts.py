@@ -0,0 +1,68 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts.transfer import Progress, detect_format, import_posts
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает посты из NDJSON или CSV пакетами через bulk_create, '
+        'читая файл потоком'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл (.ndjson, .jsonl, .csv) или - для stdin'
+        )
+        parser.add_argument('--format', choices=('ndjson', 'csv'))
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Постов в одном bulk_create'
+        )
+        parser.add_argument(
+            '--media-dir',
+            help='Каталог с картинками, пути к которым указаны в записях'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Потоков для копирования картинок'
+        )
+        parser.add_argument(
+            '--create-missing', action='store_true',
+            help='Создавать отсутствующих авторов и сообщества'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or detect_format(path)
+        progress = Progress(lambda progress: self.stdout.write(
+            f'Прочитано: {progress}'
+        ))
+        stream = sys.stdin if path == '-' else open(
+            path, encoding='utf-8', newline=''
+        )
+        try:
+            result = import_posts(
+                stream, fmt,
+                batch_size=options['batch_size'],
+                media_dir=options['media_dir'],
+                workers=options['workers'],
+                create_missing=options['create_missing'],
+                progress=progress,
+            )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено постов: {result["posts"]} ({progress.rate:.0f} зап/с)'
+        ))
+        if result['skipped']:
+            self.stdout.write(self.style.WARNING(
+                f'Пропущено записей: {result["skipped"]} (нет автора, '
+                'сообщества, текста или неверная дата)'
+            ))
+        if result['missing_images']:
+            self.stdout.write(self.style.WARNING(
+                f'Не найдено картинок: {result["missing_images"]}'
+            ))
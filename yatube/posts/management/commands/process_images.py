@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from posts.images import reprocess_images
+
+
+class Command(BaseCommand):
+    help = 'Перекодирует картинки существующих постов и строит миниатюры'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Число потоков (по умолчанию THUMBNAIL_WORKERS)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Обработать заново и уже обработанные картинки'
+        )
+
+    def handle(self, *args, **options):
+        processed, failed = reprocess_images(
+            workers=options['workers'], force=options['force']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {processed}, ошибок: {failed}'
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.search import fts5_available, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс постов'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = rebuild_index()
+        backend = 'FTS5' if fts5_available() else 'PostTerm'
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано постов: {count} ({backend})'
+        ))
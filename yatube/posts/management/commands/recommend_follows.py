@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.recommendations import FollowGraph, compute_suggestions
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рекомендации «кого почитать» по графу подписок '
+        '(друзья друзей и совместные подписки)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько пользователей записывать за одну транзакцию'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        graph = FollowGraph.load()
+        loaded = time.perf_counter()
+        users = compute_suggestions(graph, options['batch_size'])
+        finished = time.perf_counter()
+        self.stdout.write(self.style.SUCCESS(
+            'Подписок: {}, пользователей с рекомендациями: {}; '
+            'загрузка {:.1f} с, расчёт {:.1f} с'.format(
+                graph.edges, users, loaded - started, finished - loaded
+            )
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts.trending import recompute_trends
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает веса трендов постов и сообществ по событиям '
+        'последних TRENDING_WINDOW_DAYS дней'
+    )
+
+    def handle(self, *args, **options):
+        posts, groups = recompute_trends()
+        self.stdout.write(self.style.SUCCESS(
+            'В трендах постов: {}, сообществ: {}'.format(posts, groups)
+        ))
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.snapshots import (
+    regenerate_snapshots, snapshot_targets, stale_snapshots
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит снимки горячих страниц для анонимных читателей; с --check '
+        'только проверяет, что все снимки свежие'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Не строить снимки, а завершиться с ошибкой, если есть '
+                 'устаревшие или отсутствующие'
+        )
+
+    def handle(self, *args, **options):
+        if not settings.SNAPSHOTS_ENABLED:
+            raise CommandError('Снимки выключены: SNAPSHOTS_ENABLED = False')
+        targets = snapshot_targets()
+        if options['check']:
+            stale = stale_snapshots(targets)
+            if stale:
+                raise CommandError('Устаревшие снимки: {}'.format(
+                    ', '.join(stale)
+                ))
+            self.stdout.write(self.style.SUCCESS(
+                'Все снимки свежие: {}'.format(len(targets))
+            ))
+            return
+        results = regenerate_snapshots(targets)
+        skipped = [path for path, stored in results if not stored]
+        for path in skipped:
+            self.stdout.write(self.style.WARNING(
+                '{}: ответ нельзя сохранить снимком'.format(path)
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            'Построено снимков: {}'.format(len(results) - len(skipped))
+        ))
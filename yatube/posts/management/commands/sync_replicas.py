@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.replicas import sync_replicas
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в файлы реплик (локальная '
+        'имитация репликации)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять каждые N секунд (0 — один раз)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                synced = sync_replicas()
+            except ValueError as error:
+                raise CommandError(error)
+            if not synced:
+                raise CommandError('Реплики не настроены: задайте DB_REPLICAS')
+            if options['verbosity'] > 1 or not options['interval']:
+                self.stdout.write(self.style.SUCCESS(
+                    'Синхронизированы: {}'.format(', '.join(synced))
+                ))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
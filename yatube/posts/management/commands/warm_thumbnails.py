@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from posts.thumbnails import backfill_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Заранее строит миниатюры картинок существующих постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Число потоков (по умолчанию THUMBNAIL_WORKERS)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Перестроить и уже готовые миниатюры'
+        )
+
+    def handle(self, *args, **options):
+        built, failed = backfill_thumbnails(
+            workers=options['workers'], force=options['force']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Построено миниатюр: {built}, ошибок: {failed}'
+        ))
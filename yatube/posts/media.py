@@ -0,0 +1,166 @@
+"""
+Сборка мусора в хранилище картинок и перенос старых файлов в него.
+
+Число ссылок на файл — число постов с его именем (по индексу
+posts_post_image), поэтому счётчик не расходится с таблицей при
+массовых UPDATE и вставках импорта. Файл без ссылок удаляется после
+коммита удаления или замены картинки, но не раньше MEDIA_GC_GRACE
+секунд с последнего сохранения: его могла только что переиспользовать
+загрузка, пост которой ещё не записан. Такие файлы и остатки старых
+загрузок убирает manage.py dedup_media.
+"""
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from sorl.thumbnail import default
+
+from .caching import bump_feeds, bump_post_card, post_scopes
+from .models import Post
+from .storage import file_digest, hashed_name
+from .thumbnails import _source
+
+# имя, которое уже дало хранилище по содержимому
+HASHED_NAME = re.compile(r'[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+def _field():
+    return Post._meta.get_field('image')
+
+
+def refresh_posts(image_name):
+    """Карточки и ленты постов с картинкой показывают новый файл."""
+    for post in Post.objects.select_related('author', 'group').filter(
+        image=image_name
+    ):
+        bump_post_card(post.pk)
+        bump_feeds(*post_scopes(post))
+
+
+def _age(storage, name):
+    modified = storage.get_modified_time(name)
+    return (timezone.now() - modified).total_seconds()
+
+
+def release_image(name):
+    """
+    Удаляет файл картинки и его миниатюры, если на него не ссылается
+    ни один пост. Возвращает, удалён ли файл.
+    """
+    storage = _field().storage
+    if not name or Post.objects.filter(image=name).exists():
+        return False
+    try:
+        if _age(storage, name) < settings.MEDIA_GC_GRACE:
+            return False
+    except (OSError, SuspiciousFileOperation):
+        # файла нет или имя указывает за пределы MEDIA_ROOT
+        return False
+    default.kvstore.delete_thumbnails(_source(name))
+    storage.delete(name)
+    return True
+
+
+def release_on_commit(name):
+    if name:
+        transaction.on_commit(lambda: release_image(name))
+
+
+def _rehash(storage, upload_to, name):
+    """Имя файла по содержимому или None, если файла нет."""
+    try:
+        with storage.open(name) as file:
+            digest = file_digest(File(file))
+    except (OSError, SuspiciousFileOperation):
+        return None
+    return hashed_name(upload_to + os.path.basename(name), digest)
+
+
+def _move(storage, name, target):
+    """
+    Переводит посты на файл target: совпадающий файл не копируется,
+    новый появляется жёсткой ссылкой на старый.
+    """
+    if not storage.exists(target):
+        os.makedirs(os.path.dirname(storage.path(target)), exist_ok=True)
+        try:
+            os.link(storage.path(name), storage.path(target))
+        except FileExistsError:
+            pass
+    Post.objects.filter(image=name).update(image=target)
+    refresh_posts(target)
+    default.kvstore.delete_thumbnails(_source(name))
+    storage.delete(name)
+
+
+def _garbage(storage, directory, referenced):
+    """Файлы каталога хранилища без ссылок старше MEDIA_GC_GRACE."""
+    directories, files = storage.listdir(directory)
+    for filename in files:
+        name = '/'.join(filter(None, [directory, filename]))
+        if name not in referenced and _age(
+            storage, name
+        ) >= settings.MEDIA_GC_GRACE:
+            yield name
+    for subdirectory in directories:
+        yield from _garbage(
+            storage, '/'.join(filter(None, [directory, subdirectory])),
+            referenced
+        )
+
+
+def dedup_media(workers=4, dry_run=False):
+    """
+    Переносит картинки постов со старыми именами в хранилище по
+    содержимому (хеши считаются параллельно в workers потоках) и
+    удаляет файлы, на которые не ссылается ни один пост, в каталогах
+    картинок. Возвращает счётчики.
+    """
+    field = _field()
+    storage = field.storage
+    upload_to = field.upload_to
+    names = Post.objects.exclude(image='').exclude(
+        image__isnull=True
+    ).order_by('image').values_list('image', flat=True).distinct()
+    legacy = [
+        name for name in names.iterator() if not HASHED_NAME.search(name)
+    ]
+    stats = dict.fromkeys(
+        ('moved', 'duplicates', 'missing', 'removed', 'freed'), 0
+    )
+    # каталоги картинок; файлы в корне MEDIA_ROOT не трогаются
+    directories = {upload_to.rstrip('/')} | {
+        os.path.dirname(name) for name in legacy if os.path.dirname(name)
+    }
+    with ThreadPoolExecutor(workers) as pool:
+        hashed = list(pool.map(
+            lambda name: _rehash(storage, upload_to, name), legacy
+        ))
+    targets = set()
+    for name, target in zip(legacy, hashed):
+        if target is None:
+            stats['missing'] += 1
+            continue
+        if target in targets or storage.exists(target):
+            stats['duplicates'] += 1
+            stats['freed'] += storage.size(name)
+        targets.add(target)
+        stats['moved'] += 1
+        if not dry_run:
+            _move(storage, name, target)
+    referenced = set(Post.objects.values_list('image', flat=True))
+    for directory in sorted(directories):
+        if not storage.exists(directory):
+            continue
+        for name in list(_garbage(storage, directory, referenced)):
+            stats['removed'] += 1
+            stats['freed'] += storage.size(name)
+            if not dry_run:
+                default.kvstore.delete_thumbnails(_source(name))
+                storage.delete(name)
+    return stats
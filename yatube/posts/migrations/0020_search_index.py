@@ -0,0 +1,213 @@
+# Generated by Django 2.2.6 on 2026-10-18 08:34
+
+import re
+from collections import Counter
+from functools import lru_cache
+
+from django.db import OperationalError, migrations, models
+import django.db.models.deletion
+
+FTS_TABLE = 'posts_post_fts'
+
+# Копия стеммера posts.search на момент миграции: миграция не должна
+# зависеть от кода приложения, который меняется вместе с моделями.
+WORD_RE = re.compile(r'\w+')
+VOWELS = 'аеиоуыэюя'
+
+# Окончания стеммера Snowball для русского языка. Группы с пометкой
+# «после а/я» отрезаются, только если перед окончанием стоит а или я.
+PERFECTIVE_GERUND_1 = ('вшись', 'вши', 'в')
+PERFECTIVE_GERUND_2 = ('ившись', 'ывшись', 'ивши', 'ывши', 'ив', 'ыв')
+ADJECTIVE = (
+    'ими', 'ыми', 'его', 'ого', 'ему', 'ому', 'ее', 'ие', 'ые', 'ое',
+    'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом', 'их', 'ых', 'ую',
+    'юю', 'ая', 'яя', 'ою', 'ею',
+)
+PARTICIPLE_1 = ('ем', 'нн', 'вш', 'ющ', 'щ')
+PARTICIPLE_2 = ('ивш', 'ывш', 'ующ')
+REFLEXIVE = ('ся', 'сь')
+VERB_1 = (
+    'ете', 'йте', 'ешь', 'нно', 'ла', 'на', 'ли', 'ем', 'ло', 'но',
+    'ет', 'ют', 'ны', 'ть', 'й', 'л', 'н',
+)
+VERB_2 = (
+    'ейте', 'уйте', 'ила', 'ыла', 'ена', 'ите', 'или', 'ыли', 'ило',
+    'ыло', 'ено', 'ует', 'уют', 'ены', 'ить', 'ыть', 'ишь', 'ей', 'уй',
+    'ил', 'ыл', 'им', 'ым', 'ен', 'ят', 'ит', 'ыт', 'ую', 'ю',
+)
+NOUN = (
+    'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях', 'ев', 'ов', 'ие',
+    'ье', 'еи', 'ии', 'ей', 'ой', 'ий', 'ям', 'ем', 'ам', 'ом', 'ах',
+    'ях', 'ию', 'ью', 'ия', 'ья', 'а', 'е', 'и', 'й', 'о', 'у', 'ы',
+    'ь', 'ю', 'я',
+)
+DERIVATIONAL = ('ость', 'ост')
+SUPERLATIVE = ('ейше', 'ейш')
+
+
+def _strip(word, endings, after_a=False):
+    """
+    Отрезает самое длинное из окончаний. Возвращает None, если
+    ни одно окончание не подошло.
+    """
+    for ending in sorted(endings, key=len, reverse=True):
+        if word.endswith(ending):
+            stem = word[:-len(ending)]
+            if after_a and not stem.endswith(('а', 'я')):
+                continue
+            return stem
+    return None
+
+
+def _strip_any(word, *groups):
+    for endings, after_a in groups:
+        stem = _strip(word, endings, after_a)
+        if stem is not None:
+            return stem
+    return None
+
+
+def _region(word):
+    """Позиция начала области после первого сочетания «гласная-согласная»."""
+    for i in range(1, len(word)):
+        if word[i - 1] in VOWELS and word[i] not in VOWELS:
+            return i + 1
+    return len(word)
+
+
+@lru_cache(maxsize=100000)
+def stem(word):
+    """Стеммер Snowball для русских слов; прочие слова не меняются."""
+    word = word.lower().replace('ё', 'е')
+    first_vowel = next(
+        (i for i, letter in enumerate(word) if letter in VOWELS), None
+    )
+    if first_vowel is None:
+        return word
+    prefix, rv = word[:first_vowel + 1], word[first_vowel + 1:]
+    rv = _step1(rv)
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    rv = _step3(prefix, rv)
+    return prefix + _step4(rv)
+
+
+def _step1(rv):
+    result = _strip_any(
+        rv, (PERFECTIVE_GERUND_1, True), (PERFECTIVE_GERUND_2, False)
+    )
+    if result is not None:
+        return result
+    reflexive = _strip(rv, REFLEXIVE)
+    if reflexive is not None:
+        rv = reflexive
+    for result in (
+        _strip_adjectival(rv),
+        _strip_any(rv, (VERB_1, True), (VERB_2, False)),
+        _strip(rv, NOUN),
+    ):
+        if result is not None:
+            return result
+    return rv
+
+
+def _step3(prefix, rv):
+    """Словообразовательное окончание ищется в области R2."""
+    word = prefix + rv
+    r1 = _region(word)
+    r2 = r1 + _region(word[r1:])
+    derivational = _strip(word[r2:], DERIVATIONAL)
+    if derivational is not None:
+        word = word[:r2] + derivational
+    return word[len(prefix):]
+
+
+def _step4(rv):
+    if rv.endswith('нн'):
+        return rv[:-1]
+    superlative = _strip(rv, SUPERLATIVE)
+    if superlative is not None:
+        return superlative[:-1] if superlative.endswith('нн') else superlative
+    if rv.endswith('ь'):
+        return rv[:-1]
+    return rv
+
+
+def _strip_adjectival(rv):
+    stem = _strip(rv, ADJECTIVE)
+    if stem is None:
+        return None
+    participle = _strip_any(
+        stem, (PARTICIPLE_1, True), (PARTICIPLE_2, False)
+    )
+    return stem if participle is None else participle
+
+
+def tokenize(text):
+    """Разбивает текст на основы слов."""
+    return [stem(word) for word in WORD_RE.findall((text or '').lower())]
+
+
+def create_search_index(apps, schema_editor):
+    """
+    На SQLite с FTS5 индекс хранится в виртуальной таблице, иначе
+    заполняется запасной инвертированный индекс PostTerm.
+    """
+    Post = apps.get_model('posts', 'Post')
+    PostTerm = apps.get_model('posts', 'PostTerm')
+    connection = schema_editor.connection
+    fts5 = False
+    if connection.vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(body)'
+            )
+            fts5 = True
+        except OperationalError:
+            pass
+    posts = Post.objects.only('pk', 'text').iterator(chunk_size=1000)
+    for post in posts:
+        terms = tokenize(post.text)
+        if fts5:
+            schema_editor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, body) VALUES (%s, %s)',
+                [post.pk, ' '.join(terms)]
+            )
+        else:
+            PostTerm.objects.bulk_create(
+                PostTerm(post_id=post.pk, term=term[:100], count=count)
+                for term, count in Counter(terms).items()
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=100, verbose_name='Основа слова')),
+                ('count', models.PositiveIntegerField(default=1, verbose_name='Вхождений')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='posts.Post')),
+            ],
+            options={
+                'verbose_name': 'Слово поста',
+                'verbose_name_plural': 'Слова постов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='postterm',
+            index=models.Index(fields=['term', 'post'], name='posts_term_post_idx'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,9 +1,91 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import connections, models
+from django.db.models import (
+    Count, F, Func, IntegerField, OuterRef, Subquery
+)
+from django.utils import timezone
+
+from .storage import HashedStorage
 
 User = get_user_model()
 
 
+def bulk_create_chunked(manager, objects, chunk_size=1000, **kwargs):
+    """
+    bulk_create по частям: генератор не разворачивается целиком, а
+    размер пакета внутри части Django подбирает под ограничения базы
+    (в SQLite не больше 500 строк в одном INSERT).
+    """
+    objects = iter(objects)
+    while True:
+        chunk = list(islice(objects, chunk_size))
+        if not chunk:
+            return
+        manager.bulk_create(chunk, **kwargs)
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """
+    Отключает auto_now_add, чтобы bulk_create сохранил заданные даты
+    (синтетические или импортированные), а не момент вставки.
+    """
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field, _ in saved:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in saved:
+            field.auto_now_add = value
+
+
+# поля позиции поста в ленте подписок для курсорной пагинации
+TIMELINE_POSITION = {'field': 'timeline_date', 'pk_field': 'timeline_post'}
+# запас при подтягивании постов популярных авторов: пост с датой
+# чуть раньше прошлого подтягивания мог тогда ещё не закоммититься
+TIMELINE_PULL_OVERLAP = timedelta(minutes=1)
+
+
+class PostQuerySet(models.QuerySet):
+    def feed(self):
+        """
+        Лента постов: автор и сообщество подтягиваются одним запросом,
+        количество комментариев считается в нём же.
+        """
+        return self.select_related('author', 'group').with_comments_count(
+        ).order_by('-pub_date', '-id')
+
+    def with_comments_count(self):
+        """
+        Количество комментариев подзапросом по индексу комментариев:
+        без JOIN и GROUP BY лента идёт по индексу постов сразу в нужном
+        порядке, без сортировки во временном B-дереве.
+        """
+        comments = Comment.objects.filter(post=OuterRef('pk')).order_by(
+        ).annotate(count=Func('pk', function='COUNT')).values('count')
+        return self.annotate(comments_count=Subquery(
+            comments, output_field=IntegerField()
+        ))
+
+    def timeline(self, user):
+        """
+        Посты ленты подписок пользователя в порядке её записей: страница
+        читается по индексу записей (user, pub_date, post) без
+        сортировки. Позиция в ленте — поля TIMELINE_POSITION.
+        """
+        return self.filter(timeline_entries__user=user).annotate(
+            timeline_date=F('timeline_entries__pub_date'),
+            timeline_post=F('timeline_entries__post_id'),
+        ).order_by('-timeline_date', '-timeline_post')
+
+
 class Post(models.Model):
     text = models.TextField(
         'Содержание',
@@ -30,18 +112,77 @@ class Post(models.Model):
     )
     image = models.ImageField(
         upload_to='posts/',
+        storage=HashedStorage(),
         blank=True,
         null=True
     )
+    # SHA-256 обработанной картинки; пустой, пока её не обработали
+    image_hash = models.CharField(
+        'Хеш картинки',
+        max_length=64,
+        blank=True,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         verbose_name_plural = 'Посты'
         verbose_name = 'Пост'
         ordering = ["-pub_date"]
+        indexes = [
+            # ленты автора и сообщества: WHERE по ключу и ORDER BY по
+            # дате читаются одним проходом индекса (id — rowid, он в
+            # конце каждого индекса SQLite)
+            models.Index(
+                fields=['author', 'pub_date'],
+                name='posts_post_author_pub_date'
+            ),
+            models.Index(
+                fields=['group', 'pub_date'],
+                name='posts_post_group_pub_date'
+            ),
+            # ссылки на файл картинки: сборка мусора хранилища
+            models.Index(fields=['image'], name='posts_post_image'),
+        ]
 
     def __str__(self):
         return self.text
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        post = super().from_db(db, field_names, values)
+        # сообщество на момент загрузки: при смене нужно сбросить кэш
+        # ленты и старого сообщества; отложенное поле не читается, чтобы
+        # не делать запрос на каждую строку
+        if 'group_id' in field_names:
+            post._loaded_group_id = post.group_id
+        # картинка на момент загрузки: заменённый файл без других ссылок
+        # удаляется
+        if 'image' in field_names:
+            post._loaded_image = post.image.name
+        return post
+
+
+class PostTerm(models.Model):
+    """Запись инвертированного индекса поиска: основа слова в посте."""
+    TERM_LENGTH = 100
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='terms'
+    )
+    term = models.CharField('Основа слова', max_length=TERM_LENGTH)
+    count = models.PositiveIntegerField('Вхождений', default=1)
+
+    class Meta:
+        verbose_name_plural = 'Слова постов'
+        verbose_name = 'Слово поста'
+        indexes = [
+            models.Index(fields=['term', 'post'], name='posts_term_post_idx')
+        ]
+
 
 class Group(models.Model):
     title = models.CharField('Сообщество', max_length=200)
@@ -79,6 +220,13 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            # страницы комментариев поста читаются по (post, created)
+            models.Index(
+                fields=['post', 'created'],
+                name='posts_comment_post_created'
+            )
+        ]
 
     def __str__(self):
         return self.text
@@ -97,6 +245,12 @@ class Follow(models.Model):
         related_name="following",
         null=True
     )
+    # время подписки нужно трендам; у старых подписок его нет
+    created = models.DateTimeField(
+        'Дата подписки',
+        auto_now_add=True,
+        null=True
+    )
 
     class Meta:
         constraints = [
@@ -105,3 +259,377 @@ class Follow(models.Model):
                 name="unique_follow_list"
             )
         ]
+
+
+class UserStatsManager(models.Manager):
+    def for_user(self, user_id):
+        """
+        Возвращает счётчики пользователя, при отсутствии записи
+        пересчитывает их по таблицам.
+        """
+        try:
+            return self.get(user_id=user_id)
+        except self.model.DoesNotExist:
+            stats, _ = self.get_or_create(
+                user_id=user_id,
+                defaults=self.count_for_user(user_id)
+            )
+            return stats
+
+    def count_for_user(self, user_id):
+        return {
+            'post_count': Post.objects.filter(author_id=user_id).count(),
+            'comment_count': Comment.objects.filter(
+                author_id=user_id
+            ).count(),
+            'follower_count': Follow.objects.filter(
+                author_id=user_id
+            ).count(),
+            'following_count': Follow.objects.filter(
+                user_id=user_id
+            ).count(),
+        }
+
+    def bump(self, user_id, **deltas):
+        """
+        Атомарно изменяет счётчики пользователя на указанные величины.
+        Отсутствующая запись создаётся пересчётом, но только при росте
+        счётчиков: удаление не должно воскрешать удалённого пользователя.
+        """
+        if user_id is None:
+            return
+        updated = self.filter(user_id=user_id).update(**{
+            field: models.F(field) + delta
+            for field, delta in deltas.items()
+        })
+        if not updated and min(deltas.values()) > 0:
+            self.for_user(user_id)
+
+    def rebuild(self, batch_size=1000):
+        """Пересчитывает счётчики всех пользователей с нуля."""
+        def grouped(queryset, field):
+            return dict(
+                queryset.order_by()
+                .values_list(field)
+                .annotate(count=Count('pk'))
+            )
+
+        posts = grouped(Post.objects.all(), 'author_id')
+        comments = grouped(Comment.objects.all(), 'author_id')
+        followers = grouped(Follow.objects.all(), 'author_id')
+        following = grouped(Follow.objects.all(), 'user_id')
+        self.all().delete()
+        bulk_create_chunked(
+            self,
+            (
+                self.model(
+                    user_id=user_id,
+                    post_count=posts.get(user_id, 0),
+                    comment_count=comments.get(user_id, 0),
+                    follower_count=followers.get(user_id, 0),
+                    following_count=following.get(user_id, 0),
+                )
+                for user_id in User.objects.values_list('pk', flat=True)
+            ),
+            chunk_size=batch_size
+        )
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    post_count = models.PositiveIntegerField('Записей', default=0)
+    comment_count = models.PositiveIntegerField('Комментариев', default=0)
+    follower_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+    # когда в ленту подписок последний раз подтягивались посты
+    # популярных авторов (TimelineEntry.objects.pull)
+    timeline_pulled = models.DateTimeField(
+        'Лента дополнена', null=True, blank=True
+    )
+
+    objects = UserStatsManager()
+
+    class Meta:
+        verbose_name_plural = 'Счётчики пользователей'
+        verbose_name = 'Счётчики пользователя'
+
+    def __str__(self):
+        return str(self.user_id)
+
+
+class TimelineEntryManager(models.Manager):
+    def is_popular(self, author_id):
+        """Популярным авторам посты не рассылаются, их ленты читаются."""
+        return UserStats.objects.for_user(author_id).follower_count >= (
+            settings.TIMELINE_FANOUT_LIMIT
+        )
+
+    def _add(self, user_ids, posts):
+        """Записи лент пользователей user_ids для пар (id, дата) постов."""
+        bulk_create_chunked(
+            self,
+            (
+                self.model(user_id=user_id, post_id=pk, pub_date=pub_date)
+                for user_id in user_ids for pk, pub_date in posts
+            ),
+            ignore_conflicts=True
+        )
+
+    def fan_out(self, post):
+        """Раскладывает новый пост в ленты подписчиков автора."""
+        if self.is_popular(post.author_id):
+            return
+        followers = Follow.objects.filter(
+            author_id=post.author_id,
+            user__isnull=False
+        ).values_list('user_id', flat=True)
+        self._add(followers.iterator(), [(post.pk, post.pub_date)])
+
+    def backfill(self, user_id, author_id):
+        """
+        Добавляет в ленту последние TIMELINE_BACKFILL_LIMIT постов
+        автора, на которого подписался пользователь. Популярного тоже:
+        подтягивание при чтении (pull) добавляет только новые посты.
+        """
+        self._add([user_id], list(self.latest_posts(author_id)))
+
+    def follower_left(self, author_id):
+        """
+        Если автор опустился ниже TIMELINE_FANOUT_LIMIT, его посты снова
+        рассылаются, а вышедшие, пока он был популярен, раскладываются
+        по лентам всех подписчиков: подтягивание при чтении его больше
+        не учитывает.
+        """
+        follower_count = UserStats.objects.for_user(author_id).follower_count
+        if follower_count != settings.TIMELINE_FANOUT_LIMIT - 1:
+            return
+        followers = Follow.objects.filter(
+            author_id=author_id, user__isnull=False
+        ).values_list('user_id', flat=True)
+        self._add(followers.iterator(), list(self.latest_posts(author_id)))
+
+    def pull(self, user):
+        """
+        Подтягивает в ленту посты популярных авторов пользователя,
+        вышедшие после прошлого подтягивания: им посты не рассылаются,
+        поэтому лента дополняется при чтении и читается одним индексом.
+        """
+        limit = settings.TIMELINE_FANOUT_LIMIT
+        authors = list(Follow.objects.filter(
+            user=user, author__stats__follower_count__gte=limit
+        ).values_list('author_id', flat=True))
+        if not authors:
+            return
+        now = timezone.now()
+        pulled = UserStats.objects.for_user(user.pk).timeline_pulled
+        posts = Post.objects.filter(author_id__in=authors)
+        if pulled is not None:
+            posts = posts.filter(
+                pub_date__gte=pulled - TIMELINE_PULL_OVERLAP
+            )
+        self._add([user.pk], list(posts.order_by('-pub_date').values_list(
+            'pk', 'pub_date'
+        )[:settings.TIMELINE_BACKFILL_LIMIT]))
+        UserStats.objects.filter(user_id=user.pk).update(timeline_pulled=now)
+
+    def latest_posts(self, author_id):
+        return Post.objects.filter(author_id=author_id).order_by(
+            '-pub_date'
+        ).values_list(
+            'pk', 'pub_date'
+        )[:settings.TIMELINE_BACKFILL_LIMIT]
+
+    def prune(self, user_id, author_id):
+        self.filter(user_id=user_id, post__author_id=author_id).delete()
+
+    def rebuild(self, users=None):
+        """Пересобирает ленты пользователей по текущим подпискам."""
+        entries = self.all()
+        follows = Follow.objects.filter(
+            user__isnull=False,
+            author__isnull=False
+        )
+        if users is not None:
+            entries = entries.filter(user__in=users)
+            follows = follows.filter(user__in=users)
+        entries.delete()
+        followers = defaultdict(list)
+        for user_id, author_id in follows.values_list(
+            'user_id', 'author_id'
+        ).iterator():
+            followers[author_id].append(user_id)
+        # последние посты автора читаются один раз на всех подписчиков,
+        # а строки вставляются без создания объектов модели
+        sql = (
+            'INSERT INTO {} (user_id, post_id, pub_date) '
+            'VALUES (%s, %s, %s)'
+        ).format(self.model._meta.db_table)
+        with connections[self.db].cursor() as cursor:
+            for author_id, user_ids in followers.items():
+                posts = list(self.latest_posts(author_id))
+                cursor.executemany(sql, [
+                    (user_id, post_id, pub_date)
+                    for user_id in user_ids for post_id, pub_date in posts
+                ])
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    # дата поста: по ней лента читается из индекса записей
+    pub_date = models.DateTimeField('Дата публикации')
+
+    objects = TimelineEntryManager()
+
+    class Meta:
+        verbose_name_plural = 'Записи лент'
+        verbose_name = 'Запись ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'pub_date', 'post'],
+                name='posts_timeline_user_date'
+            ),
+        ]
+
+
+class SuggestionManager(models.Manager):
+    def for_user(self, user):
+        """Рекомендации пользователю: чтение по индексу (user, -score)."""
+        if not user.is_authenticated:
+            return []
+        return list(self.filter(user=user).select_related('author').order_by(
+            '-score'
+        )[:settings.SUGGESTIONS_PER_USER])
+
+    def replace(self, user_id, scores):
+        """
+        Заменяет рекомендации пользователя лучшими SUGGESTIONS_PER_USER
+        из scores {author_id: вес}, кроме уже читаемых авторов.
+        """
+        following = set(Follow.objects.filter(
+            user_id=user_id
+        ).values_list('author_id', flat=True))
+        best = sorted(
+            (
+                (score, author_id) for author_id, score in scores.items()
+                if score > 0 and author_id != user_id
+                and author_id not in following
+            ),
+            reverse=True
+        )[:settings.SUGGESTIONS_PER_USER]
+        self.filter(user_id=user_id).delete()
+        self.bulk_create(
+            self.model(user_id=user_id, author_id=author_id, score=score)
+            for score, author_id in best
+        )
+
+    def raise_scores(self, user_id, author_ids, weight):
+        """Прибавляет weight к весам авторов и пересобирает список."""
+        scores = dict(self.filter(user_id=user_id).values_list(
+            'author_id', 'score'
+        ))
+        for author_id in author_ids:
+            scores[author_id] = scores.get(author_id, 0) + weight
+        self.replace(user_id, scores)
+
+    def lower_scores(self, user_id, author_ids, weight):
+        """
+        Вычитает weight из весов авторов. Строки только меняются и
+        удаляются: при каскадном удалении пользователя отписки не
+        должны создавать ему новых рекомендаций.
+        """
+        rows = self.filter(user_id=user_id, author_id__in=list(author_ids))
+        rows.update(score=models.F('score') - weight)
+        rows.filter(score__lte=0).delete()
+
+
+class Suggestion(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='suggestions',
+        verbose_name='Читатель'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рекомендуемый автор'
+    )
+    score = models.FloatField('Вес')
+
+    objects = SuggestionManager()
+
+    class Meta:
+        verbose_name_plural = 'Рекомендации авторов'
+        verbose_name = 'Рекомендация автора'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_suggestion'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-score'], name='posts_suggestion_user_score'
+            )
+        ]
+
+
+class PostTrend(models.Model):
+    """
+    Вес поста в трендах в логарифмической шкале: log2 суммы
+    weight * 2 ** (t / TRENDING_HALF_LIFE) по событиям (t — часы).
+    Порядок по весу — порядок по затухающей активности, а сам вес
+    со временем не пересчитывается.
+    """
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trend',
+        verbose_name='Пост'
+    )
+    score = models.FloatField('Вес', db_index=True)
+
+    class Meta:
+        verbose_name_plural = 'Тренды постов'
+        verbose_name = 'Тренд поста'
+
+
+class GroupTrend(models.Model):
+    """Вес сообщества в трендах, в той же шкале, что у постов."""
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trend',
+        verbose_name='Сообщество'
+    )
+    score = models.FloatField('Вес', db_index=True)
+
+    class Meta:
+        verbose_name_plural = 'Тренды сообществ'
+        verbose_name = 'Тренд сообщества'
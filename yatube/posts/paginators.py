@@ -0,0 +1,191 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+CURSOR_MODE = 'cursor'
+NUMBERED_MODE = 'numbered'
+
+
+def post_position(post):
+    return post.pub_date, post.pk
+
+
+def comment_position(comment):
+    return comment.created, comment.pk
+
+
+def encode_cursor(position, reverse=False):
+    """Курсор по позиции (дата, id) записи в ленте."""
+    moment, pk = position
+    data = {'d': moment.isoformat(), 'i': pk}
+    if reverse:
+        data['r'] = 1
+    raw = json.dumps(data, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Разбирает курсор в тройку (pub_date, id, reverse).
+    Для испорченного курсора возвращает None.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw.decode())
+        pub_date = parse_datetime(data['d'])
+        pk = int(data['i'])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk, bool(data.get('r'))
+
+
+class CursorPage:
+    """
+    Страница ленты без номеров: хранит только соседние курсоры,
+    поэтому не требует ни OFFSET, ни COUNT(*).
+    """
+    cursor_mode = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<Cursor page of %s posts>' % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @cached_property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return encode_cursor(self.paginator.key(self.object_list[-1]))
+
+    @cached_property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return encode_cursor(
+            self.paginator.key(self.object_list[0]), reverse=True
+        )
+
+
+class CursorPaginator:
+    """
+    Keyset-пагинация по (pub_date, id): каждая страница выбирается
+    условием по ключу последней записи и читается по индексу pub_date.
+    Для другой даты (например, created комментариев) или строк
+    .values() передаются field и key — функция, возвращающая пару
+    (дата, id) записи. pk_field заменяет id в условии и сортировке,
+    если позиция читается из другой таблицы (ленты подписок).
+    """
+    def __init__(self, object_list, per_page, field='pub_date',
+                 key=post_position, pk_field='pk'):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.field = field
+        self.key = key
+        self.pk_field = pk_field
+
+    def get_page(self, cursor=None):
+        position = decode_cursor(cursor) if cursor else None
+        if position is None:
+            return self._forward_page(self.query(), has_previous=False)
+        pub_date, pk, reverse = position
+        if reverse:
+            return self._backward_page(self.query(pub_date, pk, reverse))
+        return self._forward_page(
+            self.query(pub_date, pk), has_previous=True
+        )
+
+    def query(self, pub_date=None, pk=None, reverse=False):
+        """
+        Запрос записей страницы (на одну больше per_page, чтобы знать
+        о следующей): первой, после позиции (pub_date, pk) или перед
+        ней при reverse.
+        """
+        queryset = self.object_list
+        if pub_date is not None:
+            lookup = 'gt' if reverse else 'lt'
+            # простая граница диапазона дублирует условие ниже: по ней
+            # SQLite начинает чтение индекса с позиции курсора, а не
+            # проходит его от начала ленты
+            queryset = queryset.filter(
+                **{self.field + '__' + lookup + 'e': pub_date}
+            ).filter(
+                Q(**{self.field + '__' + lookup: pub_date})
+                | Q(**{
+                    self.field: pub_date, self.pk_field + '__' + lookup: pk
+                })
+            )
+        if reverse:
+            ordering = (self.field, self.pk_field)
+        else:
+            ordering = ('-' + self.field, '-' + self.pk_field)
+        return queryset.order_by(*ordering)[:self.per_page + 1]
+
+    def _forward_page(self, queryset, has_previous):
+        posts = list(queryset)
+        return CursorPage(
+            posts[:self.per_page],
+            self,
+            has_next=len(posts) > self.per_page,
+            has_previous=has_previous,
+        )
+
+    def _backward_page(self, queryset):
+        posts = list(queryset)
+        has_previous = len(posts) > self.per_page
+        posts = posts[:self.per_page]
+        posts.reverse()
+        return CursorPage(
+            posts,
+            self,
+            has_next=True,
+            has_previous=has_previous,
+        )
+
+
+def paginate(request, queryset, mode=None, **position):
+    """
+    Возвращает страницу ленты. Курсорный режим включается параметром
+    ?cursor= или настройкой FEED_PAGINATION, номерной остаётся для
+    ?page= и небольших лент. position — поля позиции для
+    CursorPaginator (field, pk_field).
+    """
+    mode = mode or getattr(settings, 'FEED_PAGINATION', NUMBERED_MODE)
+    if 'cursor' in request.GET or (
+        mode == CURSOR_MODE and 'page' not in request.GET
+    ):
+        paginator = CursorPaginator(
+            queryset, settings.POSTS_PER_PAGE, **position
+        )
+        return paginator.get_page(request.GET.get('cursor'))
+    paginator = Paginator(queryset, settings.POSTS_PER_PAGE)
+    return paginator.get_page(request.GET.get('page'))
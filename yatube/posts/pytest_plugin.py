@@ -0,0 +1,69 @@
+"""
+Плагин pytest: маркер max_repeated_queries и опция
+--max-repeated-queries валят тест, в котором один шаблон SQL-запроса
+выполнился больше порога раз. Считаются только запросы самого теста,
+без подготовки фикстур.
+"""
+import pytest
+
+MARKER = 'max_repeated_queries'
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        '--max-repeated-queries',
+        type=int,
+        default=None,
+        help='Порог повторов одного шаблона запроса для всех тестов'
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers',
+        f'{MARKER}(threshold=None): тест падает, если шаблон SQL-запроса '
+        'выполнен больше threshold раз (по умолчанию '
+        'REPEATED_QUERIES_THRESHOLD)'
+    )
+
+
+def _detector(item):
+    marker = item.get_closest_marker(MARKER)
+    threshold = item.config.getoption('--max-repeated-queries')
+    if marker is None and threshold is None:
+        return None
+    if marker is not None:
+        threshold = marker.kwargs.get(
+            'threshold', marker.args[0] if marker.args else None
+        )
+    from posts.querycheck import RepeatedQueryDetector
+    return RepeatedQueryDetector(threshold)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    detector = _detector(item)
+    if detector is None:
+        yield
+        return
+    with detector.watch():
+        yield
+    item.repeated_queries = detector
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    outcome = yield
+    report = outcome.get_result()
+    detector = getattr(item, 'repeated_queries', None)
+    if report.when == 'call' and report.passed and detector is not None:
+        if detector.violations():
+            report.outcome = 'failed'
+            report.longrepr = detector.failure_message()
+
+
+@pytest.fixture
+def repeated_queries():
+    """Детектор для проверки части теста: with repeated_queries.watch()."""
+    from posts.querycheck import RepeatedQueryDetector
+    return RepeatedQueryDetector()
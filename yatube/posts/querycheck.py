@@ -0,0 +1,167 @@
+import logging
+import os
+import re
+import sys
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.template.base import Node
+
+logger = logging.getLogger('posts.repeated_queries')
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER_RE = re.compile(r'%s|\?')
+LIST_RE = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+SPACE_RE = re.compile(r'\s+')
+
+# корень репозитория: в отчёт попадают и кадры тестов из tests/
+PROJECT_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+# управление транзакциями повторяется законно и в отчёт не входит
+TRANSACTION_RE = re.compile(
+    r'^(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE)\b', re.IGNORECASE
+)
+# обёртки, через которые проходит каждый запрос: место вызова ищется
+# за ними
+INFRASTRUCTURE = {
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    for name in ('querycheck.py', 'instrumentation.py')
+}
+
+
+def fingerprint(sql):
+    """
+    Шаблон запроса: литералы и параметры заменены на ?, списки IN
+    свёрнуты, чтобы запросы, отличающиеся только значениями, совпали.
+    """
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = PLACEHOLDER_RE.sub('?', sql)
+    sql = LIST_RE.sub('(...)', sql)
+    return SPACE_RE.sub(' ', sql).strip()
+
+
+def call_site():
+    """
+    Откуда выполнен запрос: строка шаблона, если запрос вызван при
+    рендеринге, иначе ближайший кадр кода проекта.
+    """
+    frame = sys._getframe(1)
+    project_line = None
+    while frame is not None:
+        code = frame.f_code
+        if code is Node.render_annotated.__code__:
+            node = frame.f_locals.get('self')
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                name = origin.template_name or origin.name
+                return '{}:{}'.format(name, token.lineno)
+        filename = os.path.abspath(code.co_filename)
+        if (
+            project_line is None
+            and filename.startswith(PROJECT_DIR)
+            and filename not in INFRASTRUCTURE
+            and os.sep + 'site-packages' + os.sep not in filename
+        ):
+            project_line = '{}:{}'.format(
+                os.path.relpath(filename, PROJECT_DIR), frame.f_lineno
+            )
+        frame = frame.f_back
+    return project_line or '<unknown>'
+
+
+class RepeatedQueryDetector:
+    """
+    Считает запросы по шаблонам. Шаблон, выполненный больше threshold
+    раз, — признак N+1: запрос в цикле вместо одного общего.
+    """
+    def __init__(self, threshold=None):
+        if threshold is None:
+            threshold = settings.REPEATED_QUERIES_THRESHOLD
+        self.threshold = threshold
+        self.counts = Counter()
+        self.sites = defaultdict(Counter)
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обёртка для connection.execute_wrapper."""
+        shape = fingerprint(sql)
+        if not TRANSACTION_RE.match(shape):
+            self.counts[shape] += 1
+            self.sites[shape][call_site()] += 1
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def watch(self, using=None):
+        aliases = [using] if using else list(connections)
+        with ExitStack() as stack:
+            for alias in aliases:
+                stack.enter_context(connections[alias].execute_wrapper(self))
+            yield self
+
+    def violations(self):
+        return [
+            (shape, count, self.sites[shape].most_common())
+            for shape, count in self.counts.most_common()
+            if count > self.threshold
+        ]
+
+    def report(self):
+        lines = []
+        for shape, count, sites in self.violations():
+            lines.append(f'{count} раз: {shape}')
+            lines.extend(f'    {site} ({hits})' for site, hits in sites)
+        return '\n'.join(lines)
+
+    def failure_message(self):
+        return 'Повторяющиеся запросы (порог {}):\n{}'.format(
+            self.threshold, self.report()
+        )
+
+    def check(self):
+        if self.violations():
+            raise AssertionError(self.failure_message())
+
+
+@contextmanager
+def detect_repeated_queries(threshold=None, using=None):
+    """
+    Проверяет, что внутри блока ни один шаблон запроса не выполнился
+    больше threshold раз; иначе бросает AssertionError с отчётом.
+    """
+    detector = RepeatedQueryDetector(threshold)
+    with detector.watch(using):
+        yield detector
+    detector.check()
+
+
+class RepeatedQueriesMixin:
+    """assertNoRepeatedQueries() для unittest, как assertNumQueries."""
+    def assertNoRepeatedQueries(self, threshold=None, using=None):
+        return detect_repeated_queries(threshold, using)
+
+
+class RepeatedQueriesMiddleware:
+    """
+    Режим для стейджинга: при REPEATED_QUERIES_LOG пишет в журнал
+    posts.repeated_queries запросы, повторённые больше порога.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.REPEATED_QUERIES_LOG:
+            return self.get_response(request)
+        detector = RepeatedQueryDetector()
+        with detector.watch():
+            response = self.get_response(request)
+        if detector.violations():
+            logger.warning(
+                'Повторяющиеся запросы на %s %s:\n%s',
+                request.method, request.get_full_path(), detector.report()
+            )
+        return response
@@ -0,0 +1,97 @@
+"""
+Проверка планов запросов лент через EXPLAIN QUERY PLAN (SQLite).
+
+Запрос страницы ленты должен читать строки по индексу в порядке
+выдачи: полный проход таблицы или сортировка во временном B-дереве
+означают, что время страницы растёт вместе с таблицей. Страница после
+курсора к тому же должна начинать чтение индекса с позиции курсора
+(SEARCH по диапазону), а не проходить его от начала ленты.
+"""
+from django.conf import settings
+from django.db import connections
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import TIMELINE_POSITION, Comment, Group, Post, User
+from .paginators import CursorPaginator, comment_position
+from .trending import hot_groups, trending_posts
+
+
+def explain(queryset):
+    """Строки EXPLAIN QUERY PLAN для запроса."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'sqlite':
+        raise ValueError('Планы разбираются только для SQLite')
+    sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def plan_problems(details, cursor=False):
+    """
+    Полные проходы таблиц и сортировки во временном B-дереве. Для
+    страницы после курсора (cursor) проблема и проход индекса без
+    границы диапазона.
+    """
+    problems = []
+    for detail in details:
+        words = detail.split()
+        if words[:1] == ['SCAN']:
+            if words[1:3] == ['CONSTANT', 'ROW']:
+                continue
+            if 'USING' not in words or cursor:
+                problems.append(detail)
+        elif detail.startswith('USE TEMP B-TREE'):
+            problems.append(detail)
+    return problems
+
+
+def _sample_id(queryset):
+    # планы не зависят от значений, но со статистикой ANALYZE
+    # реальные ключи дают честную картину
+    return queryset.aggregate(last=Max('pk'))['last'] or 1
+
+
+def feed_queries():
+    """
+    Пары (имя, запрос) для страниц лент: первая страница, а для
+    курсорной пагинации — страницы после и перед курсором; тренды.
+    """
+    per_page = int(settings.POSTS_PER_PAGE)
+    moment = timezone.now()
+    user = User(pk=_sample_id(User.objects.all()))
+    post_id = _sample_id(Post.objects.all())
+    feeds = {
+        'index': (Post.objects.feed(), {}),
+        'group': (Post.objects.feed().filter(
+            group_id=_sample_id(Group.objects.all())
+        ), {}),
+        'profile': (Post.objects.feed().filter(author_id=user.pk), {}),
+        'follow': (Post.objects.feed().timeline(user), TIMELINE_POSITION),
+    }
+    for name, (queryset, position) in feeds.items():
+        yield name, queryset[:per_page]
+        paginator = CursorPaginator(queryset, per_page, **position)
+        yield name + ':next', paginator.query(moment, post_id)
+        yield name + ':previous', paginator.query(moment, post_id, True)
+    yield 'trending', trending_posts()
+    yield 'hot_groups', hot_groups()
+    comments = CursorPaginator(
+        Comment.objects.filter(post_id=post_id).select_related('author'),
+        settings.COMMENTS_PER_PAGE,
+        field='created',
+        key=comment_position,
+    )
+    yield 'comments', comments.query()
+    yield 'comments:next', comments.query(moment, 1)
+
+
+def check_feeds():
+    """Тройки (имя, план, проблемы)."""
+    results = []
+    for name, queryset in feed_queries():
+        details = explain(queryset)
+        problems = plan_problems(details, cursor=':' in name)
+        results.append((name, details, problems))
+    return results
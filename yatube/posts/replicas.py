@@ -0,0 +1,134 @@
+import random
+import sqlite3
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'primary_pin'
+PIN_SALT = 'posts.replicas'
+# сессия пишется почти в каждом входе и нужна сразу после записи
+PRIMARY_APPS = {'sessions'}
+
+# состояние текущего запроса; вне запросов (команды, фоновые задачи)
+# его нет и всё читается из основной базы
+_state = ContextVar('replica_state', default=None)
+
+
+class RequestState:
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def current_state():
+    return _state.get()
+
+
+@contextmanager
+def read_from_primary():
+    """
+    Чтение внутри блока идёт в основную базу: так заполняется кэш,
+    чтобы отстающая реплика не попала в него под новой версией.
+    """
+    state = _state.get()
+    if state is None:
+        yield
+        return
+    pinned = state.pinned
+    state.pinned = True
+    try:
+        yield
+    finally:
+        state.pinned = pinned or state.wrote
+
+
+class ReplicaRouter:
+    """
+    Запись — в основную базу, чтение в запросах — в случайную реплику
+    из DATABASE_REPLICAS, если сессия не закреплена за основной.
+    """
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        replicas = settings.DATABASE_REPLICAS
+        if state is None or state.pinned or not replicas:
+            return DEFAULT_DB_ALIAS
+        if model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        # внутри транзакции читаем то же, что пишем
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            # остаток запроса тоже читает из основной базы
+            state.pinned = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # в репликах те же данные, что и в основной базе
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class PrimaryPinningMiddleware:
+    """
+    Read-your-writes: после записи ставит подписанную куку, и ещё
+    REPLICA_PIN_SECONDS секунд запросы этой сессии читают из основной
+    базы, пока реплики догоняют. Кука, а не сессия: сессия сама
+    читается через роутер.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pin = settings.REPLICA_PIN_SECONDS
+        pinned = request.get_signed_cookie(
+            PIN_COOKIE, default=None, salt=PIN_SALT, max_age=pin
+        ) is not None
+        state = RequestState(pinned)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote:
+            response.set_signed_cookie(
+                PIN_COOKIE, '1', salt=PIN_SALT, max_age=pin, httponly=True,
+                samesite='Lax'
+            )
+        return response
+
+
+def copy_database(source, target):
+    """
+    Копия файла SQLite через backup API: читатели реплики не видят
+    полузаписанную базу.
+    """
+    source_db = sqlite3.connect(source)
+    target_db = sqlite3.connect(target)
+    try:
+        source_db.backup(target_db)
+    finally:
+        target_db.close()
+        source_db.close()
+
+
+def sync_replicas(aliases=None):
+    """
+    Имитация репликации для локальной разработки: переносит основную
+    базу SQLite в файлы реплик. Возвращает синхронизированные базы.
+    """
+    primary = connections.databases[DEFAULT_DB_ALIAS]
+    if primary['ENGINE'] != 'django.db.backends.sqlite3':
+        raise ValueError('Синхронизация нужна только репликам SQLite')
+    synced = []
+    for alias in aliases or settings.DATABASE_REPLICAS:
+        copy_database(primary['NAME'], connections.databases[alias]['NAME'])
+        synced.append(alias)
+    return synced
@@ -0,0 +1,284 @@
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import Case, Count, F, FloatField, Sum, Value, When
+
+from .models import Post, PostTerm
+
+WORD_RE = re.compile(r'\w+')
+VOWELS = 'аеиоуыэюя'
+
+# Окончания стеммера Snowball для русского языка. Группы с пометкой
+# «после а/я» отрезаются, только если перед окончанием стоит а или я.
+PERFECTIVE_GERUND_1 = ('вшись', 'вши', 'в')
+PERFECTIVE_GERUND_2 = ('ившись', 'ывшись', 'ивши', 'ывши', 'ив', 'ыв')
+ADJECTIVE = (
+    'ими', 'ыми', 'его', 'ого', 'ему', 'ому', 'ее', 'ие', 'ые', 'ое',
+    'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом', 'их', 'ых', 'ую',
+    'юю', 'ая', 'яя', 'ою', 'ею',
+)
+PARTICIPLE_1 = ('ем', 'нн', 'вш', 'ющ', 'щ')
+PARTICIPLE_2 = ('ивш', 'ывш', 'ующ')
+REFLEXIVE = ('ся', 'сь')
+VERB_1 = (
+    'ете', 'йте', 'ешь', 'нно', 'ла', 'на', 'ли', 'ем', 'ло', 'но',
+    'ет', 'ют', 'ны', 'ть', 'й', 'л', 'н',
+)
+VERB_2 = (
+    'ейте', 'уйте', 'ила', 'ыла', 'ена', 'ите', 'или', 'ыли', 'ило',
+    'ыло', 'ено', 'ует', 'уют', 'ены', 'ить', 'ыть', 'ишь', 'ей', 'уй',
+    'ил', 'ыл', 'им', 'ым', 'ен', 'ят', 'ит', 'ыт', 'ую', 'ю',
+)
+NOUN = (
+    'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях', 'ев', 'ов', 'ие',
+    'ье', 'еи', 'ии', 'ей', 'ой', 'ий', 'ям', 'ем', 'ам', 'ом', 'ах',
+    'ях', 'ию', 'ью', 'ия', 'ья', 'а', 'е', 'и', 'й', 'о', 'у', 'ы',
+    'ь', 'ю', 'я',
+)
+DERIVATIONAL = ('ость', 'ост')
+SUPERLATIVE = ('ейше', 'ейш')
+
+
+def _strip(word, endings, after_a=False):
+    """
+    Отрезает самое длинное из окончаний. Возвращает None, если
+    ни одно окончание не подошло.
+    """
+    for ending in sorted(endings, key=len, reverse=True):
+        if word.endswith(ending):
+            stem = word[:-len(ending)]
+            if after_a and not stem.endswith(('а', 'я')):
+                continue
+            return stem
+    return None
+
+
+def _strip_any(word, *groups):
+    for endings, after_a in groups:
+        stem = _strip(word, endings, after_a)
+        if stem is not None:
+            return stem
+    return None
+
+
+def _region(word):
+    """Позиция начала области после первого сочетания «гласная-согласная»."""
+    for i in range(1, len(word)):
+        if word[i - 1] in VOWELS and word[i] not in VOWELS:
+            return i + 1
+    return len(word)
+
+
+@lru_cache(maxsize=100000)
+def stem(word):
+    """Стеммер Snowball для русских слов; прочие слова не меняются."""
+    word = word.lower().replace('ё', 'е')
+    first_vowel = next(
+        (i for i, letter in enumerate(word) if letter in VOWELS), None
+    )
+    if first_vowel is None:
+        return word
+    prefix, rv = word[:first_vowel + 1], word[first_vowel + 1:]
+    rv = _step1(rv)
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    rv = _step3(prefix, rv)
+    return prefix + _step4(rv)
+
+
+def _step1(rv):
+    result = _strip_any(
+        rv, (PERFECTIVE_GERUND_1, True), (PERFECTIVE_GERUND_2, False)
+    )
+    if result is not None:
+        return result
+    reflexive = _strip(rv, REFLEXIVE)
+    if reflexive is not None:
+        rv = reflexive
+    for result in (
+        _strip_adjectival(rv),
+        _strip_any(rv, (VERB_1, True), (VERB_2, False)),
+        _strip(rv, NOUN),
+    ):
+        if result is not None:
+            return result
+    return rv
+
+
+def _step3(prefix, rv):
+    """Словообразовательное окончание ищется в области R2."""
+    word = prefix + rv
+    r1 = _region(word)
+    r2 = r1 + _region(word[r1:])
+    derivational = _strip(word[r2:], DERIVATIONAL)
+    if derivational is not None:
+        word = word[:r2] + derivational
+    return word[len(prefix):]
+
+
+def _step4(rv):
+    if rv.endswith('нн'):
+        return rv[:-1]
+    superlative = _strip(rv, SUPERLATIVE)
+    if superlative is not None:
+        return superlative[:-1] if superlative.endswith('нн') else superlative
+    if rv.endswith('ь'):
+        return rv[:-1]
+    return rv
+
+
+def _strip_adjectival(rv):
+    stem = _strip(rv, ADJECTIVE)
+    if stem is None:
+        return None
+    participle = _strip_any(
+        stem, (PARTICIPLE_1, True), (PARTICIPLE_2, False)
+    )
+    return stem if participle is None else participle
+
+
+def tokenize(text):
+    """Разбивает текст на основы слов."""
+    return [stem(word) for word in WORD_RE.findall((text or '').lower())]
+
+
+class Fts5Index:
+    """
+    Индекс на виртуальной таблице SQLite FTS5. Основы слов считаются
+    в Python, поэтому русская морфология не зависит от токенизатора.
+    """
+    table = 'posts_post_fts'
+
+    def add(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid = %s', [post.pk]
+            )
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, body) VALUES (%s, %s)',
+                [post.pk, ' '.join(tokenize(post.text))]
+            )
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid = %s', [post_id]
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+
+    def search(self, terms, limit):
+        match = ' AND '.join('"{}"'.format(term) for term in terms)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {self.table} WHERE {self.table} '
+                f'MATCH %s ORDER BY rank LIMIT %s',
+                [match, limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class InvertedIndex:
+    """
+    Запасной индекс на обычной таблице PostTerm: основа слова → посты
+    с числом вхождений, ранжирование по TF-IDF.
+    """
+    def add(self, post):
+        self.remove(post.pk)
+        PostTerm.objects.bulk_create(
+            PostTerm(post_id=post.pk, term=term, count=count)
+            for term, count in Counter(
+                term[:PostTerm.TERM_LENGTH] for term in tokenize(post.text)
+            ).items()
+        )
+
+    def remove(self, post_id):
+        PostTerm.objects.filter(post_id=post_id).delete()
+
+    def clear(self):
+        PostTerm.objects.all().delete()
+
+    def search(self, terms, limit):
+        total = Post.objects.count() or 1
+        frequencies = dict(
+            PostTerm.objects.filter(term__in=terms)
+            .values_list('term')
+            .annotate(posts=Count('post_id'))
+        )
+        if len(frequencies) < len(terms):
+            return []
+        idf = Case(
+            *(
+                When(term=term, then=Value(math.log(1 + total / posts)))
+                for term, posts in frequencies.items()
+            ),
+            output_field=FloatField()
+        )
+        return list(
+            PostTerm.objects.filter(term__in=terms)
+            .values('post_id')
+            .annotate(
+                matched=Count('term'),
+                score=Sum(F('count') * idf, output_field=FloatField())
+            )
+            .filter(matched=len(terms))
+            .order_by('-score', '-post_id')
+            .values_list('post_id', flat=True)[:limit]
+        )
+
+
+_fts5_tables = {}
+
+
+def fts5_available():
+    """Есть ли в текущей базе таблица FTS5 (проверяется один раз)."""
+    if connection.vendor != 'sqlite':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in _fts5_tables:
+        _fts5_tables[name] = (
+            Fts5Index.table in connection.introspection.table_names()
+        )
+    return _fts5_tables[name]
+
+
+def get_index():
+    return Fts5Index() if fts5_available() else InvertedIndex()
+
+
+def index_post(post):
+    get_index().add(post)
+
+
+def unindex_post(post_id):
+    get_index().remove(post_id)
+
+
+def search_posts(query, limit=None):
+    """Посты, содержащие все слова запроса, в порядке релевантности."""
+    terms = sorted(set(tokenize(query)))
+    if not terms:
+        return []
+    try:
+        return get_index().search(
+            terms, limit or settings.SEARCH_MAX_RESULTS
+        )
+    except DatabaseError:
+        return []
+
+
+def rebuild_index(batch_size=1000):
+    index = get_index()
+    index.clear()
+    posts = Post.objects.only('pk', 'text').iterator(chunk_size=batch_size)
+    count = 0
+    for post in posts:
+        index.add(post)
+        count += 1
+    return count
@@ -0,0 +1,197 @@
+"""
+Раздача файлов MEDIA_ROOT и STATIC_ROOT.
+
+В отличие от django.views.static.serve вьюха отвечает на условные
+запросы по ETag и Last-Modified, отдаёт части файла по Range и ставит
+заголовки кэширования: файл с хешем содержимого в имени не меняется
+никогда и кэшируется на год с immutable. Тело не читается в Python:
+FileResponse передаёт файл в wsgi.file_wrapper сервера (gunicorn
+шлёт его через os.sendfile), а с SERVE_OFFLOAD отправку берёт на себя
+фронтовой сервер по X-Accel-Redirect (nginx) или X-Sendfile.
+"""
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.urls import re_path
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from .media import HASHED_NAME
+
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+# имена ManifestStaticFilesStorage: css/app.0123456789ab.css
+STATIC_HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.\w+$')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# сжатые файлы отдаются как есть, без Content-Encoding
+ENCODINGS = {
+    'bzip2': 'application/x-bzip',
+    'gzip': 'application/gzip',
+    'xz': 'application/x-xz',
+}
+
+
+class RangeFile:
+    """
+    Не больше length байт файла начиная с offset. Сервер с
+    wsgi.file_wrapper шлёт Content-Length байт с текущей позиции
+    дескриптора, остальные читают файл через read.
+    """
+    def __init__(self, file, offset, length):
+        file.seek(offset)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+class FileStream(FileResponse):
+    # блок для серверов без sendfile: меньше обращений к файлу
+    block_size = 64 * 1024
+
+
+def byte_range(header, size):
+    """
+    Пара (начало, длина) из заголовка Range, None без него (или для
+    нескольких отрезков — их отдаёт целый файл) и False, если отрезок
+    вне файла.
+    """
+    match = RANGE.match(header.replace(' ', '')) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        # последние last байт файла
+        length = min(int(last), size)
+        return (size - length, length) if length else False
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first > last:
+        return False
+    return first, last - first + 1
+
+
+def _if_range(request, etag, last_modified):
+    """Range применяется, только если файл не изменился с If-Range."""
+    value = request.META.get('HTTP_IF_RANGE')
+    if not value:
+        return True
+    if value.startswith('"'):
+        return value == etag
+    return parse_http_date_safe(value) == last_modified
+
+
+def _cache_control(path, immutable):
+    if immutable.search(path):
+        return 'public, max-age={}, immutable'.format(IMMUTABLE_MAX_AGE)
+    return 'public, max-age={}'.format(settings.SERVE_MAX_AGE)
+
+
+def _etag(path, stats, immutable):
+    if immutable.search(path):
+        # имя уже задаёт содержимое
+        return '"{}"'.format(os.path.splitext(os.path.basename(path))[0])
+    return '"{:x}-{:x}"'.format(stats.st_mtime_ns, stats.st_size)
+
+
+def _offload(response, location, full_path):
+    if settings.SERVE_OFFLOAD == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = quote(
+            settings.SERVE_ACCEL_PREFIX + location
+        )
+    else:
+        response['X-Sendfile'] = full_path
+    return response
+
+
+@require_safe
+def serve(request, path, document_root, prefix, immutable=HASHED_NAME):
+    """
+    Файл path из document_root. prefix — URL каталога, по нему строится
+    адрес внутреннего location для X-Accel-Redirect.
+    """
+    try:
+        full_path = safe_join(document_root, path)
+        stats = os.stat(full_path)
+    except (OSError, SuspiciousFileOperation):
+        raise Http404('Файл не найден')
+    if not stat.S_ISREG(stats.st_mode):
+        raise Http404('Файл не найден')
+    last_modified = int(stats.st_mtime)
+    etag = _etag(path, stats, immutable)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        content_type, encoding = mimetypes.guess_type(full_path)
+        content_type = ENCODINGS.get(encoding, content_type)
+        response = _response(
+            request, full_path, stats.st_size,
+            content_type or 'application/octet-stream',
+            byte_range(request.META.get('HTTP_RANGE'), stats.st_size)
+            if _if_range(request, etag, last_modified) else None,
+            location=prefix + path,
+        )
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = _cache_control(path, immutable)
+    return response
+
+
+def _response(request, full_path, size, content_type, part, location):
+    if part is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */{}'.format(size)
+        return response
+    if settings.SERVE_OFFLOAD:
+        # отрезки Range фронтовой сервер отдаёт сам
+        response = HttpResponse(content_type=content_type)
+        return _offload(response, location, full_path)
+    offset, length = part or (0, size)
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+    else:
+        response = FileStream(
+            RangeFile(open(full_path, 'rb'), offset, length),
+            content_type=content_type,
+        )
+    if part is not None:
+        response.status_code = 206
+        response['Content-Range'] = 'bytes {}-{}/{}'.format(
+            offset, offset + length - 1, size
+        )
+    response['Content-Length'] = length
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def file_urls(prefix, document_root, immutable=HASHED_NAME):
+    """Маршрут раздачи каталога document_root по URL prefix."""
+    return [re_path(
+        r'^{}(?P<path>.+)$'.format(re.escape(prefix.lstrip('/'))), serve,
+        kwargs={
+            'document_root': document_root,
+            'prefix': prefix,
+            'immutable': immutable,
+        },
+    )]
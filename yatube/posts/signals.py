@@ -0,0 +1,185 @@
+import threading
+
+from django.core.signals import request_started
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from .caching import (
+    GLOBAL_SCOPE, bump_author_cards, bump_feeds, bump_group_cards,
+    bump_post_card, post_scopes
+)
+from .media import release_on_commit
+from .models import (
+    Comment, Follow, Group, Post, TimelineEntry, User, UserStats
+)
+from .recommendations import follow_changed
+from .search import index_post, unindex_post
+from .trending import add_event, latest_post
+
+# посты, которые удаляются в этом потоке: их комментарии уходят
+# каскадом, и ленты поста один раз сбрасывает post_deleted
+_deleting = threading.local()
+# поля пользователя, которые выводятся на карточках и в профиле
+USER_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def deleting_posts():
+    if not hasattr(_deleting, 'posts'):
+        _deleting.posts = set()
+    return _deleting.posts
+
+
+def follow_scopes(follow):
+    return [
+        'profile:{}'.format(user.username)
+        for user in (follow.user, follow.author) if user is not None
+    ]
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    # сохранение только last_login при входе не читает старые имена
+    if raw or instance.pk is None or (
+        update_fields is not None
+        and not set(update_fields) & set(USER_NAME_FIELDS)
+    ):
+        return
+    instance._loaded_names = User.objects.filter(
+        pk=instance.pk
+    ).values_list(*USER_NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def user_renamed(sender, instance, created, raw=False, **kwargs):
+    loaded = getattr(instance, '_loaded_names', None)
+    instance._loaded_names = None
+    if created or raw or loaded is None:
+        return
+    username = loaded[0]
+    if username != instance.username:
+        # имя автора есть на карточках его постов во всех лентах
+        bump_author_cards(instance.pk)
+        bump_feeds(
+            GLOBAL_SCOPE,
+            'profile:{}'.format(username),
+            'profile:{}'.format(instance.username),
+        )
+    elif loaded != tuple(
+        getattr(instance, field) for field in USER_NAME_FIELDS
+    ):
+        bump_feeds('profile:{}'.format(instance.username))
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        UserStats.objects.bump(instance.author_id, post_count=1)
+        TimelineEntry.objects.fan_out(instance)
+        add_event(instance.pk, instance.group_id, 'post', instance.pub_date)
+    else:
+        bump_post_card(instance.pk)
+    index_post(instance)
+    bump_feeds(*post_scopes(instance))
+    loaded_group_id = getattr(instance, '_loaded_group_id', None)
+    if loaded_group_id not in (None, instance.group_id):
+        old_group = Group.objects.filter(pk=loaded_group_id).first()
+        if old_group is not None:
+            bump_feeds('group:{}'.format(old_group.slug))
+        instance._loaded_group_id = instance.group_id
+    loaded_image = getattr(instance, '_loaded_image', None)
+    if loaded_image and loaded_image != instance.image.name:
+        release_on_commit(loaded_image)
+    instance._loaded_image = instance.image.name
+
+
+@receiver(request_started)
+def forget_deleting_posts(sender, **kwargs):
+    # после неудавшегося удаления отметка не переживает запрос
+    deleting_posts().clear()
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    # сигналы pre_delete приходят до удаления каскадных комментариев
+    deleting_posts().add(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    deleting_posts().discard(instance.pk)
+    UserStats.objects.bump(instance.author_id, post_count=-1)
+    unindex_post(instance.pk)
+    bump_feeds(*post_scopes(instance))
+    release_on_commit(instance.image.name)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.bump(instance.author_id, comment_count=1)
+        bump_post_card(instance.post_id)
+        add_event(
+            instance.post_id, instance.post.group_id, 'comment',
+            instance.created
+        )
+        bump_feeds(*post_scopes(instance.post))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    UserStats.objects.bump(instance.author_id, comment_count=-1)
+    if instance.post_id in deleting_posts():
+        # пост, автор и сообщество не читаются заново для каждого
+        # комментария удаляемого поста
+        return
+    bump_post_card(instance.post_id)
+    bump_feeds(*post_scopes(instance.post))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.bump(instance.author_id, follower_count=1)
+        UserStats.objects.bump(instance.user_id, following_count=1)
+        if instance.user_id and instance.author_id:
+            TimelineEntry.objects.backfill(
+                instance.user_id, instance.author_id
+            )
+        follow_changed(instance.user_id, instance.author_id)
+        post = latest_post(instance.author_id)
+        if post is not None:
+            add_event(*post, 'follow', instance.created)
+        bump_feeds(*follow_scopes(instance))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    UserStats.objects.bump(instance.author_id, follower_count=-1)
+    UserStats.objects.bump(instance.user_id, following_count=-1)
+    TimelineEntry.objects.prune(instance.user_id, instance.author_id)
+    if instance.author_id:
+        TimelineEntry.objects.follower_left(instance.author_id)
+    follow_changed(instance.user_id, instance.author_id, followed=False)
+    bump_feeds(*follow_scopes(instance))
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        bump_group_cards(instance.pk)
+        bump_feeds(GLOBAL_SCOPE)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    bump_feeds(GLOBAL_SCOPE)
@@ -0,0 +1,173 @@
+"""
+Снимки горячих страниц для анонимных читателей.
+
+Первые страницы главной, крупнейших сообществ и профилей самых
+читаемых авторов хранятся в кэше готовыми ответами вместе с
+поколением своей ленты. SnapshotMiddleware стоит сразу после
+SecurityMiddleware и CommonMiddleware: проверка Host, заголовки
+безопасности и редирект на HTTPS действуют и для снимков. Анониму (без
+куки сессии) снимок отдаётся раньше маршрутизации, аутентификации и
+шаблонов. Устаревший снимок перестраивает первый же
+запрос к странице, manage.py regenerate_snapshots строит все разом.
+"""
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.wsgi import WSGIRequest
+from django.db.models import Count
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from .caching import GLOBAL_SCOPE, feed_generation, is_cacheable
+from .models import Group, UserStats
+from .trending import TRENDING_SCOPE
+
+SNAPSHOT_KEY = 'snapshot:{}'
+# ключ WSGI-окружения: команда просит построить снимок страницы
+# заново с этой областью ленты
+REFRESH_SCOPE = 'snapshot.scope'
+# заголовки ответа, которые сохраняются вместе со снимком
+SNAPSHOT_HEADERS = (
+    'Content-Type', 'Content-Language', 'ETag', 'Last-Modified', 'Vary',
+    'Cache-Control', 'X-Frame-Options',
+)
+
+
+def snapshot_targets():
+    """Пары (путь, область ленты) страниц, для которых строятся снимки."""
+    targets = [
+        (reverse('index'), 'index'),
+        (reverse('trending'), TRENDING_SCOPE),
+    ]
+    slugs = Group.objects.annotate(
+        posts_count=Count('post')
+    ).order_by('-posts_count').values_list(
+        'slug', flat=True
+    )[:settings.SNAPSHOT_GROUPS]
+    targets += [
+        (reverse('group_posts', args=[slug]), 'group:{}'.format(slug))
+        for slug in slugs
+    ]
+    usernames = UserStats.objects.order_by('-follower_count').values_list(
+        'user__username', flat=True
+    )[:settings.SNAPSHOT_PROFILES]
+    targets += [
+        (reverse('profile', args=[name]), 'profile:{}'.format(name))
+        for name in usernames
+    ]
+    return targets
+
+
+def snapshot_generation(scope):
+    return feed_generation([GLOBAL_SCOPE, scope])
+
+
+def store_snapshot(path, scope, generation, response):
+    """Сохраняет ответ снимком, если его можно отдавать всем."""
+    if not is_cacheable(response):
+        return False
+    cache.set(SNAPSHOT_KEY.format(path), {
+        'scope': scope,
+        'generation': generation,
+        'content': response.content,
+        'headers': [
+            (name, response[name]) for name in SNAPSHOT_HEADERS
+            if response.has_header(name)
+        ],
+    }, settings.SNAPSHOT_TIMEOUT)
+    return True
+
+
+def snapshot_response(request, entry):
+    headers = dict(entry['headers'])
+    response = get_conditional_response(
+        request,
+        etag=headers.get('ETag'),
+        last_modified=parse_http_date_safe(headers.get('Last-Modified')),
+    )
+    if response is None:
+        response = HttpResponse(entry['content'])
+    for name, value in headers.items():
+        response[name] = value
+    response['X-Snapshot'] = 'hit'
+    return response
+
+
+def _anonymous(request):
+    return (
+        settings.SNAPSHOTS_ENABLED
+        and request.method in ('GET', 'HEAD')
+        and not request.META.get('QUERY_STRING')
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+    )
+
+
+class SnapshotMiddleware:
+    """
+    Отдаёт свежий снимок страницы анониму. Если лента изменилась,
+    запрос проходит всю цепочку, а его ответ становится новым снимком.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not _anonymous(request) or REFRESH_SCOPE in request.META:
+            return self.get_response(request)
+        entry = cache.get(SNAPSHOT_KEY.format(request.path))
+        if entry is None:
+            return self.get_response(request)
+        # поколение берётся до рендеринга: правка во время него
+        # оставит снимок устаревшим
+        generation = snapshot_generation(entry['scope'])
+        if entry['generation'] == generation:
+            return snapshot_response(request, entry)
+        response = self.get_response(request)
+        store_snapshot(request.path, entry['scope'], generation, response)
+        return response
+
+
+def snapshot_request(path, scope):
+    """Анонимный GET-запрос страницы, как его передал бы WSGI-сервер."""
+    return WSGIRequest({
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': settings.SNAPSHOT_HOST,
+        'SERVER_PORT': '80',
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': BytesIO(),
+        REFRESH_SCOPE: scope,
+    })
+
+
+def regenerate_snapshots(targets=None):
+    """
+    Строит снимки через полную цепочку middleware, как обычный запрос.
+    Возвращает пары (путь, сохранён ли снимок).
+    """
+    handler = BaseHandler()
+    handler.load_middleware()
+    results = []
+    for path, scope in targets or snapshot_targets():
+        generation = snapshot_generation(scope)
+        response = handler.get_response(snapshot_request(path, scope))
+        results.append(
+            (path, store_snapshot(path, scope, generation, response))
+        )
+    return results
+
+
+def stale_snapshots(targets=None):
+    """Пути горячих страниц, у которых снимка нет или он устарел."""
+    stale = []
+    for path, scope in targets or snapshot_targets():
+        entry = cache.get(SNAPSHOT_KEY.format(path))
+        if entry is None or entry['generation'] != snapshot_generation(
+            scope
+        ):
+            stale.append(path)
+    return stale
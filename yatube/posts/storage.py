@@ -0,0 +1,86 @@
+"""
+Хранилище картинок по содержимому.
+
+Файл сохраняется под SHA-256 своего содержимого в каталоге поля,
+разложенном на два уровня по первым символам хеша:
+posts/3f/a2/3fa2….jpg. Одинаковые картинки занимают один файл, а
+имена не получают случайных суффиксов. Ссылки на файл считают посты
+с этим именем: файл без ссылок удаляет posts.media.release_image.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# права файла, если не задан FILE_UPLOAD_PERMISSIONS: временные файлы
+# создаются только для владельца, а картинки читает веб-сервер
+FILE_MODE = 0o644
+
+
+def file_digest(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hashed_name(name, digest):
+    """Имя файла с хешем digest в каталоге и с расширением имени name."""
+    directory, filename = posixpath.split(name)
+    extension = posixpath.splitext(filename)[1].lower()
+    return posixpath.join(
+        directory, digest[:2], digest[2:4], digest + extension
+    )
+
+
+@deconstructible
+class HashedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # занятое имя означает тот же файл: суффикс не нужен
+        return name
+
+    def _save(self, name, content):
+        name = hashed_name(name, file_digest(content))
+        path = self.path(name)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                self._link(content, path)
+            except FileExistsError:
+                # тот же файл успел сохранить другой запрос
+                pass
+            else:
+                os.chmod(path, self.file_permissions_mode or FILE_MODE)
+        # свежая отметка времени защищает файл от сборки мусора, пока
+        # пост с ним ещё не сохранён
+        os.utime(path)
+        return name
+
+    @staticmethod
+    def _link(content, path):
+        """
+        Создаёт path с содержимым content целиком или не создаёт вовсе:
+        файл пишется во временный рядом и становится path жёсткой
+        ссылкой. Загрузка, которая уже лежит во временном файле на том
+        же диске, не копируется.
+        """
+        if hasattr(content, 'temporary_file_path'):
+            try:
+                os.link(content.temporary_file_path(), path)
+                return
+            except FileExistsError:
+                raise
+            except OSError:
+                # временный каталог на другом диске
+                pass
+        fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            os.link(temporary, path)
+        finally:
+            os.unlink(temporary)
@@ -0,0 +1,20 @@
+from django import template
+
+from ..caching import attach_card_versions
+from ..thumbnails import ensure_thumbnails
+
+register = template.Library()
+
+
+@register.filter
+def card_version(post):
+    """Версия кэша карточки; если view её не проставил, читает сама."""
+    if not hasattr(post, 'card_version'):
+        attach_card_versions([post])
+    return post.card_version
+
+
+@register.simple_tag
+def post_thumbnail(post):
+    """Готовая миниатюра карточки или None, пока она строится в фоне."""
+    return ensure_thumbnails(post)
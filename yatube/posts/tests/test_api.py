@@ -0,0 +1,111 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import Comment, Follow, Group, Post, User
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(
+            title="Сообщество", slug="group", description="Описание"
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        now = timezone.now()
+        for i in range(15):
+            post = Post.objects.create(
+                text=f"Пост {i}", author=cls.author,
+                group=cls.group if i % 2 else None
+            )
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=now - timedelta(minutes=i)
+            )
+        cls.post = Post.objects.get(text="Пост 0")
+        for i in range(3):
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text=f"Комментарий {i}"
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def get(self, name, args=None, **params):
+        response = self.client.get(reverse(f"api:{name}", args=args), params)
+        return response, response.json()
+
+    def test_cursor_pagination(self):
+        response, data = self.get("posts", limit=10)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(data['results']), 10)
+        self.assertEqual(data['results'][0]['text'], "Пост 0")
+        self.assertIsNone(data['previous'])
+
+        second = self.client.get(data['next']).json()
+        self.assertEqual(
+            [post['text'] for post in second['results']],
+            [f"Пост {i}" for i in range(10, 15)]
+        )
+        self.assertIsNone(second['next'])
+        previous = self.client.get(second['previous']).json()
+        self.assertEqual(previous['results'], data['results'])
+
+    def test_field_selection(self):
+        _, data = self.get("posts", fields="id,author,comments_count")
+        self.assertEqual(
+            set(data['results'][0]), {'id', 'author', 'comments_count'}
+        )
+        self.assertEqual(data['results'][0]['author'], "author")
+        self.assertEqual(data['results'][0]['comments_count'], 3)
+
+        response, data = self.get("posts", fields="id,password")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', data['error'])
+
+    def test_feeds(self):
+        _, data = self.get("group_posts", args=["group"])
+        self.assertEqual(len(data['results']), 7)
+        self.assertEqual(
+            {post['group'] for post in data['results']}, {"group"}
+        )
+        _, data = self.get("profile_posts", args=["author"], limit=100)
+        self.assertEqual(len(data['results']), 15)
+        response, _ = self.get("profile_posts", args=["nobody"])
+        self.assertEqual(response.status_code, 404)
+
+    def test_follow_feed_requires_login(self):
+        response, _ = self.get("follow_posts")
+        self.assertEqual(response.status_code, 401)
+        self.client.force_login(self.reader)
+        response, data = self.get("follow_posts", fields="id")
+        self.assertEqual(len(data['results']), 10)
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_comments(self):
+        _, data = self.get("post_comments", args=[self.post.pk], limit=2)
+        self.assertEqual(
+            [comment['text'] for comment in data['results']],
+            ["Комментарий 2", "Комментарий 1"]
+        )
+        self.assertEqual(data['results'][0]['author'], "reader")
+        self.assertIsNotNone(data['next'])
+
+    def test_cache_headers(self):
+        response, _ = self.get("posts")
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('max-age=', response['Cache-Control'])
+        response = self.client.get(
+            reverse("api:posts"), HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_read_only(self):
+        response = self.client.post(reverse("api:posts"))
+        self.assertEqual(response.status_code, 405)
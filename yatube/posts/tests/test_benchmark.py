@@ -0,0 +1,75 @@
+import copy
+
+from django.test import TestCase
+
+from .. import benchmark
+from ..models import Comment, Post, TimelineEntry, UserStats
+
+
+class BenchmarkTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        benchmark.seed(
+            users=20, groups=3, posts=60, comments=30, follows=3, days=10
+        )
+
+    def test_seed_builds_dataset_and_derived_tables(self):
+        size = benchmark.dataset_size()
+        self.assertEqual(
+            (size['users'], size['groups'], size['posts'], size['comments']),
+            (20, 3, 60, 30)
+        )
+        self.assertGreater(size['follows'], 0)
+        # даты растянуты по времени, а не совпадают с моментом вставки
+        self.assertGreater(
+            Post.objects.values('pub_date').distinct().count(), 50
+        )
+        self.assertEqual(UserStats.objects.count(), 20)
+        self.assertTrue(TimelineEntry.objects.exists())
+
+    def test_run_reports_every_scenario(self):
+        report = benchmark.run(iterations=3, warmup=1)
+        self.assertEqual(set(report['results']), set(benchmark.SCENARIOS))
+        self.assertEqual(report['meta']['dataset']['posts'], 60)
+        for scenario, result in report['results'].items():
+            with self.subTest(scenario=scenario):
+                latency = result['latency_ms']
+                self.assertLessEqual(latency['p50'], latency['p99'])
+                self.assertGreater(result['queries']['max'], 0)
+                self.assertGreater(result['peak_memory_kb'], 0)
+        # запись комментариев откатывается после каждого замера
+        self.assertEqual(Comment.objects.count(), 30)
+
+    def test_compare_finds_regressions(self):
+        baseline = benchmark.run(scenarios=['post_view'], iterations=2)
+        self.assertEqual(benchmark.compare(baseline, baseline), [])
+        current = copy.deepcopy(baseline)
+        result = current['results']['post_view']
+        result['queries']['max'] += 1
+        result['latency_ms']['p95'] *= 2
+        regressions = benchmark.compare(baseline, current)
+        self.assertEqual(len(regressions), 2)
+
+    def test_load_worker_keeps_writes(self):
+        timings = benchmark.load_worker(benchmark.Sampler(), requests=10)
+        self.assertEqual(len(timings), 10)
+        self.assertNotIn(None, [latency for _, latency in timings])
+        comments = sum(scenario == 'add_comment' for scenario, _ in timings)
+        self.assertEqual(Comment.objects.count(), 30 + comments)
+
+    def test_recommendations_report(self):
+        result = benchmark.recommendations(users=200, follows=5)
+        self.assertGreater(result['edges'], 900)
+        self.assertEqual(
+            result['target_s'], benchmark.MILLION_EDGES_SECONDS
+        )
+        self.assertEqual(
+            result['passed'],
+            result['million_edges_s'] <= result['target_s']
+        )
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 50), 50)
+        self.assertEqual(benchmark.percentile(values, 99), 99)
+        self.assertEqual(benchmark.percentile([7], 95), 7)
@@ -0,0 +1,210 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from yatube.cache import cache_config
+
+from ..cache_backends import SQLiteCache, TwoTierCache
+
+CACHE_DIR = tempfile.mkdtemp()
+SHARED_BACKENDS = {
+    # общий кэш без внешних сервисов и locmem как замена memcached/redis
+    'sqlite': {
+        'BACKEND': 'posts.cache_backends.SQLiteCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'shared.sqlite3'),
+    },
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shared-stand-in',
+    },
+}
+
+
+def tearDownModule():
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.cache = SQLiteCache(
+            os.path.join(CACHE_DIR, 'cache.sqlite3'),
+            {'OPTIONS': {'MAX_ENTRIES': 10}}
+        )
+        self.cache.clear()
+
+    def test_basic_operations(self):
+        cache = self.cache
+        cache.set('page', {'content': b'<html>'})
+        self.assertEqual(cache.get('page'), {'content': b'<html>'})
+        self.assertFalse(cache.add('page', 'другое'))
+        self.assertTrue(cache.add('lock', 1, 10))
+        self.assertEqual(cache.incr('lock', 5), 6)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+        cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        cache.delete_many(['a', 'b'])
+        self.assertIsNone(cache.get('a'))
+        cache.delete('page')
+        self.assertFalse(cache.has_key('page'))
+
+    def test_expired_entries(self):
+        self.cache.set('short', 1, 0.05)
+        time.sleep(0.1)
+        self.assertEqual(self.cache.get('short', 'нет'), 'нет')
+        self.assertTrue(self.cache.add('short', 2))
+        self.assertEqual(self.cache.get('short'), 2)
+
+    def test_shared_between_instances(self):
+        other = SQLiteCache(self.cache.location, {})
+        self.cache.set('key', 'значение')
+        self.assertEqual(other.get('key'), 'значение')
+
+    def test_cull(self):
+        self.cache.set('counter', 1, None)
+        for i in range(20):
+            self.cache.set(f'key{i}', i, 100 + i)
+        self.cache.cull()
+        self.assertLessEqual(len(self.cache.get_many(
+            ['counter'] + [f'key{i}' for i in range(20)]
+        )), 14)
+        # первыми удаляются записи, которые истекут раньше других
+        self.assertEqual(self.cache.get('counter'), 1)
+        self.assertIsNone(self.cache.get('key0'))
+
+
+class TwoTierCacheTest(SimpleTestCase):
+    def workers(self, backend):
+        """Два процесса со своими локальными уровнями над общим кэшем."""
+        params = {'OPTIONS': {'SHARED': 'shared', 'MAX_ENTRIES': 2}}
+        return (
+            TwoTierCache(f'{backend}-worker1', params),
+            TwoTierCache(f'{backend}-worker2', params),
+        )
+
+    def test_coherence(self):
+        for backend, config in SHARED_BACKENDS.items():
+            with self.subTest(backend=backend), \
+                    override_settings(CACHES={'shared': config}):
+                caches['shared'].clear()
+                first, second = self.workers(backend)
+                first.set('page', 'v1')
+                self.assertEqual(second.get('page'), 'v1')
+
+                # пока штамп не менялся, отдаётся локальная копия
+                caches['shared'].set('page', 'мимо штампа')
+                self.assertEqual(second.get('page'), 'v1')
+
+                first.set('page', 'v2')
+                self.assertEqual(second.get('page'), 'v2')
+                first.delete('page')
+                self.assertIsNone(second.get('page'))
+
+                first.set('version', 1, None)
+                self.assertEqual(second.get('version'), 1)
+                second.incr('version')
+                self.assertEqual(first.get('version'), 2)
+
+                self.assertTrue(first.add('lock', 1))
+                self.assertFalse(second.add('lock', 1))
+
+    def shared_calls(self):
+        """
+        Счётчик обращений к общему кэшу: имя метода → число вызовов.
+        Вызовы внутри методов (set_many locmem через set) не считаются.
+        """
+        shared = caches['shared']
+        calls = {}
+        depth = []
+        for name in (
+            'get', 'get_many', 'set', 'set_many', 'delete', 'delete_many'
+        ):
+            original = getattr(shared, name)
+
+            def counted(*args, _name=name, _original=original, **kwargs):
+                if not depth:
+                    calls[_name] = calls.get(_name, 0) + 1
+                depth.append(_name)
+                try:
+                    return _original(*args, **kwargs)
+                finally:
+                    depth.pop()
+            patcher = mock.patch.object(shared, name, counted)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return calls
+
+    def test_batch_operations_make_one_shared_call(self):
+        with override_settings(CACHES={'shared': SHARED_BACKENDS['locmem']}):
+            caches['shared'].clear()
+            params = {'OPTIONS': {'SHARED': 'shared', 'MAX_ENTRIES': 100}}
+            first = TwoTierCache('batch-worker1', params)
+            second = TwoTierCache('batch-worker2', params)
+            data = {f'key{i}': i for i in range(10)}
+            calls = self.shared_calls()
+
+            first.set_many(data)
+            self.assertEqual(calls, {'set_many': 1})
+            for expected_calls in (1, 2):
+                # сначала значения, потом только штампы локальных копий
+                self.assertEqual(second.get_many(list(data)), data)
+                self.assertEqual(calls['get_many'], expected_calls)
+
+            first.set_many({'key0': 'новое'})
+            self.assertEqual(second.get_many(['key0', 'key1']), {
+                'key0': 'новое', 'key1': 1
+            })
+            # устаревшая копия дочитывается вторым запросом
+            self.assertEqual(calls['get_many'], 4)
+
+            first.delete_many(list(data))
+            self.assertEqual(calls['delete_many'], 1)
+            self.assertEqual(second.get_many(list(data)), {})
+            self.assertEqual(
+                set(calls), {'set_many', 'get_many', 'delete_many'}
+            )
+
+    def test_local_tier_is_bounded(self):
+        with override_settings(CACHES={'shared': SHARED_BACKENDS['locmem']}):
+            first, _ = self.workers('bounded')
+            for key in ('a', 'b', 'c'):
+                first.set(key, key)
+            self.assertEqual(len(first._entries), 2)
+            self.assertEqual(first.get('a'), 'a')
+
+
+class CacheConfigTest(SimpleTestCase):
+    def test_locmem_by_default(self):
+        config = cache_config('/srv/yatube', environ={})
+        self.assertEqual(list(config), ['default'])
+        self.assertIn('LocMemCache', config['default']['BACKEND'])
+
+    def test_shared_sqlite_with_local_tier(self):
+        config = cache_config('/srv/yatube', environ={
+            'CACHE_BACKEND': 'sqlite',
+            'CACHE_LOCAL_ENTRIES': '500',
+        })
+        self.assertEqual(
+            config['default']['BACKEND'], 'posts.cache_backends.TwoTierCache'
+        )
+        self.assertEqual(config['default']['OPTIONS']['MAX_ENTRIES'], 500)
+        self.assertEqual(
+            config['shared']['LOCATION'], '/srv/yatube/cache.sqlite3'
+        )
+
+    def test_external_profiles(self):
+        config = cache_config('/srv/yatube', environ={
+            'CACHE_BACKEND': 'redis',
+            'CACHE_LOCATION': 'redis://cache:6379/0',
+        })
+        self.assertEqual(
+            config['default']['BACKEND'], 'django_redis.cache.RedisCache'
+        )
+        self.assertEqual(config['default']['LOCATION'], 'redis://cache:6379/0')
+        with self.assertRaises(ValueError):
+            cache_config('/srv/yatube', environ={'CACHE_BACKEND': 'disk'})
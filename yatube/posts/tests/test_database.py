@@ -0,0 +1,48 @@
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from yatube.database import SQLITE_PRAGMAS, database_config
+
+
+class DatabaseConfigTest(SimpleTestCase):
+    def test_sqlite_profile_by_default(self):
+        config = database_config('/srv/yatube', environ={})
+        self.assertEqual(config['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(config['NAME'], '/srv/yatube/db.sqlite3')
+        self.assertEqual(config['PRAGMAS'], SQLITE_PRAGMAS)
+        self.assertGreater(config['CONN_MAX_AGE'], 0)
+
+    def test_sqlite_pragmas_from_environment(self):
+        config = database_config('/srv/yatube', environ={
+            'DB_SQLITE_PRAGMAS': 'synchronous=FULL, cache_size=-2000',
+            'DB_CONN_MAX_AGE': '0',
+        })
+        self.assertEqual(config['PRAGMAS']['synchronous'], 'FULL')
+        self.assertEqual(config['PRAGMAS']['cache_size'], '-2000')
+        self.assertEqual(config['PRAGMAS']['journal_mode'], 'WAL')
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+
+    def test_postgresql_profile(self):
+        config = database_config('/srv/yatube', environ={
+            'DB_ENGINE': 'postgresql',
+            'DB_NAME': 'blog',
+            'DB_HOST': 'db',
+        })
+        self.assertEqual(config['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual((config['NAME'], config['HOST']), ('blog', 'db'))
+        self.assertNotIn('PRAGMAS', config)
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            database_config('/srv/yatube', environ={'DB_ENGINE': 'oracle'})
+
+
+class SqlitePragmasTest(TestCase):
+    def test_pragmas_applied_to_connection(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('только для SQLite')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
@@ -3,12 +3,13 @@ import tempfile
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from ..models import Group, Post, User
 
 
+@override_settings(THUMBNAIL_ASYNC=False)
 class PostsFormsTest(TestCase):
     @classmethod
     def setUpClass(cls):
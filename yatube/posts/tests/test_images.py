@@ -0,0 +1,118 @@
+import hashlib
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from ..images import encode_image, process_image
+from ..models import Post, User
+from ..storage import hashed_name
+from ..thumbnails import cached_thumbnail
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=tempfile.gettempdir())
+ORIENTATION = 0x0112
+
+
+def image_file(name, size, mode='RGB', image_format='JPEG', exif=None):
+    buffer = BytesIO()
+    options = {'exif': exif.tobytes()} if exif is not None else {}
+    Image.new(mode, size, 'red').save(buffer, image_format, **options)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+@override_settings(
+    THUMBNAIL_ASYNC=False, MEDIA_ROOT=MEDIA_ROOT, MEDIA_GC_GRACE=0,
+    IMAGE_MAX_SIZE=300, IMAGE_FORMAT='JPEG'
+)
+class ImageProcessingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='photographer')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def create_post(self, image):
+        return Post.objects.create(
+            text='Пост с картинкой', author=self.user, image=image
+        )
+
+    def test_large_photo_is_resized_rotated_and_stripped(self):
+        exif = Image.Exif()
+        exif[ORIENTATION] = 6
+        exif[0x010F] = 'Phone'
+        post = self.create_post(
+            image_file('photo.jpg', (1200, 600), exif=exif)
+        )
+        original = post.image.name
+        name = process_image(original)
+
+        post.refresh_from_db()
+        self.assertEqual(post.image.name, name)
+        storage = post.image.storage
+        self.assertFalse(storage.exists(original))
+        with storage.open(name) as stored:
+            content = stored.read()
+        self.assertEqual(post.image_hash, hashlib.sha256(content).hexdigest())
+        with Image.open(BytesIO(content)) as image:
+            self.assertEqual(image.format, 'JPEG')
+            # снимок повёрнут по EXIF и уменьшен до IMAGE_MAX_SIZE
+            self.assertEqual(image.size, (150, 300))
+            self.assertTrue(image.info.get('progressive'))
+            self.assertNotIn('exif', image.info)
+
+    def test_transparent_png_becomes_jpeg(self):
+        post = self.create_post(
+            image_file('logo.png', (40, 20), 'RGBA', 'PNG')
+        )
+        name = process_image(post.image.name)
+        self.assertTrue(name.startswith('posts/'))
+        self.assertTrue(name.endswith('.jpg'))
+        with Image.open(Post.objects.get(pk=post.pk).image) as image:
+            self.assertEqual((image.format, image.mode), ('JPEG', 'RGB'))
+
+    def test_broken_file_is_left_as_is(self):
+        post = self.create_post(SimpleUploadedFile('broken.jpg', b'nope'))
+        self.assertIsNone(process_image(post.image.name))
+        post.refresh_from_db()
+        self.assertEqual(post.image_hash, '')
+        self.assertTrue(post.image.storage.exists(post.image.name))
+
+    def test_result_is_dropped_if_post_changed_image(self):
+        storage = Post._meta.get_field('image').storage
+        # файл без поста: картинку успели заменить до конца обработки
+        name = storage.save(
+            'posts/orphan.png',
+            ContentFile(image_file('orphan.png', (10, 10)).read())
+        )
+        with storage.open(name) as source:
+            content, extension = encode_image(source)
+        result = hashed_name(
+            'posts/image' + extension, hashlib.sha256(content).hexdigest()
+        )
+        self.assertIsNone(process_image(name))
+        self.assertFalse(storage.exists(result))
+
+    def test_process_images_command(self):
+        post = self.create_post(image_file('old.jpg', (500, 500)))
+        out = StringIO()
+        call_command('process_images', '--workers', '1', stdout=out)
+        self.assertIn('Обработано картинок: 1, ошибок: 0', out.getvalue())
+        post.refresh_from_db()
+        self.assertNotEqual(post.image_hash, '')
+        self.assertIsNotNone(cached_thumbnail(post.image))
+
+        out = StringIO()
+        call_command('process_images', '--workers', '1', stdout=out)
+        self.assertIn('Обработано картинок: 0', out.getvalue())
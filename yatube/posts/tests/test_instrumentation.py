@@ -0,0 +1,86 @@
+import json
+import logging
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..instrumentation import JsonFormatter, RequestRecorder, current_recorder
+from ..models import Post, User
+
+
+class RequestTimingMiddlewareTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="TestUserName")
+        Post.objects.create(text="Тестовый пост", author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    @staticmethod
+    def timing(response):
+        return {
+            part.split(';')[0]: part
+            for part in response['Server-Timing'].split(', ')
+        }
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=0)
+    def test_no_header_when_sampling_is_off(self):
+        response = self.client.get(reverse("index"))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1)
+    def test_server_timing_header(self):
+        response = self.client.get(reverse("index"))
+        timing = self.timing(response)
+        self.assertEqual(set(timing), {'db', 'tpl', 'cache', 'total'})
+        self.assertNotIn('"0 queries"', timing['db'])
+        self.assertIn('misses=', timing['cache'])
+
+        # вторая выдача берётся из кэша ленты без запросов к базе
+        timing = self.timing(self.client.get(reverse("index")))
+        self.assertIn('"0 queries"', timing['db'])
+        self.assertNotIn('hits=0 ', timing['cache'])
+
+    @override_settings(
+        REQUEST_TIMING_SAMPLE_RATE=1,
+        REQUEST_TIMING_BUDGETS={'index': 0}
+    )
+    def test_slow_request_is_logged(self):
+        with self.assertLogs('posts.slow_requests', 'WARNING') as logs:
+            self.client.get(reverse("index"))
+        timing = logs.records[0].timing
+        self.assertEqual(timing['view'], 'index')
+        self.assertEqual(timing['budget_ms'], 0)
+        self.assertGreater(timing['queries'], 0)
+
+    @override_settings(
+        REQUEST_TIMING_SAMPLE_RATE=1,
+        REQUEST_TIMING_DEFAULT_BUDGET=10 ** 6
+    )
+    def test_request_within_budget_is_not_logged(self):
+        logger = logging.getLogger('posts.slow_requests')
+        with self.assertRaises(AssertionError):
+            with self.assertLogs(logger, 'WARNING'):
+                self.client.get(reverse("about:author"))
+
+    def test_recorder_is_reset_after_request(self):
+        with override_settings(REQUEST_TIMING_SAMPLE_RATE=1):
+            self.client.get(reverse("index"))
+        self.assertIsNone(current_recorder())
+
+    def test_json_formatter(self):
+        recorder = RequestRecorder()
+        recorder.finish()
+        record = logging.LogRecord(
+            'posts.slow_requests', logging.WARNING, __file__, 1,
+            'slow request', None, None
+        )
+        record.timing = {'path': '/', **recorder.as_dict()}
+        data = json.loads(JsonFormatter().format(record))
+        self.assertEqual(data['message'], 'slow request')
+        self.assertEqual(data['path'], '/')
+        self.assertEqual(data['queries'], 0)
@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import (
+    SimpleUploadedFile, TemporaryUploadedFile
+)
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..media import release_image
+from ..models import Post, User
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=tempfile.gettempdir())
+GIF = b'GIF89a\x01\x00\x01\x00\x00\x00\x00;'
+
+
+def run_on_commit(function):
+    function()
+
+
+@override_settings(
+    THUMBNAIL_ASYNC=False, MEDIA_ROOT=MEDIA_ROOT, MEDIA_GC_GRACE=0
+)
+@mock.patch('posts.media.transaction.on_commit', run_on_commit)
+class HashedStorageTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.storage = Post._meta.get_field('image').storage
+
+    def create_post(self, image):
+        return Post.objects.create(
+            text='Пост с картинкой', author=self.user, image=image
+        )
+
+    def test_identical_uploads_share_one_file(self):
+        first, second = (
+            self.create_post(SimpleUploadedFile(name, GIF)).image.name
+            for name in ('one.GIF', 'two.gif')
+        )
+        self.assertEqual(first, second)
+        directory, shard, subshard, filename = first.split('/')
+        self.assertEqual(directory, 'posts')
+        self.assertEqual(filename[:4], shard + subshard)
+        self.assertTrue(filename.endswith('.gif'))
+
+    def test_temporary_upload_is_linked_not_copied(self):
+        upload = TemporaryUploadedFile('big.gif', 'image/gif', 0, None)
+        self.addCleanup(upload.close)
+        upload.write(GIF + b'big')
+        upload.flush()
+        name = self.storage.save('posts/big.gif', upload)
+        self.assertTrue(os.path.samefile(
+            upload.temporary_file_path(), self.storage.path(name)
+        ))
+
+    def test_file_is_removed_with_last_reference(self):
+        first = self.create_post(SimpleUploadedFile('a.gif', GIF))
+        second = self.create_post(SimpleUploadedFile('b.gif', GIF))
+        name = first.image.name
+        first.delete()
+        self.assertTrue(self.storage.exists(name))
+        second.delete()
+        self.assertFalse(self.storage.exists(name))
+
+    def test_replaced_image_is_released(self):
+        post = Post.objects.get(
+            pk=self.create_post(SimpleUploadedFile('a.gif', GIF)).pk
+        )
+        name = post.image.name
+        post.image = SimpleUploadedFile('new.gif', GIF + b'new')
+        post.save()
+        self.assertFalse(self.storage.exists(name))
+
+    @override_settings(MEDIA_GC_GRACE=60)
+    def test_fresh_file_survives_grace_period(self):
+        name = self.storage.save('posts/fresh.gif', ContentFile(b'fresh'))
+        self.assertFalse(release_image(name))
+        self.assertTrue(self.storage.exists(name))
+
+    @override_settings(MEDIA_GC_GRACE=60)
+    def test_dedup_media_command(self):
+        legacy = []
+        for name in ('posts/legacy.gif', 'media/legacy_copy.gif'):
+            path = os.path.join(MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(GIF + b'legacy')
+            legacy.append(self.create_post(name))
+        orphan = os.path.join(MEDIA_ROOT, 'media', 'orphan.gif')
+        with open(orphan, 'wb') as file:
+            file.write(b'orphan')
+        old = time.time() - 3600
+        os.utime(orphan, (old, old))
+
+        out = StringIO()
+        call_command('dedup_media', '--workers', '1', stdout=out)
+        self.assertIn('Перенесено: 2 (совпадений: 1)', out.getvalue())
+        self.assertIn('удалено без ссылок: 1', out.getvalue())
+        names = {
+            post.image.name for post in Post.objects.filter(
+                pk__in=[post.pk for post in legacy]
+            )
+        }
+        self.assertEqual(len(names), 1)
+        self.assertTrue(self.storage.exists(names.pop()))
+        self.assertEqual(os.listdir(os.path.join(MEDIA_ROOT, 'media')), [])
+        self.assertFalse(
+            os.path.exists(os.path.join(MEDIA_ROOT, 'posts', 'legacy.gif'))
+        )
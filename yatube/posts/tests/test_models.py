@@ -1,6 +1,9 @@
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
 
-from ..models import Group, Post, User
+from ..models import Comment, Follow, Group, Post, User, UserStats
 
 
 class PostsModelsTest(TestCase):
@@ -31,3 +34,38 @@ class PostsModelsTest(TestCase):
         group = PostsModelsTest.group
         expected_object_name = group.title
         self.assertEquals(expected_object_name, str(group))
+
+
+class UserStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUserName')
+        cls.author = User.objects.create_user(username='Author')
+
+    def assert_stats(self, user, **expected):
+        stats = UserStats.objects.get(user=user)
+        for field, value in expected.items():
+            with self.subTest(field=field):
+                self.assertEqual(getattr(stats, field), value)
+
+    def test_counters_follow_creates_and_deletes(self):
+        """Счётчики меняются при создании и удалении объектов."""
+        post = Post.objects.create(text='Тестовый текст', author=self.author)
+        Comment.objects.create(post=post, author=self.user, text='Текст')
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assert_stats(self.author, post_count=1, follower_count=1)
+        self.assert_stats(self.user, comment_count=1, following_count=1)
+        Follow.objects.filter(user=self.user).delete()
+        post.delete()
+        self.assert_stats(self.author, post_count=0, follower_count=0)
+        self.assert_stats(self.user, comment_count=0, following_count=0)
+
+    def test_rebuild_user_stats_command(self):
+        """Команда rebuild_user_stats пересчитывает счётчики с нуля."""
+        Post.objects.create(text='Тестовый текст', author=self.author)
+        Follow.objects.create(user=self.user, author=self.author)
+        UserStats.objects.all().delete()
+        call_command('rebuild_user_stats', stdout=StringIO())
+        self.assert_stats(self.author, post_count=1, follower_count=1)
+        self.assert_stats(self.user, post_count=0, following_count=1)
@@ -0,0 +1,84 @@
+"""
+Тесты плагина posts.pytest_plugin через pytester: проверяемые тесты
+запускаются в отдельном процессе pytest с настройками проекта.
+"""
+import os
+
+import pytest
+
+PROJECT_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+LOOP_TESTS = """
+import pytest
+
+from posts.models import Group
+
+
+def run_loop(times):
+    for pk in range(times):
+        list(Group.objects.filter(pk=pk))
+
+
+@pytest.mark.django_db
+@pytest.mark.max_repeated_queries(5)
+def test_few_queries():
+    run_loop(3)
+
+
+@pytest.mark.django_db
+@pytest.mark.max_repeated_queries(threshold=2)
+def test_loop_queries():
+    run_loop(4)
+
+
+@pytest.mark.django_db
+def test_unmarked_loop():
+    run_loop(4)
+
+
+@pytest.mark.django_db
+def test_fixture(repeated_queries):
+    run_loop(2)
+    with repeated_queries.watch():
+        run_loop(1)
+    repeated_queries.check()
+"""
+
+
+@pytest.fixture
+def project(pytester, monkeypatch):
+    monkeypatch.setenv('PYTHONPATH', PROJECT_DIR)
+    pytester.makeini(
+        '[pytest]\nDJANGO_SETTINGS_MODULE = yatube.settings\n'
+    )
+    pytester.makepyfile(test_loops=LOOP_TESTS)
+    return pytester
+
+
+def run(project, *args):
+    return project.runpytest_subprocess(
+        '-p', 'posts.pytest_plugin', '-p', 'no:cacheprovider', *args
+    )
+
+
+def test_marker_fails_only_repeated_queries(project):
+    result = run(project)
+    result.assert_outcomes(passed=3, failed=1)
+    result.stdout.fnmatch_lines([
+        '*Повторяющиеся запросы (порог 2):*',
+        '4 раз: SELECT * FROM "posts_group" WHERE *',
+        '*FAILED test_loops.py::test_loop_queries*',
+    ])
+
+
+def test_option_applies_to_unmarked_tests(project):
+    result = run(project, '--max-repeated-queries=3')
+    result.assert_outcomes(passed=2, failed=2)
+    result.stdout.fnmatch_lines([
+        '*Повторяющиеся запросы (порог 3):*',
+        '*FAILED test_loops.py::test_unmarked_loop*',
+    ])
+    # маркер сильнее опции: его порог 5 выше трёх повторов
+    assert 'FAILED test_loops.py::test_few_queries' not in result.stdout.str()
@@ -0,0 +1,91 @@
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Post, User
+from ..querycheck import (
+    RepeatedQueriesMiddleware, RepeatedQueriesMixin, RepeatedQueryDetector,
+    fingerprint
+)
+
+
+class RepeatedQueriesTest(RepeatedQueriesMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        authors = [
+            User.objects.create_user(username=f"author{i}") for i in range(8)
+        ]
+        for author in authors:
+            post = Post.objects.create(text="Тестовый пост", author=author)
+            for commenter in authors:
+                Comment.objects.create(
+                    post=post, author=commenter, text="Комментарий"
+                )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_fingerprint_ignores_values(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id = 15 AND name = 'x''y'"),
+            fingerprint("SELECT * FROM t WHERE id = 7 AND name = 'z'"),
+        )
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s)'),
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s)'),
+        )
+
+    def test_loop_query_is_reported_with_call_site(self):
+        detector = RepeatedQueryDetector(threshold=3)
+        with detector.watch():
+            for post in Post.objects.all():
+                post.author.username
+        [(shape, count, sites)] = detector.violations()
+        self.assertIn('FROM "auth_user"', shape)
+        self.assertEqual(count, 8)
+        self.assertIn('test_querycheck.py', sites[0][0])
+        self.assertIn('8 раз', detector.report())
+
+    def test_template_call_site(self):
+        """Запрос из цикла в шаблоне указывает на строку шаблона."""
+        detector = RepeatedQueryDetector(threshold=3)
+        with detector.watch():
+            # комментарии без select_related: автор читается в цикле
+            render_to_string("includes/comments.html", {
+                "comments": Comment.objects.all(),
+            })
+        sites = [
+            site for _, _, shape_sites in detector.violations()
+            for site, _ in shape_sites
+        ]
+        self.assertTrue(any('comments.html' in site for site in sites))
+
+    def test_post_view_has_no_repeated_queries(self):
+        post = Post.objects.first()
+        with self.assertNoRepeatedQueries(threshold=1):
+            self.client.get(
+                reverse("post", args=[post.author.username, post.pk])
+            )
+
+    def test_assert_no_repeated_queries(self):
+        with self.assertRaises(AssertionError):
+            with self.assertNoRepeatedQueries(threshold=3):
+                for post in Post.objects.all():
+                    post.author.username
+        with self.assertNoRepeatedQueries():
+            self.client.get(reverse("index"))
+
+    @override_settings(REPEATED_QUERIES_LOG=True, REPEATED_QUERIES_THRESHOLD=3)
+    def test_middleware_logs_repeated_queries(self):
+        def view(request):
+            return HttpResponse(render_to_string("includes/comments.html", {
+                "comments": Comment.objects.all(),
+            }))
+
+        middleware = RepeatedQueriesMiddleware(view)
+        with self.assertLogs('posts.repeated_queries', 'WARNING') as logs:
+            middleware(RequestFactory().get('/'))
+        self.assertIn('comments.html', logs.output[0])
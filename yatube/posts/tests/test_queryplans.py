@@ -0,0 +1,64 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from ..models import Comment, Group, Post, User
+from ..queryplans import explain, plan_problems
+
+
+class PlanProblemsTest(SimpleTestCase):
+    def test_index_scans_and_searches_pass(self):
+        self.assertEqual(plan_problems([
+            'SCAN posts_post USING INDEX posts_post_pub_date_131c7f8d',
+            'SEARCH posts_post USING INDEX posts_post_author_pub_date '
+            '(author_id=?)',
+            'SCAN CONSTANT ROW',
+        ]), [])
+
+    def test_full_scan_and_temp_sort_fail(self):
+        self.assertEqual(plan_problems([
+            'SCAN posts_post',
+            'SEARCH auth_user USING INTEGER PRIMARY KEY (rowid=?)',
+            'USE TEMP B-TREE FOR ORDER BY',
+        ]), ['SCAN posts_post', 'USE TEMP B-TREE FOR ORDER BY'])
+
+    def test_cursor_page_index_scan_fails(self):
+        scan = 'SCAN posts_post USING INDEX posts_post_pub_date_131c7f8d'
+        self.assertEqual(plan_problems([scan], cursor=True), [scan])
+        self.assertEqual(plan_problems([
+            'SEARCH posts_post USING INDEX posts_post_pub_date_131c7f8d '
+            '(pub_date<?)',
+        ], cursor=True), [])
+
+
+class FeedPlansTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='leo')
+        group = Group.objects.create(title='t', slug='t', description='d')
+        post = Post.objects.create(text='пост', author=author, group=group)
+        Comment.objects.create(post=post, author=author, text='коммент')
+
+    def test_feeds_use_composite_indexes(self):
+        profile = explain(Post.objects.feed().filter(author_id=1)[:10])
+        group = explain(Post.objects.feed().filter(group_id=1)[:10])
+        self.assertTrue(any('posts_post_author_pub_date' in detail
+                            for detail in profile))
+        self.assertTrue(any('posts_post_group_pub_date' in detail
+                            for detail in group))
+        self.assertEqual(plan_problems(profile + group), [])
+
+    def test_comments_count_without_group_by(self):
+        post = Post.objects.feed().get()
+        self.assertEqual(post.comments_count, 1)
+        sql = str(Post.objects.feed().query)
+        self.assertNotIn('GROUP BY', sql)
+
+    def test_command_passes(self):
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertIn('profile: OK', out.getvalue())
+        self.assertIn('comments:next: OK', out.getvalue())
+        self.assertIn('follow:next: OK', out.getvalue())
+        self.assertIn('follow:previous: OK', out.getvalue())
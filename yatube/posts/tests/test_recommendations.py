@@ -0,0 +1,113 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, SimpleTestCase, TestCase
+from django.urls import reverse
+
+from ..models import Follow, Suggestion, User
+from ..recommendations import FollowGraph
+
+
+class FollowGraphTest(SimpleTestCase):
+    def setUp(self):
+        # 1 читает 2 и 3; 2 и 3 читают 4; 5 читает 2 и 6
+        self.graph = FollowGraph([
+            (1, 2), (1, 3), (2, 4), (3, 4), (5, 2), (5, 6), (3, 1),
+        ])
+
+    def node(self, user_id):
+        return list(self.graph.ids).index(user_id)
+
+    def test_adjacency(self):
+        self.assertEqual(len(self.graph), 6)
+        self.assertEqual(self.graph.edges, 7)
+        following = self.graph.following(self.node(1))
+        self.assertEqual(
+            [self.graph.ids[node] for node in following], [2, 3]
+        )
+        followers = self.graph.followers(self.node(2))
+        self.assertEqual(
+            [self.graph.ids[node] for node in followers], [1, 5]
+        )
+
+    def test_scores(self):
+        scores = {
+            self.graph.ids[node]: score
+            for node, score in self.graph.scores(self.node(1)).items()
+        }
+        # 4 читают оба автора пользователя, 6 читает подписчик автора 2;
+        # сам пользователь и его авторы не предлагаются
+        self.assertEqual(set(scores), {4, 6})
+        self.assertGreater(scores[4], scores[6])
+
+
+class SuggestionTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader, cls.writer, cls.star = (
+            User.objects.create_user(username=name)
+            for name in ('reader', 'writer', 'star')
+        )
+        Follow.objects.create(user=cls.writer, author=cls.star)
+
+    def test_follow_updates_suggestions_at_once(self):
+        Follow.objects.create(user=self.reader, author=self.writer)
+        self.assertEqual(
+            [s.author for s in Suggestion.objects.for_user(self.reader)],
+            [self.star]
+        )
+        Follow.objects.filter(user=self.reader, author=self.writer).delete()
+        self.assertEqual(Suggestion.objects.for_user(self.reader), [])
+
+    def test_followed_author_is_not_suggested(self):
+        Follow.objects.create(user=self.reader, author=self.writer)
+        Follow.objects.create(user=self.reader, author=self.star)
+        self.assertFalse(Suggestion.objects.filter(user=self.reader).exists())
+
+    def test_command_recomputes_all_users(self):
+        Follow.objects.create(user=self.reader, author=self.writer)
+        Suggestion.objects.all().delete()
+        out = StringIO()
+        call_command('recommend_follows', stdout=out)
+        self.assertIn('пользователей с рекомендациями: 2', out.getvalue())
+        self.assertEqual(
+            [s.author for s in Suggestion.objects.for_user(self.reader)],
+            [self.star]
+        )
+
+    def test_pages_show_suggestions(self):
+        Follow.objects.create(user=self.reader, author=self.writer)
+        client = Client()
+        client.force_login(self.reader)
+        for url in (
+            reverse('follow_index'),
+            reverse('profile', args=[self.writer.username]),
+        ):
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertEqual(
+                    [s.author for s in response.context['suggestions']],
+                    [self.star]
+                )
+                self.assertContains(response, 'Кого почитать')
+
+    def test_command_refreshes_pages_with_suggestions(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        Follow.objects.create(user=self.reader, author=self.writer)
+        Suggestion.objects.all().delete()
+        client = Client()
+        client.force_login(self.reader)
+        url = reverse('profile', args=[self.writer.username])
+        etag = client.get(url)['ETag']
+        self.assertEqual(
+            client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+        call_command('recommend_follows', stdout=StringIO())
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [s.author for s in response.context['suggestions']],
+            [self.star]
+        )
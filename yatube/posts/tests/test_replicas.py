@@ -0,0 +1,103 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from yatube.database import replica_configs
+
+from ..models import Post
+from ..replicas import (
+    PIN_COOKIE, PIN_SALT, PrimaryPinningMiddleware, ReplicaRouter,
+    copy_database, current_state, read_from_primary
+)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_PIN_SECONDS=5)
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def route(self, request, view):
+        """Вызывает view за middleware и возвращает ответ."""
+        return PrimaryPinningMiddleware(view)(request)
+
+    def test_reads_go_to_replica_and_writes_pin_primary(self):
+        routes = []
+
+        def view(request):
+            routes.append(self.router.db_for_read(Post))
+            routes.append(self.router.db_for_write(Post))
+            routes.append(self.router.db_for_read(Post))
+            return HttpResponse()
+
+        response = self.route(self.factory.post('/new/'), view)
+        self.assertEqual(routes, ['replica1', 'default', 'default'])
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_pinned_session_reads_from_primary(self):
+        request = self.factory.get('/')
+        response = HttpResponse()
+        response.set_signed_cookie(PIN_COOKIE, '1', salt=PIN_SALT)
+        request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        routes = []
+
+        def view(request):
+            routes.append(self.router.db_for_read(Post))
+            return HttpResponse()
+
+        response = self.route(request, view)
+        self.assertEqual(routes, ['default'])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_primary_outside_requests(self):
+        self.assertIsNone(current_state())
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_read_from_primary_block(self):
+        routes = []
+
+        def view(request):
+            with read_from_primary():
+                routes.append(self.router.db_for_read(Post))
+            routes.append(self.router.db_for_read(Post))
+            return HttpResponse()
+
+        self.route(self.factory.get('/'), view)
+        self.assertEqual(routes, ['default', 'replica1'])
+
+    def test_migrations_only_on_primary(self):
+        self.assertTrue(self.router.allow_migrate('default', 'posts'))
+        self.assertFalse(self.router.allow_migrate('replica1', 'posts'))
+
+
+class ReplicaConfigTest(SimpleTestCase):
+    def test_replica_configs(self):
+        primary = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': 'db.sqlite3',
+            'PRAGMAS': {'journal_mode': 'WAL'},
+        }
+        replicas = replica_configs(primary, {'DB_REPLICAS': 'a.db, b.db'})
+        self.assertEqual(list(replicas), ['replica1', 'replica2'])
+        self.assertEqual(replicas['replica2']['NAME'], 'b.db')
+        self.assertEqual(replicas['replica1']['TEST'], {'MIRROR': 'default'})
+        self.assertEqual(replica_configs(primary, {}), {})
+
+    def test_copy_database(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        source = os.path.join(directory, 'primary.sqlite3')
+        target = os.path.join(directory, 'replica.sqlite3')
+        with sqlite3.connect(source) as db:
+            db.execute('CREATE TABLE t (value TEXT)')
+            db.execute("INSERT INTO t VALUES ('пост')")
+        copy_database(source, target)
+        db = sqlite3.connect(target)
+        self.addCleanup(db.close)
+        self.assertEqual(
+            db.execute('SELECT value FROM t').fetchall(), [('пост',)]
+        )
@@ -0,0 +1,73 @@
+from unittest import mock
+
+from django.contrib.admin.sites import site
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+from ..models import Post, User
+from ..search import search_posts, stem
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="TestUserName")
+
+    def setUp(self):
+        self.cats = Post.objects.create(
+            text="Кошки любят спать на солнце", author=self.user
+        )
+        self.dogs = Post.objects.create(
+            text="Собака спала, кошка смотрела на собаку, собака ждала",
+            author=self.user
+        )
+
+    def test_stem(self):
+        """Разные формы слова приводятся к одной основе."""
+        for word in ("кошка", "кошки", "кошками", "кошкам"):
+            with self.subTest(word=word):
+                self.assertEqual(stem(word), "кошк")
+        self.assertEqual(stem("публикациями"), stem("публикация"))
+
+    def test_search_finds_word_forms_and_ranks(self):
+        self.assertEqual(
+            set(search_posts("кошкам")), {self.cats.pk, self.dogs.pk}
+        )
+        self.assertEqual(search_posts("собаки")[0], self.dogs.pk)
+        self.assertEqual(search_posts("кошка солнцем"), [self.cats.pk])
+
+    def test_index_follows_edit_and_delete(self):
+        self.cats.text = "Попугаи любят петь"
+        self.cats.save()
+        self.assertEqual(search_posts("попугай"), [self.cats.pk])
+        self.assertEqual(search_posts("солнце"), [])
+        self.cats.delete()
+        self.assertEqual(search_posts("попугай"), [])
+
+    def test_inverted_index_fallback(self):
+        with mock.patch("posts.search.fts5_available", return_value=False):
+            post = Post.objects.create(
+                text="Хомяки грызут морковку", author=self.user
+            )
+            self.assertEqual(search_posts("хомяк морковки"), [post.pk])
+            self.assertEqual(search_posts("хомяк собака"), [])
+
+    def test_search_page_is_paginated(self):
+        for i in range(12):
+            Post.objects.create(text=f"Кошка номер {i}", author=self.user)
+        response = self.client.get(reverse("search"), {"q": "кошка"})
+        page = response.context["page"]
+        self.assertEqual(len(page), 10)
+        self.assertEqual(page.paginator.count, 14)
+        self.assertContains(
+            response, "?q=%D0%BA%D0%BE%D1%88%D0%BA%D0%B0&amp;page=2"
+        )
+
+    def test_admin_uses_search_index(self):
+        admin = site._registry[Post]
+        request = RequestFactory().get("/", {"q": "собаку"})
+        queryset, use_distinct = admin.get_search_results(
+            request, Post.objects.all(), "собаку"
+        )
+        self.assertEqual(list(queryset), [self.dogs])
@@ -0,0 +1,133 @@
+import os
+import shutil
+import tempfile
+
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import resolve
+
+from ..serving import STATIC_HASHED_NAME, serve
+
+CONTENT = b'0123456789'
+HASHED = 'posts/ab/cd/' + 'abcd' * 16 + '.jpg'
+
+
+@override_settings(SERVE_MAX_AGE=60, SERVE_OFFLOAD=None)
+class ServeTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.root = tempfile.mkdtemp()
+        for name in ('posts/plain.txt', HASHED, 'css/app.0123456789ab.css'):
+            path = os.path.join(cls.root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(CONTENT)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.root, ignore_errors=True)
+        super().tearDownClass()
+
+    def get(self, path, method='get', immutable=None, **headers):
+        request = getattr(RequestFactory(), method)(
+            '/media/' + path, **headers
+        )
+        options = {'immutable': immutable} if immutable else {}
+        return serve(request, path, self.root, '/media/', **options)
+
+    def close(self, response):
+        # response.close() шлёт request_finished, а его обработчик
+        # закрывает соединения с базой, недоступной SimpleTestCase
+        if getattr(response, 'file_to_stream', None) is not None:
+            response.file_to_stream.close()
+
+    def body(self, response):
+        content = b''.join(response.streaming_content)
+        self.close(response)
+        return content
+
+    def test_whole_file(self):
+        response = self.get('posts/plain.txt')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), CONTENT)
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(response['Content-Type'], 'text/plain')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        self.assertTrue(response.has_header('Last-Modified'))
+
+    def test_hashed_names_are_immutable(self):
+        response = self.get(HASHED)
+        self.assertEqual(response['ETag'], '"{}"'.format('abcd' * 16))
+        self.assertIn('immutable', response['Cache-Control'])
+        self.close(response)
+        response = self.get(
+            'css/app.0123456789ab.css', immutable=STATIC_HASHED_NAME
+        )
+        self.assertIn('immutable', response['Cache-Control'])
+        self.close(response)
+
+    def test_conditional_request(self):
+        etag = self.get('posts/plain.txt', 'head')['ETag']
+        response = self.get('posts/plain.txt', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_ranges(self):
+        for header, part, content_range in (
+            ('bytes=2-5', b'2345', 'bytes 2-5/10'),
+            ('bytes=7-', b'789', 'bytes 7-9/10'),
+            ('bytes=-3', b'789', 'bytes 7-9/10'),
+            ('bytes=8-100', b'89', 'bytes 8-9/10'),
+        ):
+            with self.subTest(header=header):
+                response = self.get('posts/plain.txt', HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(self.body(response), part)
+                self.assertEqual(response['Content-Range'], content_range)
+                self.assertEqual(response['Content-Length'], str(len(part)))
+
+    def test_unsatisfiable_range(self):
+        response = self.get('posts/plain.txt', HTTP_RANGE='bytes=10-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_stale_if_range_gets_whole_file(self):
+        response = self.get(
+            'posts/plain.txt', HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"old"'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), CONTENT)
+
+    def test_head_has_no_body(self):
+        response = self.get('posts/plain.txt', 'head')
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['Content-Length'], '10')
+
+    def test_missing_and_outside_paths(self):
+        for path in ('posts/missing.txt', 'posts', '../etc/passwd'):
+            with self.subTest(path=path):
+                with self.assertRaises(Http404):
+                    self.get(path)
+
+    @override_settings(
+        SERVE_OFFLOAD='x-accel-redirect', SERVE_ACCEL_PREFIX='/internal'
+    )
+    def test_accel_redirect(self):
+        response = self.get(HASHED)
+        self.assertEqual(
+            response['X-Accel-Redirect'], '/internal/media/' + HASHED
+        )
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+
+    @override_settings(SERVE_OFFLOAD='x-sendfile')
+    def test_sendfile(self):
+        response = self.get('posts/plain.txt')
+        self.assertEqual(
+            response['X-Sendfile'],
+            os.path.join(self.root, 'posts', 'plain.txt')
+        )
+
+    def test_media_url_is_routed(self):
+        self.assertIs(resolve('/media/' + HASHED).func, serve)
@@ -0,0 +1,96 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Post, User
+from ..thumbnails import cached_thumbnail, generate_thumbnails
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+# через override_settings, а не присваиванием: хранилище sorl должно
+# узнать о новом каталоге, иначе миниатюры попадут в настоящий media
+MEDIA_ROOT = tempfile.mkdtemp(dir=tempfile.gettempdir())
+
+
+@override_settings(THUMBNAIL_ASYNC=False, MEDIA_ROOT=MEDIA_ROOT)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="TestUserName")
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.post = Post.objects.create(
+            text="Пост с картинкой",
+            author=self.user,
+            image=SimpleUploadedFile(
+                name='small.gif', content=SMALL_GIF, content_type='image/gif'
+            ),
+        )
+
+    def test_placeholder_until_thumbnail_is_ready(self):
+        """Лента не строит миниатюру в запросе, а показывает заглушку."""
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, "Изображение обрабатывается")
+        self.assertIsNone(cached_thumbnail(self.post.image))
+
+        self.assertTrue(
+            generate_thumbnails(self.post.image.name, self.post.pk)
+        )
+        thumbnail = cached_thumbnail(self.post.image)
+        self.assertIsNotNone(thumbnail)
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, thumbnail.url)
+        self.assertNotContains(response, "Изображение обрабатывается")
+
+    def test_upload_enqueues_image_processing(self):
+        with mock.patch("posts.views.enqueue_image") as enqueue:
+            self.client.post(reverse("new_post"), {
+                "text": "Новый пост",
+                "image": SimpleUploadedFile(
+                    name='new.gif', content=SMALL_GIF,
+                    content_type='image/gif'
+                ),
+            })
+        post = Post.objects.get(text="Новый пост")
+        self.assertTrue(post.image)
+        enqueue.assert_called_once_with(post)
+
+    def test_edit_without_new_image_does_not_enqueue(self):
+        with mock.patch("posts.views.enqueue_image") as enqueue:
+            self.client.post(
+                reverse("post_edit", args=[self.user.username, self.post.pk]),
+                {"text": "Исправленный текст"}
+            )
+        enqueue.assert_not_called()
+
+    def test_warm_thumbnails_command(self):
+        out = StringIO()
+        call_command("warm_thumbnails", "--workers", "1", stdout=out)
+        self.assertIsNotNone(cached_thumbnail(self.post.image))
+        self.assertIn("Построено миниатюр: 1", out.getvalue())
+
+        out = StringIO()
+        call_command("warm_thumbnails", "--workers", "1", stdout=out)
+        self.assertIn("Построено миниатюр: 0", out.getvalue())
@@ -0,0 +1,122 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..models import Follow, Group, Post, TimelineEntry, User, UserStats
+from ..search import search_posts
+from ..transfer import export_posts, import_posts
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=tempfile.gettempdir())
+
+
+@override_settings(THUMBNAIL_ASYNC=False, MEDIA_ROOT=MEDIA_ROOT)
+class TransferTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(
+            title="Сообщество", slug="group", description="Описание"
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def records(self, *records):
+        return io.StringIO(''.join(
+            json.dumps(record, ensure_ascii=False) + '\n'
+            for record in records
+        ))
+
+    def test_import_updates_derived_data(self):
+        pub_date = timezone.now() - timedelta(days=30)
+        result = import_posts(self.records(
+            {'author': 'author', 'group': 'group', 'text': 'Жёлтая подводная',
+             'pub_date': pub_date.isoformat()},
+            {'author': 'author', 'text': 'Без сообщества'},
+            {'author': 'nobody', 'text': 'Неизвестный автор'},
+            {'author': 'author', 'text': ''},
+        ), batch_size=2)
+        self.assertEqual(result, {
+            'posts': 2, 'skipped': 2, 'missing_images': 0
+        })
+        post = Post.objects.get(group=self.group)
+        self.assertEqual(post.pub_date, pub_date)
+        self.assertEqual(UserStats.objects.get(user=self.author).post_count, 2)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2
+        )
+        self.assertEqual(search_posts('жёлтые'), [post.pk])
+
+    def test_create_missing(self):
+        result = import_posts(self.records(
+            {'author': 'newcomer', 'group': 'new-group', 'text': 'Привет'},
+        ), create_missing=True)
+        self.assertEqual(result['posts'], 1)
+        post = Post.objects.get(text='Привет')
+        self.assertEqual(post.author.username, 'newcomer')
+        self.assertEqual(post.group.slug, 'new-group')
+        self.assertEqual(UserStats.objects.get(user=post.author).post_count, 1)
+
+    def test_round_trip_with_images(self):
+        image = Post.objects.create(
+            text="С картинкой", author=self.author, group=self.group,
+            image=SimpleUploadedFile('pic.gif', b'GIF89a', 'image/gif')
+        ).image.name
+        Post.objects.create(text="Без картинки", author=self.author)
+        exported = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, exported)
+
+        streams = {}
+        for fmt in ('ndjson', 'csv'):
+            streams[fmt] = io.StringIO()
+            result = export_posts(
+                streams[fmt], fmt, chunk_size=1, media_dir=exported
+            )
+            self.assertEqual(result, {'posts': 2, 'missing_images': 0})
+        self.assertTrue(
+            os.path.exists(os.path.join(exported, image))
+        )
+        for fmt, stream in streams.items():
+            with self.subTest(fmt=fmt):
+                stream.seek(0)
+                result = import_posts(stream, fmt, media_dir=exported)
+                self.assertEqual(result['posts'], 2)
+        self.assertEqual(Post.objects.filter(text="С картинкой").count(), 3)
+        # совпадающий файл не копируется заново
+        self.assertEqual(
+            set(Post.objects.values_list('image', flat=True)),
+            {image, ''}
+        )
+
+    def test_rejects_paths_outside_media_dir(self):
+        result = import_posts(self.records(
+            {'author': 'author', 'text': 'Текст', 'image': '../secret.txt'},
+        ), media_dir=MEDIA_ROOT)
+        self.assertEqual(result['missing_images'], 1)
+        self.assertFalse(Post.objects.get(text='Текст').image)
+
+    def test_commands(self):
+        Post.objects.create(text="Выгружаемый пост", author=self.author)
+        path = os.path.join(MEDIA_ROOT, 'posts.ndjson')
+        out = io.StringIO()
+        call_command('export_posts', path, stdout=out)
+        self.assertIn('Выгружено постов: 1', out.getvalue())
+        out = io.StringIO()
+        call_command('import_posts', path, '--batch-size', '10', stdout=out)
+        self.assertIn('Загружено постов: 1', out.getvalue())
+        self.assertEqual(
+            Post.objects.filter(text="Выгружаемый пост").count(), 2
+        )
@@ -0,0 +1,103 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import (
+    Comment, Follow, Group, GroupTrend, Post, PostTrend, User
+)
+from ..trending import event_score, log2_add, trending_posts
+
+
+class DecayTest(SimpleTestCase):
+    def test_log2_add(self):
+        self.assertAlmostEqual(log2_add(3, 3), 4)
+        self.assertAlmostEqual(log2_add(10, 1), 10.0028, places=4)
+        # огромные показатели не переполняются
+        self.assertAlmostEqual(log2_add(1e6, 1e6), 1e6 + 1)
+
+    def test_event_halves_every_half_life(self):
+        now = timezone.now()
+        with self.settings(TRENDING_HALF_LIFE=6):
+            self.assertAlmostEqual(
+                event_score(now, 2) - event_score(now - timedelta(hours=6), 2),
+                1
+            )
+            # два комментария шесть часов назад весят как один сейчас
+            old = event_score(now - timedelta(hours=6), 1)
+            self.assertAlmostEqual(
+                log2_add(old, old), event_score(now, 1)
+            )
+
+
+class TrendingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='leo')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.quiet = Post.objects.create(text='Тихий', author=cls.author)
+        cls.hot = Post.objects.create(
+            text='Обсуждаемый', author=cls.reader, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def discuss(self, post, count):
+        for i in range(count):
+            Comment.objects.create(post=post, author=self.reader, text=i)
+
+    def test_events_update_scores_incrementally(self):
+        before = PostTrend.objects.get(post=self.hot).score
+        self.discuss(self.hot, 2)
+        self.assertGreater(PostTrend.objects.get(post=self.hot).score, before)
+        self.assertEqual(list(trending_posts()), [self.hot, self.quiet])
+        self.assertTrue(GroupTrend.objects.filter(group=self.group).exists())
+
+    def test_follow_boosts_latest_post_of_author(self):
+        before = PostTrend.objects.get(post=self.quiet).score
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertGreater(
+            PostTrend.objects.get(post=self.quiet).score, before
+        )
+
+    def test_recompute_matches_incremental_scores(self):
+        self.discuss(self.hot, 3)
+        Follow.objects.create(user=self.reader, author=self.author)
+        incremental = dict(PostTrend.objects.values_list('post', 'score'))
+        call_command('recompute_trends', stdout=StringIO())
+        recomputed = dict(PostTrend.objects.values_list('post', 'score'))
+        self.assertEqual(incremental.keys(), recomputed.keys())
+        for post_id, score in incremental.items():
+            self.assertAlmostEqual(recomputed[post_id], score)
+
+    def test_recompute_drops_events_outside_window(self):
+        Post.objects.filter(pk=self.quiet.pk).update(
+            pub_date=timezone.now() - timedelta(days=30)
+        )
+        call_command('recompute_trends', stdout=StringIO())
+        self.assertFalse(PostTrend.objects.filter(post=self.quiet).exists())
+
+    def test_trending_page_costs_like_index(self):
+        self.discuss(self.hot, 1)
+        url = reverse('trending')
+        # сессии нет: посты с авторами и сообществами, сообщества
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(
+            list(response.context['posts']), [self.hot, self.quiet]
+        )
+        self.assertEqual(
+            [trend.group for trend in response.context['groups']],
+            [self.group]
+        )
+        # повторный запрос отдаётся из кэша страниц
+        with self.assertNumQueries(0):
+            self.client.get(url)
@@ -1,17 +1,24 @@
 import shutil
 import tempfile
+import time
+from io import StringIO
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.core.cache import cache
 from django import forms
-from django.test import Client, TestCase
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from ..models import Group, Post, User, Follow, Comment
+from ..models import Group, Post, User, Follow, Comment, TimelineEntry
 
 
+@override_settings(THUMBNAIL_ASYNC=False)
 class PostViewsTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -65,6 +72,9 @@ class PostViewsTests(TestCase):
         super().tearDownClass()
 
     def setUp(self):
+        # Страницы лент кэшируются до изменения данных, а тесты
+        # проверяют контекст, которого у закэшированного ответа нет
+        cache.clear()
         # Создаем неавторизованный клиент
         self.guest_client = Client()
         # Создаем второй клтент и авторизируем пользователя
@@ -305,6 +315,9 @@ class PaginatorViewsTest(TestCase):
                 group=cls.group,
             )
 
+    def setUp(self):
+        cache.clear()
+
     def test_first_page_contains_ten_records(self):
         """Проверяет что на первой странице, отображаются 10 постов."""
         paginator_test = (
@@ -336,6 +349,39 @@ class PaginatorViewsTest(TestCase):
                     self.POSTS_COUNT - self.POSTS_PER_PAGE
                 )
 
+    def test_cursor_pages_walk_forward_and_back(self):
+        """Курсорная пагинация отдаёт страницы без пропусков и повторов."""
+        url = reverse("group_posts", args=[self.group.slug])
+        first = self.client.get(url + "?cursor=").context["page"]
+        self.assertEqual(len(first), self.POSTS_PER_PAGE)
+        self.assertFalse(first.has_previous())
+        second = self.client.get(
+            url + f"?cursor={first.next_cursor}"
+        ).context["page"]
+        self.assertEqual(
+            len(second), self.POSTS_COUNT - self.POSTS_PER_PAGE
+        )
+        self.assertFalse(second.has_next())
+        self.assertFalse(
+            {post.pk for post in first} & {post.pk for post in second}
+        )
+        back = self.client.get(
+            url + f"?cursor={second.previous_cursor}"
+        ).context["page"]
+        self.assertEqual(
+            [post.pk for post in back], [post.pk for post in first]
+        )
+
+    def test_cursor_page_skips_count(self):
+        """Курсорная страница не выполняет COUNT(*) по ленте."""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(
+                reverse("group_posts", args=[self.group.slug]) + "?cursor="
+            )
+        self.assertFalse(
+            any("COUNT(*)" in query["sql"] for query in queries)
+        )
+
 
 class FollowViewsTests(TestCase):
     @classmethod
@@ -375,3 +421,462 @@ class FollowViewsTests(TestCase):
         followers_count = Follow.objects.filter(
             user=self.user, author=self.user2).count()
         self.assertEqual(followers_count, 0)
+
+    def follow_page_texts(self):
+        response = self.authorized_client.get(reverse("follow_index"))
+        return [post.text for post in response.context["page"]]
+
+    def test_timeline_follows_subscriptions(self):
+        """
+        Лента подписок пополняется при публикации, дополняется старыми
+        постами при подписке и очищается при отписке.
+        """
+        Post.objects.create(text="До подписки", author=self.user2)
+        self.authorized_client.get(reverse(
+            "profile_follow", kwargs={"username": self.user2}))
+        Post.objects.create(text="После подписки", author=self.user2)
+        self.assertEqual(
+            self.follow_page_texts(), ["После подписки", "До подписки"]
+        )
+        self.authorized_client.get(reverse(
+            "profile_unfollow", kwargs={"username": self.user2}))
+        self.assertEqual(self.follow_page_texts(), [])
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user))
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_popular_author_is_read_without_fan_out(self):
+        """
+        Посты популярного автора не рассылаются, а подтягиваются в ленту
+        при чтении.
+        """
+        Follow.objects.create(user=self.user, author=self.user2)
+        self.assertEqual(self.follow_page_texts(), [])
+        Post.objects.create(text="Популярный пост", author=self.user2)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.follow_page_texts(), ["Популярный пост"])
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 1
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_follow_popular_author_backfills_timeline(self):
+        """Подписка на популярного автора добавляет в ленту его посты."""
+        Post.objects.create(text="Старый пост", author=self.user2)
+        Follow.objects.create(user=self.user, author=self.user2)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 1
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_author_below_limit_keeps_posts(self):
+        """
+        Посты, вышедшие, пока автор был популярен, остаются в лентах
+        подписчиков, когда он опускается ниже порога.
+        """
+        reader = User.objects.create_user(username="Reader")
+        Follow.objects.create(user=self.user, author=self.user2)
+        Follow.objects.create(user=reader, author=self.user2)
+        Post.objects.create(text="Популярный пост", author=self.user2)
+        self.assertFalse(TimelineEntry.objects.exists())
+        Follow.objects.filter(user=reader).delete()
+        self.assertTrue(TimelineEntry.objects.filter(user=self.user).exists())
+        Post.objects.create(text="Обычный пост", author=self.user2)
+        self.assertEqual(
+            self.follow_page_texts(), ["Обычный пост", "Популярный пост"]
+        )
+
+    def test_rebuild_timelines_command(self):
+        """Команда rebuild_timelines восстанавливает ленты по подпискам."""
+        Follow.objects.create(user=self.user, author=self.user2)
+        Post.objects.create(text="Тестовый пост", author=self.user2)
+        TimelineEntry.objects.all().delete()
+        call_command("rebuild_timelines", stdout=StringIO())
+        self.assertEqual(self.follow_page_texts(), ["Тестовый пост"])
+
+
+class FeedQueriesTest(TestCase):
+    """Число запросов ленты не зависит от количества постов на странице."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="TestUser")
+        cls.author = User.objects.create_user(username="Author")
+        cls.group = Group.objects.create(
+            title="Тестовое название",
+            slug="test_slug",
+            description="Тестовое описание",
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def create_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(
+                text=f"Тестовый пост {i}",
+                author=self.author,
+                group=self.group,
+            )
+            Comment.objects.create(post=post, author=self.user, text="Ок")
+
+    def assert_feed_queries(self, url, num):
+        for posts_count in (1, 9):
+            with self.subTest(url=url, posts_count=posts_count):
+                self.create_posts(posts_count)
+                cache.clear()
+                with self.assertNumQueries(num):
+                    self.authorized_client.get(url)
+
+    def test_index_queries(self):
+        self.assert_feed_queries(reverse("index"), 4)
+
+    def test_group_posts_queries(self):
+        self.assert_feed_queries(
+            reverse("group_posts", args=[self.group.slug]), 5
+        )
+
+    def test_profile_queries(self):
+        # последний запрос — рекомендации «кого почитать»
+        self.assert_feed_queries(
+            reverse("profile", args=[self.author.username]), 8
+        )
+
+    def test_follow_index_queries(self):
+        self.assert_feed_queries(reverse("follow_index"), 6)
+
+
+@override_settings(COMMENTS_PER_PAGE=5)
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="TestUser")
+        cls.post = Post.objects.create(text="Пост", author=cls.user)
+        cls.url = reverse("post", args=[cls.user.username, cls.post.pk])
+
+    def setUp(self):
+        cache.clear()
+
+    def add_comments(self, count):
+        for i in range(count):
+            Comment.objects.create(
+                post=self.post,
+                author=User.objects.get_or_create(username=f"reader{i}")[0],
+                text=f"Комментарий {i}",
+            )
+
+    def test_comments_are_paginated_by_cursor(self):
+        self.add_comments(7)
+        response = self.client.get(self.url)
+        page = response.context["comments"]
+        self.assertEqual(
+            [comment.text for comment in page],
+            [f"Комментарий {i}" for i in range(6, 1, -1)]
+        )
+        response = self.client.get(self.url, {"cursor": page.next_cursor})
+        self.assertEqual(
+            [comment.text for comment in response.context["comments"]],
+            ["Комментарий 1", "Комментарий 0"]
+        )
+
+    def test_comment_form_has_no_paginator(self):
+        self.add_comments(7)
+        self.client.force_login(self.user)
+        response = self.client.get(self.url)
+        self.assertContains(response, "Следующая &raquo;", count=1)
+
+    def test_query_count_does_not_depend_on_comments(self):
+        counts = []
+        for count in (1, 5):
+            Comment.objects.all().delete()
+            self.add_comments(count)
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(self.url)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class PostCardCacheTest(TestCase):
+    """Кэш карточки поста сбрасывается при изменении её содержимого."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="TestUser")
+        cls.author = User.objects.create_user(username="Author")
+        cls.group = Group.objects.create(
+            title="Тестовое название",
+            slug="test_slug",
+            description="Тестовое описание",
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            text="Тестовый текст",
+            author=self.author,
+            group=self.group,
+        )
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.url = reverse("profile", args=[self.author.username])
+
+    def get_content(self, client=None):
+        return (client or self.client).get(self.url).content.decode()
+
+    def test_card_is_rendered_from_cache(self):
+        self.get_content()
+        Post.objects.filter(pk=self.post.pk).update(text="Без сигнала")
+        self.assertIn("Тестовый текст", self.get_content())
+
+    def test_post_edit_refreshes_card(self):
+        self.get_content()
+        self.post.text = "Новый текст"
+        self.post.save()
+        self.assertIn("Новый текст", self.get_content())
+
+    def test_comment_refreshes_card(self):
+        self.get_content()
+        Comment.objects.create(post=self.post, author=self.user, text="Ок")
+        self.assertIn("Комментариев: 1", self.get_content())
+
+    def test_group_change_refreshes_card(self):
+        self.get_content()
+        self.group.title = "Новое название"
+        self.group.save()
+        self.assertIn("#Новое название", self.get_content())
+
+    def test_author_rename_refreshes_cards(self):
+        self.assertIn("@Author", self.get_content())
+        self.client.get(reverse("index"))
+        author = User.objects.get(pk=self.author.pk)
+        author.username = "Renamed"
+        author.save()
+        index = self.client.get(reverse("index")).content.decode()
+        self.assertIn("@Renamed", index)
+        self.assertNotIn("@Author", index)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_full_name_change_refreshes_profile(self):
+        self.get_content()
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name = "Лев"
+        author.save()
+        self.assertIn("Лев", self.get_content())
+
+    def test_login_does_not_read_names(self):
+        author = User.objects.get(pk=self.author.pk)
+        with self.assertNumQueries(1):
+            author.save(update_fields=["last_login"])
+
+    def test_edit_button_is_not_cached(self):
+        edit_url = reverse(
+            "post_edit", args=[self.author.username, self.post.id]
+        )
+        self.assertIn(edit_url, self.get_content(self.author_client))
+        self.assertNotIn(edit_url, self.get_content())
+
+
+class FeedCacheTest(TestCase):
+    """Страницы лент сбрасываются событиями, а не по таймеру."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="Author")
+        cls.group = Group.objects.create(
+            title="Тестовое название",
+            slug="test_slug",
+            description="Тестовое описание",
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            text="Первый пост",
+            author=self.author,
+            group=self.group,
+        )
+        self.urls = (
+            reverse("index"),
+            reverse("group_posts", args=[self.group.slug]),
+            reverse("profile", args=[self.author.username]),
+        )
+
+    def get_contents(self):
+        return [
+            self.client.get(url).content.decode() for url in self.urls
+        ]
+
+    def test_unchanged_pages_are_served_from_cache(self):
+        self.get_contents()
+        Post.objects.filter(pk=self.post.pk).update(text="Без сигнала")
+        for content in self.get_contents():
+            self.assertIn("Первый пост", content)
+
+    def test_new_post_is_visible_immediately(self):
+        self.get_contents()
+        Post.objects.create(
+            text="Свежий пост", author=self.author, group=self.group
+        )
+        for content in self.get_contents():
+            self.assertIn("Свежий пост", content)
+
+    def test_stale_page_is_served_while_rebuilding(self):
+        """Пока страницу перестраивает другой воркер, отдаётся старая."""
+        self.get_contents()
+        Post.objects.create(text="Свежий пост", author=self.author)
+        with mock.patch.object(cache, "add", return_value=False):
+            content = self.client.get(reverse("index")).content.decode()
+        self.assertNotIn("Свежий пост", content)
+        content = self.client.get(reverse("index")).content.decode()
+        self.assertIn("Свежий пост", content)
+
+    def test_deleted_post_comments_do_not_reload_post(self):
+        """
+        Каскадное удаление комментариев не читает пост для каждого из
+        них: ленты поста сбрасываются один раз.
+        """
+        def delete_queries(comments_count):
+            post = Post.objects.create(
+                text="Удаляемый пост", author=self.author, group=self.group
+            )
+            for _ in range(comments_count):
+                Comment.objects.create(
+                    post=post, author=self.author, text="Ок"
+                )
+            with CaptureQueriesContext(connection) as queries, \
+                    mock.patch("posts.signals.bump_feeds") as bump_feeds:
+                post.delete()
+            self.assertEqual(bump_feeds.call_count, 1)
+            return len(queries)
+
+        # на комментарий остаётся только уменьшение счётчика автора
+        self.assertEqual(delete_queries(10) - delete_queries(1), 9)
+        for content in self.get_contents():
+            self.assertNotIn("Удаляемый пост", content)
+
+
+class ConditionalGetTest(TestCase):
+    """Ленты и страница поста отвечают 304 на повторный запрос."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="Author")
+        cls.group = Group.objects.create(
+            title="Тестовое название",
+            slug="test_slug",
+            description="Тестовое описание",
+        )
+        cls.post = Post.objects.create(
+            text="Тестовый текст",
+            author=cls.author,
+            group=cls.group,
+        )
+        cls.urls = (
+            reverse("index"),
+            reverse("group_posts", args=[cls.group.slug]),
+            reverse("profile", args=[cls.author.username]),
+            reverse("post", args=[cls.author.username, cls.post.id]),
+        )
+
+    def setUp(self):
+        cache.clear()
+        # первый запрос запоминает время изменения областей
+        for url in self.urls:
+            self.client.get(url)
+        self.clock = time.time()
+
+    def test_matching_etag_skips_rendering(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url)["ETag"]
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.templates, [])
+
+    def later(self):
+        """Часы на пару секунд позже предыдущего действия."""
+        self.clock += 2
+        return mock.patch("time.time", return_value=self.clock)
+
+    def get_later(self, url, **headers):
+        with self.later():
+            return self.client.get(url, **headers)
+
+    def test_not_modified_since_last_change(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                last_modified = self.get_later(url)["Last-Modified"]
+                response = self.get_later(
+                    url, HTTP_IF_MODIFIED_SINCE=last_modified
+                )
+                self.assertEqual(response.status_code, 304)
+
+    def test_no_last_modified_in_the_second_of_change(self):
+        """Пока секунда изменения не прошла, проверяется только ETag."""
+        with mock.patch("time.time", return_value=int(time.time()) + 0.5):
+            Comment.objects.create(
+                post=self.post, author=self.author, text="Комментарий"
+            )
+            for url in self.urls:
+                with self.subTest(url=url):
+                    self.assertFalse(self.client.get(url).has_header(
+                        "Last-Modified"
+                    ))
+
+    def test_edit_and_comment_change_last_modified(self):
+        """
+        Комментарий, его удаление и правка не меняют даты публикации,
+        но сдвигают Last-Modified.
+        """
+        changes = (
+            lambda: Comment.objects.create(
+                post=self.post, author=self.author, text="Комментарий"
+            ),
+            lambda: Comment.objects.filter(post=self.post).delete(),
+            lambda: Post.objects.get(pk=self.post.pk).save(),
+        )
+        for change in changes:
+            last_modified = [
+                self.get_later(url)["Last-Modified"] for url in self.urls
+            ]
+            with self.later():
+                change()
+            for url, value in zip(self.urls, last_modified):
+                with self.subTest(url=url):
+                    response = self.get_later(
+                        url, HTTP_IF_MODIFIED_SINCE=value
+                    )
+                    self.assertEqual(response.status_code, 200)
+
+    def test_post_page_follows_author_card(self):
+        """
+        Карточка автора на странице поста показывает число записей и
+        подписчиков: подписка и новый пост автора меняют ETag.
+        """
+        url = reverse("post", args=[self.author.username, self.post.id])
+        reader = User.objects.create_user(username="Reader")
+        changes = (
+            lambda: Follow.objects.create(user=reader, author=self.author),
+            lambda: Post.objects.create(text="Ещё пост", author=self.author),
+        )
+        for change in changes:
+            etag = self.client.get(url)["ETag"]
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            change()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+
+    def test_comment_changes_etag(self):
+        etags = [self.client.get(url)["ETag"] for url in self.urls]
+        Comment.objects.create(
+            post=self.post, author=self.author, text="Комментарий"
+        )
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
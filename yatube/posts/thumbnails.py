@@ -0,0 +1,186 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from .caching import bump_feeds, bump_post_card, post_scopes
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# размеры, которые заранее готовятся для каждой картинки поста
+CARD_THUMBNAIL = ('960x339', {'crop': 'center', 'upscale': True})
+THUMBNAIL_SIZES = [CARD_THUMBNAIL]
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def _source(image):
+    """Исходная картинка в хранилище поля Post.image."""
+    if isinstance(image, str):
+        return ImageFile(image, Post._meta.get_field('image').storage)
+    return ImageFile(image)
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails'
+            )
+        return _executor
+
+
+def _thumbnail_options(source, options):
+    """Опции в том виде, в каком их дополняет бэкенд sorl."""
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def cached_thumbnail(image, size=CARD_THUMBNAIL):
+    """
+    Готовая миниатюра из хранилища ключей sorl или None. В отличие
+    от тега {% thumbnail %} никогда не строит её в запросе.
+    """
+    if not image:
+        return None
+    geometry, options = size
+    source = _source(image)
+    name = default.backend._get_thumbnail_filename(
+        source, geometry, _thumbnail_options(source, options)
+    )
+    return default.kvstore.get(ImageFile(name, default.storage))
+
+
+def generate_thumbnails(image_name, post_id=None):
+    """
+    Строит все размеры миниатюр картинки. Карточка и ленты поста
+    сбрасываются, чтобы вместо заглушки показалась миниатюра.
+    """
+    try:
+        for geometry, options in THUMBNAIL_SIZES:
+            get_thumbnail(_source(image_name), geometry, **options)
+        # sorl не бросает исключений на битых файлах, поэтому
+        # готовность проверяется по хранилищу ключей
+        if not all(cached_thumbnail(image_name, s) for s in THUMBNAIL_SIZES):
+            return False
+        if post_id is not None:
+            post = (
+                Post.objects.select_related('author', 'group')
+                .filter(pk=post_id).first()
+            )
+            if post is not None:
+                bump_post_card(post.pk)
+                bump_feeds(*post_scopes(post))
+        return True
+    except Exception:
+        logger.exception('Не удалось построить миниатюры %s', image_name)
+        return False
+
+
+def _run_in_worker(image_name, post_id):
+    try:
+        return generate_thumbnails(image_name, post_id)
+    finally:
+        # у каждого потока пула своё соединение с базой
+        connections.close_all()
+
+
+def submit(image_name, function, *args):
+    """
+    Ставит function(*args) для картинки image_name в очередь пула после
+    коммита транзакции. Пока задача не выполнена, повторные постановки
+    той же картинки игнорируются.
+    """
+    def run():
+        try:
+            return function(*args)
+        finally:
+            with _lock:
+                _pending.discard(image_name)
+
+    def run_in_worker():
+        try:
+            return run()
+        finally:
+            connections.close_all()
+
+    def on_commit():
+        with _lock:
+            if image_name in _pending:
+                return
+            _pending.add(image_name)
+        if settings.THUMBNAIL_ASYNC:
+            get_executor().submit(run_in_worker)
+        else:
+            run()
+
+    transaction.on_commit(on_commit)
+
+
+def enqueue_thumbnails(post):
+    """Ставит построение миниатюр картинки поста в очередь пула."""
+    image_name = post.image.name if post.image else None
+    if image_name:
+        submit(image_name, generate_thumbnails, image_name, post.pk)
+
+
+def ensure_thumbnails(post):
+    """
+    Миниатюра карточки поста или None, если она ещё не готова.
+    Неготовая миниатюра ставится в очередь, если исходный файл есть.
+    """
+    # как и тег {% thumbnail %}, ошибки картинки не ломают страницу
+    try:
+        thumbnail = cached_thumbnail(post.image)
+        if thumbnail is None and post.image:
+            if post.image.storage.exists(post.image.name):
+                enqueue_thumbnails(post)
+        return thumbnail
+    except Exception:
+        logger.exception('Не удалось получить миниатюру %s', post.image)
+        return None
+
+
+def backfill_thumbnails(workers=None, force=False):
+    """
+    Строит миниатюры для картинок всех постов параллельно в пуле
+    из workers потоков. Возвращает пару (построено, ошибок).
+    """
+    workers = workers or settings.THUMBNAIL_WORKERS
+    posts = Post.objects.exclude(image='').values_list('pk', 'image')
+    jobs = [
+        (image_name, post_id) for post_id, image_name in posts.iterator()
+        if force or cached_thumbnail(image_name) is None
+    ]
+    if force:
+        for image_name, _ in jobs:
+            default.kvstore.delete_thumbnails(_source(image_name))
+    if workers == 1:
+        results = [generate_thumbnails(*job) for job in jobs]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(
+                executor.map(lambda job: _run_in_worker(*job), jobs)
+            )
+    built = sum(results)
+    return built, len(results) - built
@@ -0,0 +1,277 @@
+import csv
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .caching import GLOBAL_SCOPE, bump_feeds
+from .models import (
+    Group, Post, TimelineEntry, User, UserStats, explicit_dates
+)
+from .search import index_post
+
+FIELDS = ('author', 'group', 'text', 'pub_date', 'image')
+FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+
+
+def detect_format(path, default='ndjson'):
+    return FORMATS.get(os.path.splitext(path)[1].lower(), default)
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def read_records(stream, fmt):
+    """Записи по одной: файл не читается в память целиком."""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def write_records(stream, fmt, records):
+    if fmt == 'csv':
+        csv.DictWriter(stream, FIELDS).writerows(records)
+        return
+    for record in records:
+        stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+class Progress:
+    """
+    Счётчик обработанных записей и скорость для отчёта команды;
+    report вызывается не чаще раза в every секунд.
+    """
+    def __init__(self, report=None, every=1.0):
+        self.report = report
+        self.every = every
+        self.count = 0
+        self.started = self.reported = time.perf_counter()
+
+    def add(self, count):
+        self.count += count
+        now = time.perf_counter()
+        if self.report is not None and now - self.reported >= self.every:
+            self.reported = now
+            self.report(self)
+
+    @property
+    def rate(self):
+        return self.count / max(time.perf_counter() - self.started, 1e-9)
+
+    def __str__(self):
+        return '{} записей, {:.0f} зап/с'.format(self.count, self.rate)
+
+
+def _safe_name(name):
+    """Относительное имя файла без выхода за пределы каталога."""
+    parts = os.path.normpath(name).split(os.sep)
+    return not os.path.isabs(name) and '..' not in parts
+
+
+def _export_image(storage, media_dir, name):
+    target = os.path.join(media_dir, name)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        with storage.open(name) as source, open(target, 'wb') as copy:
+            for chunk in source.chunks():
+                copy.write(chunk)
+    except OSError:
+        return False
+    return True
+
+
+def export_posts(stream, fmt='ndjson', chunk_size=2000, media_dir=None,
+                 workers=4, progress=None):
+    """
+    Выгружает посты в NDJSON или CSV. Строки читаются итератором по
+    chunk_size, поэтому память не зависит от числа постов; картинки
+    при media_dir копируются туда параллельно. Возвращает число
+    записей и число картинок, которые не удалось скопировать.
+    """
+    progress = progress or Progress()
+    storage = Post._meta.get_field('image').storage
+    rows = Post.objects.order_by('pk').values_list(
+        'author__username', 'group__slug', 'text', 'pub_date', 'image'
+    ).iterator(chunk_size=chunk_size)
+    if fmt == 'csv':
+        csv.DictWriter(stream, FIELDS).writeheader()
+    missing = 0
+    with ThreadPoolExecutor(workers) as pool:
+        for batch in batches(rows, chunk_size):
+            records = [dict(zip(FIELDS, row)) for row in batch]
+            for record in records:
+                record['pub_date'] = record['pub_date'].isoformat()
+                record['image'] = record['image'] or None
+            write_records(stream, fmt, records)
+            if media_dir:
+                copied = pool.map(
+                    lambda name: _export_image(storage, media_dir, name),
+                    [record['image'] for record in records if record['image']]
+                )
+                missing += sum(not ok for ok in copied)
+            progress.add(len(records))
+    return {'posts': progress.count, 'missing_images': missing}
+
+
+def _import_image(storage, media_dir, name):
+    """
+    Имя картинки в хранилище. Файл, который там уже есть с тем же
+    размером, повторно не копируется.
+    """
+    if not name or not _safe_name(name):
+        return None
+    if media_dir is None:
+        return name if storage.exists(name) else None
+    source = os.path.join(media_dir, name)
+    if not os.path.isfile(source):
+        return None
+    if storage.exists(name) and storage.size(name) == os.path.getsize(
+        source
+    ):
+        return name
+    with open(source, 'rb') as f:
+        return storage.save(name, File(f))
+
+
+def _create_missing(records, authors, groups):
+    usernames = {record.get('author') for record in records} - {None, ''}
+    slugs = {record.get('group') for record in records} - {None, ''}
+    new_users = usernames - authors.keys()
+    new_groups = slugs - groups.keys()
+    if new_users:
+        password = make_password(None)
+        User.objects.bulk_create(
+            User(username=name, password=password) for name in new_users
+        )
+        authors.update(User.objects.filter(
+            username__in=new_users
+        ).values_list('username', 'pk'))
+        UserStats.objects.bulk_create(
+            UserStats(user_id=authors[name]) for name in new_users
+        )
+    if new_groups:
+        Group.objects.bulk_create(
+            Group(title=slug, slug=slug, description='') for slug in new_groups
+        )
+        groups.update(Group.objects.filter(
+            slug__in=new_groups
+        ).values_list('slug', 'pk'))
+
+
+def _pub_date(value):
+    if not value:
+        return timezone.now()
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(value)
+    if settings.USE_TZ and timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _build_post(record, authors, groups):
+    """Пост по записи или None, если запись не подходит."""
+    author_id = authors.get(record.get('author'))
+    group = record.get('group') or None
+    if author_id is None or not record.get('text'):
+        return None
+    if group is not None and group not in groups:
+        return None
+    try:
+        pub_date = _pub_date(record.get('pub_date'))
+    except ValueError:
+        return None
+    return Post(
+        author_id=author_id,
+        group_id=groups.get(group),
+        text=record['text'],
+        pub_date=pub_date,
+    )
+
+
+def import_posts(stream, fmt='ndjson', batch_size=1000, media_dir=None,
+                 workers=4, create_missing=False, progress=None):
+    """
+    Загружает посты из NDJSON или CSV пакетами по batch_size через
+    bulk_create. Авторы и сообщества ищутся в словарях, загруженных
+    один раз; при create_missing недостающие создаются. Картинки
+    копируются из media_dir параллельно. Сигналы при bulk_create не
+    срабатывают, поэтому счётчики, ленты подписчиков, поисковый
+    индекс и кэш лент обновляются в конце.
+    """
+    progress = progress or Progress()
+    storage = Post._meta.get_field('image').storage
+    authors = dict(User.objects.values_list('username', 'pk'))
+    groups = dict(Group.objects.values_list('slug', 'pk'))
+    last_pk = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+    posted = Counter()
+    skipped = missing = 0
+    with ThreadPoolExecutor(workers) as pool:
+        for batch in batches(read_records(stream, fmt), batch_size):
+            if create_missing:
+                with transaction.atomic():
+                    _create_missing(batch, authors, groups)
+            posts, images = [], []
+            for record in batch:
+                post = _build_post(record, authors, groups)
+                if post is None:
+                    skipped += 1
+                    continue
+                posts.append(post)
+                images.append(record.get('image'))
+            # файлы копируются вне транзакции, чтобы не держать запись
+            names = pool.map(
+                lambda name: _import_image(storage, media_dir, name), images
+            )
+            for post, image, name in zip(posts, images, names):
+                post.image = name
+                if image and name is None:
+                    missing += 1
+            with explicit_dates(Post._meta.get_field('pub_date')):
+                Post.objects.bulk_create(posts)
+            posted.update(post.author_id for post in posts)
+            progress.add(len(batch))
+
+    if posted:
+        refresh_derived(posted, last_pk)
+    return {
+        'posts': sum(posted.values()),
+        'skipped': skipped,
+        'missing_images': missing,
+    }
+
+
+def refresh_derived(posted, last_pk):
+    """
+    То, что при обычной публикации делают сигналы: счётчики авторов,
+    ленты их подписчиков, поисковый индекс и поколение кэша лент.
+    """
+    imported = Post.objects.filter(pk__gt=last_pk)
+    with transaction.atomic():
+        for author_id, count in posted.items():
+            UserStats.objects.bump(author_id, post_count=count)
+        TimelineEntry.objects.rebuild(User.objects.filter(
+            follower__author_id__in=imported.values('author_id')
+        ).distinct())
+    for post in imported.only('pk', 'text').iterator():
+        index_post(post)
+    bump_feeds(GLOBAL_SCOPE)
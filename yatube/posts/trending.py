@@ -0,0 +1,152 @@
+"""
+Тренды: посты и сообщества по затухающей активности.
+
+Событие (новый пост, комментарий, подписка на автора) с весом weight
+в момент t вкладывает weight * 2 ** (t / TRENDING_HALF_LIFE), t в
+часах. Вес хранится как log2 суммы вкладов: числа остаются
+небольшими, порядок по весу совпадает с порядком по затухающей сумме
+в любой момент, и со временем вес не нужно пересчитывать — новые
+события просто «весят» больше старых. Сигналы добавляют события по
+одному, manage.py recompute_trends пересобирает веса по событиям
+последних TRENDING_WINDOW_DAYS дней и убирает устаревшие строки.
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .caching import bump_feeds
+from .models import Comment, Follow, GroupTrend, Post, PostTrend
+
+TRENDING_SCOPE = 'trending'
+# сколько раз повторить запись веса, если его успел изменить другой
+# запрос; пропущенное событие учтёт следующий пересчёт
+CAS_ATTEMPTS = 3
+
+
+def event_score(moment, weight):
+    hours = moment.timestamp() / 3600
+    return math.log2(weight) + hours / settings.TRENDING_HALF_LIFE
+
+
+def log2_add(a, b):
+    """log2(2 ** a + 2 ** b) без переполнения."""
+    high, low = max(a, b), min(a, b)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def _add(model, pk, value):
+    """
+    Прибавляет событие к весу записи: запись меняется, только если вес
+    не изменили с момента чтения (сравнение с прочитанным значением).
+    """
+    for _ in range(CAS_ATTEMPTS):
+        current = model.objects.filter(pk=pk).values_list(
+            'score', flat=True
+        ).first()
+        if current is None:
+            _, created = model.objects.get_or_create(
+                pk=pk, defaults={'score': value}
+            )
+            if created:
+                return
+            continue
+        if model.objects.filter(pk=pk, score=current).update(
+            score=log2_add(current, value)
+        ):
+            return
+
+
+def add_event(post_id, group_id, kind, moment=None):
+    """Учитывает событие kind из TRENDING_WEIGHTS для поста и сообщества."""
+    value = event_score(
+        moment or timezone.now(), settings.TRENDING_WEIGHTS[kind]
+    )
+    if post_id is not None:
+        _add(PostTrend, post_id, value)
+    if group_id is not None:
+        _add(GroupTrend, group_id, value)
+    bump_feeds(TRENDING_SCOPE)
+
+
+def latest_post(author_id):
+    """Пост, которому достаются подписки на автора."""
+    return Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date'
+    ).values_list('pk', 'group_id').first()
+
+
+def trending_posts():
+    # только по весу: так страница читается по индексу весов без
+    # сортировки, а совпадение весов до последнего бита маловероятно
+    return Post.objects.feed().filter(trend__isnull=False).order_by(
+        '-trend__score'
+    )[:settings.TRENDING_POSTS]
+
+
+def hot_groups():
+    return GroupTrend.objects.select_related('group').order_by(
+        '-score'
+    )[:settings.TRENDING_GROUPS]
+
+
+def _events(since):
+    """События окна: тройки (post_id, group_id, вклад)."""
+    weights = settings.TRENDING_WEIGHTS
+    for post_id, group_id, moment in Post.objects.filter(
+        pub_date__gte=since
+    ).values_list('pk', 'group_id', 'pub_date').iterator():
+        yield post_id, group_id, event_score(moment, weights['post'])
+    for post_id, group_id, moment in Comment.objects.filter(
+        created__gte=since
+    ).values_list('post_id', 'post__group_id', 'created').iterator():
+        yield post_id, group_id, event_score(moment, weights['comment'])
+    follows = defaultdict(list)
+    for author_id, moment in Follow.objects.filter(
+        created__gte=since
+    ).values_list('author_id', 'created').iterator():
+        follows[author_id].append(moment)
+    for author_id, moments in follows.items():
+        post = latest_post(author_id)
+        if post is None:
+            continue
+        for moment in moments:
+            yield post + (event_score(moment, weights['follow']),)
+
+
+def _replace(model, column, scores):
+    # строки вставляются без создания объектов модели
+    sql = 'INSERT INTO {} ({}, score) VALUES (%s, %s)'.format(
+        model._meta.db_table, column
+    )
+    model.objects.all().delete()
+    with connections[model.objects.db].cursor() as cursor:
+        cursor.executemany(sql, list(scores.items()))
+
+
+def recompute_trends(now=None):
+    """
+    Пересобирает веса по событиям окна одним проходом и заменяет
+    таблицы трендов в одной транзакции. Возвращает число постов и
+    сообществ в трендах.
+    """
+    since = (now or timezone.now()) - timedelta(
+        days=settings.TRENDING_WINDOW_DAYS
+    )
+    posts, groups = {}, {}
+    for post_id, group_id, value in _events(since):
+        for scores, key in ((posts, post_id), (groups, group_id)):
+            if key is None:
+                continue
+            current = scores.get(key)
+            scores[key] = value if current is None else log2_add(
+                current, value
+            )
+    with transaction.atomic():
+        _replace(PostTrend, 'post_id', posts)
+        _replace(GroupTrend, 'group_id', groups)
+    bump_feeds(TRENDING_SCOPE)
+    return len(posts), len(groups)
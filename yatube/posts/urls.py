@@ -8,6 +8,8 @@ urlpatterns = [
     path('500/', views.server_error, name='error500'),
     path('404/', views.page_not_found, name='error404'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.search, name='search'),
+    path('trending/', views.trending, name='trending'),
     path('group/<slug:slug>/', views.group_posts, name='group_posts'),
     path('<str:username>/', views.profile, name='profile'),
     path('<str:username>/<int:post_id>/', views.post_view, name='post'),
@@ -1,20 +1,33 @@
+from urllib.parse import urlencode
+
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
 
+from .caching import (
+    attach_card_versions, cached_feed, feed_condition, feed_etag
+)
 from .forms import PostForm, CommentForm
-from .models import Group, Post, User, Follow
+from .images import enqueue_image
+from .models import (
+    TIMELINE_POSITION, Group, Post, User, Follow, Suggestion,
+    TimelineEntry, UserStats
+)
+from .paginators import CursorPaginator, comment_position, paginate
+from .search import search_posts
+from .trending import TRENDING_SCOPE, hot_groups, trending_posts
 
 
 @login_required
 def new_post(request):
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     if request.method == 'POST' and form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        enqueue_image(post)
         return redirect('index')
     return render(
         request,
@@ -26,12 +39,12 @@ def new_post(request):
     )
 
 
-@cache_page(20)
+@feed_condition('index')
+@cached_feed('index')
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, settings.POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list = Post.objects.feed()
+    page = paginate(request, post_list)
+    attach_card_versions(page)
     return render(
         request,
         "index.html",
@@ -41,12 +54,27 @@ def index(request):
     )
 
 
+@condition(etag_func=feed_etag(TRENDING_SCOPE))
+@cached_feed(TRENDING_SCOPE)
+def trending(request):
+    posts = attach_card_versions(trending_posts())
+    return render(
+        request,
+        'trending.html',
+        {
+            'posts': posts,
+            'groups': hot_groups(),
+        }
+    )
+
+
+@feed_condition('group:{slug}')
+@cached_feed('group:{slug}')
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = Post.objects.filter(group=group).order_by()
-    page_number = request.GET.get('page')
-    paginator = Paginator(posts, settings.POSTS_PER_PAGE)
-    page = paginator.get_page(page_number)
+    posts = Post.objects.feed().filter(group=group)
+    page = paginate(request, posts)
+    attach_card_versions(page)
     return render(
         request,
         "group.html",
@@ -58,39 +86,56 @@ def group_posts(request, slug):
     )
 
 
+@feed_condition('profile:{username}')
+@cached_feed('profile:{username}')
 def profile(request, username):
     author = get_object_or_404(User, username=username)
     user = request.user
-    posts = Post.objects.filter(author=author)
-    paginator = Paginator(posts, settings.POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    posts = Post.objects.feed().filter(author=author)
+    page = paginate(request, posts)
+    attach_card_versions(page)
     following = user.is_authenticated and (
         Follow.objects.filter(user=user, author=author).exists())
+    stats = UserStats.objects.for_user(author.pk)
     return render(
         request,
         'profile.html',
         {
             "page": page,
             "author": author,
-            "posts_count": author.posts.count(),
+            "stats": stats,
+            "posts_count": stats.post_count,
             "following": following,
+            "suggestions": Suggestion.objects.for_user(user),
         }
     )
 
 
+# карточка автора на странице поста меняется вместе с его профилем
+@feed_condition('post:{post_id}', 'profile:{username}')
 def post_view(request, username, post_id):
-    post = get_object_or_404(Post, author__username=username, pk=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.feed(),
+        author__username=username,
+        pk=post_id
+    )
+    # комментарии страницами по created, автор — в том же запросе
+    comments = CursorPaginator(
+        post.comments.select_related('author'),
+        settings.COMMENTS_PER_PAGE,
+        field='created',
+        key=comment_position,
+    ).get_page(request.GET.get('cursor'))
     author = post.author
-    posts_count = author.posts.count()
+    stats = UserStats.objects.for_user(author.pk)
     form = CommentForm()
     return render(
         request,
         'post.html',
         {
             "post": post,
-            "count": posts_count,
+            "stats": stats,
+            "count": stats.post_count,
             "comments": comments,
             "form": form,
             "author": author,
@@ -98,6 +143,24 @@ def post_view(request, username, post_id):
     )
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(search_posts(query), settings.POSTS_PER_PAGE)
+    page = paginator.get_page(request.GET.get('page'))
+    posts = Post.objects.feed().in_bulk(page.object_list)
+    page.object_list = [posts[pk] for pk in page.object_list if pk in posts]
+    attach_card_versions(page)
+    return render(
+        request,
+        'search.html',
+        {
+            'page': page,
+            'query': query,
+            'page_params': urlencode({'q': query}) + '&',
+        }
+    )
+
+
 @login_required
 def post_edit(request, username, post_id):
     profile = get_object_or_404(User, username=username)
@@ -110,7 +173,13 @@ def post_edit(request, username, post_id):
         instance=post
     )
     if request.method == 'POST' and form.is_valid():
-        form.save()
+        post = form.save(commit=False)
+        if 'image' in form.changed_data:
+            # хеш запишет обработка новой картинки
+            post.image_hash = ''
+        post.save()
+        if 'image' in form.changed_data:
+            enqueue_image(post)
         return redirect(
             'post',
             username=request.user.username,
@@ -150,11 +219,14 @@ def add_comment(request, username, post_id):
 @login_required
 def follow_index(request):
     user = request.user
-    post_list = Post.objects.filter(author__following__user=user)
-    paginator = Paginator(post_list, settings.POSTS_PER_PAGE)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
-    return render(request, "follow.html", {"page": page})
+    TimelineEntry.objects.pull(user)
+    post_list = Post.objects.feed().timeline(user)
+    page = paginate(request, post_list, **TIMELINE_POSITION)
+    attach_card_versions(page)
+    return render(request, "follow.html", {
+        "page": page,
+        "suggestions": Suggestion.objects.for_user(user),
+    })
 
 
 @login_required
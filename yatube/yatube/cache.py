@@ -0,0 +1,53 @@
+"""
+Кэш из переменных окружения.
+
+CACHE_BACKEND: locmem (по умолчанию, у каждого процесса свой кэш),
+sqlite — общий для всех воркеров файл без внешних сервисов, memcached
+(нужен python-memcached) или redis (нужен django-redis); адрес или
+путь — в CACHE_LOCATION. CACHE_LOCAL_ENTRIES > 0 ставит перед общим
+кэшем LRU в памяти процесса на столько записей.
+"""
+import os
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'sqlite': 'posts.cache_backends.SQLiteCache',
+    'memcached': 'django.core.cache.backends.memcached.MemcachedCache',
+    'redis': 'django_redis.cache.RedisCache',
+}
+LOCATIONS = {
+    'locmem': '',
+    'memcached': '127.0.0.1:11211',
+    'redis': 'redis://127.0.0.1:6379/1',
+}
+MAX_ENTRIES = 100000
+
+
+def cache_config(base_dir, environ=os.environ):
+    """Словарь для CACHES по переменным окружения."""
+    backend = environ.get('CACHE_BACKEND', 'locmem')
+    if backend not in BACKENDS:
+        raise ValueError(
+            'CACHE_BACKEND должен быть одним из: {}'.format(
+                ', '.join(BACKENDS)
+            )
+        )
+    location = environ.get('CACHE_LOCATION') or LOCATIONS.get(
+        backend, os.path.join(base_dir, 'cache.sqlite3')
+    )
+    shared = {'BACKEND': BACKENDS[backend], 'LOCATION': location}
+    if backend == 'sqlite':
+        shared['OPTIONS'] = {
+            'MAX_ENTRIES': int(environ.get('CACHE_MAX_ENTRIES', MAX_ENTRIES)),
+        }
+    local_entries = int(environ.get('CACHE_LOCAL_ENTRIES', 0))
+    if not local_entries:
+        return {'default': shared}
+    return {
+        'default': {
+            'BACKEND': 'posts.cache_backends.TwoTierCache',
+            'LOCATION': 'default',
+            'OPTIONS': {'SHARED': 'shared', 'MAX_ENTRIES': local_entries},
+        },
+        'shared': shared,
+    }
@@ -0,0 +1,110 @@
+"""
+Настройки базы из переменных окружения.
+
+DB_ENGINE выбирает профиль: sqlite (по умолчанию) или postgresql
+(нужен psycopg2). Остальные переменные: DB_NAME, DB_USER, DB_PASSWORD,
+DB_HOST, DB_PORT, DB_CONN_MAX_AGE (секунды жизни соединения, 0 —
+новое соединение на каждый запрос) и для SQLite DB_SQLITE_PRAGMAS
+вида "synchronous=FULL,cache_size=-2000".
+
+DB_REPLICAS — реплики для чтения через запятую: файлы SQLite
+(их заполняет manage.py sync_replicas) или хосты PostgreSQL host[:port].
+"""
+import copy
+import os
+
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# WAL пускает читателей параллельно с писателем; synchronous=NORMAL
+# в режиме WAL не теряет целостности и не ждёт fsync на каждой
+# транзакции; busy_timeout ждёт блокировку вместо ошибки
+# "database is locked"
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+CONN_MAX_AGE = 60
+
+ENGINES = {
+    'sqlite': 'django.db.backends.sqlite3',
+    'postgresql': 'django.db.backends.postgresql',
+}
+
+
+def parse_pragmas(value):
+    pragmas = {}
+    for item in value.split(','):
+        if item.strip():
+            name, _, setting = item.partition('=')
+            pragmas[name.strip()] = setting.strip()
+    return pragmas
+
+
+def database_config(base_dir, environ=os.environ):
+    """Словарь для DATABASES['default'] по переменным окружения."""
+    engine = environ.get('DB_ENGINE', 'sqlite')
+    if engine not in ENGINES:
+        raise ValueError(
+            'DB_ENGINE должен быть одним из: {}'.format(', '.join(ENGINES))
+        )
+    config = {
+        'ENGINE': ENGINES[engine],
+        'CONN_MAX_AGE': int(environ.get('DB_CONN_MAX_AGE', CONN_MAX_AGE)),
+    }
+    if engine == 'sqlite':
+        config['NAME'] = environ.get(
+            'DB_NAME', os.path.join(base_dir, 'db.sqlite3')
+        )
+        config['PRAGMAS'] = {
+            **SQLITE_PRAGMAS,
+            **parse_pragmas(environ.get('DB_SQLITE_PRAGMAS', '')),
+        }
+        return config
+    config.update({
+        'NAME': environ.get('DB_NAME', 'yatube'),
+        'USER': environ.get('DB_USER', 'yatube'),
+        'PASSWORD': environ.get('DB_PASSWORD', ''),
+        'HOST': environ.get('DB_HOST', 'localhost'),
+        'PORT': environ.get('DB_PORT', '5432'),
+        'OPTIONS': {
+            'connect_timeout': int(environ.get('DB_CONNECT_TIMEOUT', 5)),
+        },
+    })
+    return config
+
+
+def replica_configs(primary, environ=os.environ):
+    """Базы replica1, replica2... для DATABASES по DB_REPLICAS."""
+    replicas = {}
+    targets = [
+        target.strip() for target in environ.get('DB_REPLICAS', '').split(',')
+        if target.strip()
+    ]
+    for number, target in enumerate(targets, 1):
+        config = copy.deepcopy(primary)
+        if config['ENGINE'] == ENGINES['sqlite']:
+            config['NAME'] = target
+        else:
+            host, _, port = target.partition(':')
+            config['HOST'] = host
+            config['PORT'] = port or config['PORT']
+        # в тестах реплика — та же тестовая база
+        config['TEST'] = {'MIRROR': 'default'}
+        replicas['replica{}'.format(number)] = config
+    return replicas
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    """Прагмы SQLite действуют на соединение: ставим их на каждое."""
+    if connection.vendor != 'sqlite':
+        return
+    # напрямую через драйвер: служебные запросы не должны попадать
+    # в счётчики запросов страниц
+    for name, value in connection.settings_dict.get('PRAGMAS', {}).items():
+        connection.connection.execute('PRAGMA {} = {}'.format(name, value))
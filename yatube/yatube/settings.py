@@ -1,5 +1,8 @@
 import os
 
+from .cache import cache_config
+from .database import database_config, replica_configs
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -40,9 +43,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'posts.instrumentation.RequestTimingMiddleware',
+    'posts.querycheck.RepeatedQueriesMiddleware',
+    'posts.replicas.PrimaryPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    # снимки отдаются после проверки Host и заголовков безопасности
+    'posts.snapshots.SnapshotMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -84,12 +92,18 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# профиль базы задаётся переменными окружения, см. yatube/database.py
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+    'default': database_config(BASE_DIR),
 }
+DATABASES.update(replica_configs(DATABASES['default']))
+
+# чтение в запросах идёт в реплики, запись — в основную базу; после
+# записи сессия REPLICA_PIN_SECONDS секунд читает из основной, чтобы
+# автор сразу увидел свой пост
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['posts.replicas.ReplicaRouter']
+REPLICA_PIN_SECONDS = 5
 
 
 # Password validation
@@ -154,11 +168,140 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
 
 POSTS_PER_PAGE = '10'
-
-
-# подключяем бэкенда кеширования
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+COMMENTS_PER_PAGE = 50
+
+# режим пагинации лент: 'numbered' (?page=N) или 'cursor' (?cursor=...)
+FEED_PAGINATION = 'numbered'
+
+# JSON API: наибольший размер страницы и время, на которое клиенты
+# и прокси могут кэшировать общие ленты
+API_MAX_LIMIT = 100
+API_CACHE_MAX_AGE = 15
+
+# ленты подписок: посты авторов с числом подписчиков не меньше лимита
+# не рассылаются по лентам, а читаются напрямую
+TIMELINE_FANOUT_LIMIT = 1000
+# сколько последних постов автора добавляется в ленту при подписке
+TIMELINE_BACKFILL_LIMIT = 500
+
+# рекомендации «кого почитать»: сколько авторов хранится для
+# пользователя и по скольким последним соседям вершины графа подписок
+# считаются веса (см. posts/recommendations.py)
+SUGGESTIONS_PER_USER = 10
+SUGGESTION_SAMPLE = 50
+
+# тренды: вклад события в вес поста и сообщества убывает вдвое за
+# TRENDING_HALF_LIFE часов; manage.py recompute_trends пересобирает
+# веса по событиям последних TRENDING_WINDOW_DAYS дней
+TRENDING_HALF_LIFE = 6
+TRENDING_WINDOW_DAYS = 3
+TRENDING_WEIGHTS = {'post': 1.0, 'comment': 2.0, 'follow': 1.0}
+TRENDING_POSTS = 20
+TRENDING_GROUPS = 10
+
+# сколько найденных постов отдаёт полнотекстовый поиск
+SEARCH_MAX_RESULTS = 1000
+
+# миниатюры картинок строятся в фоновом пуле потоков; при False —
+# сразу после коммита в том же процессе
+THUMBNAIL_ASYNC = True
+THUMBNAIL_WORKERS = 2
+
+# загруженные картинки перекодируются в том же пуле: большая сторона
+# не больше IMAGE_MAX_SIZE точек, формат JPEG (прогрессивный) или WEBP
+# (если Pillow собран с его поддержкой), качество IMAGE_QUALITY
+IMAGE_MAX_SIZE = 1920
+IMAGE_FORMAT = 'JPEG'
+IMAGE_QUALITY = 85
+
+# картинки хранятся по хешу содержимого; файл без ссылок удаляется не
+# раньше MEDIA_GC_GRACE секунд после последнего сохранения, остальное
+# периодически убирает manage.py dedup_media
+MEDIA_GC_GRACE = 60 * 60
+
+# раздача /media/ и /static/ самим приложением: файлы с хешем
+# содержимого в имени кэшируются на год (immutable), остальные — на
+# SERVE_MAX_AGE секунд с проверкой по ETag; SERVE_OFFLOAD отдаёт
+# отправку файла фронтовому серверу: 'x-accel-redirect' (nginx,
+# внутренний location SERVE_ACCEL_PREFIX + URL файла) или 'x-sendfile'
+SERVE_FILES = True
+SERVE_MAX_AGE = 60 * 60
+SERVE_OFFLOAD = None
+SERVE_ACCEL_PREFIX = '/internal'
+
+
+# подключяем бэкенда кеширования; профиль задаётся переменными
+# окружения, см. yatube/cache.py
+CACHES = cache_config(BASE_DIR)
+
+# страницы лент живут в кэше до изменения содержимого, но не дольше
+# FEED_CACHE_TIMEOUT секунд; перестройку страницы выполняет один воркер
+FEED_CACHE_TIMEOUT = 60 * 10
+FEED_CACHE_LOCK_TIMEOUT = 10
+FEED_CACHE_LOCK_WAIT = 0.5
+
+# снимки горячих страниц для анонимов: первые страницы главной,
+# SNAPSHOT_GROUPS крупнейших сообществ и SNAPSHOT_PROFILES авторов с
+# наибольшим числом подписчиков; снимок живёт до изменения ленты, но
+# не дольше SNAPSHOT_TIMEOUT секунд; SNAPSHOT_HOST — хост, от имени
+# которого manage.py regenerate_snapshots запрашивает страницы
+SNAPSHOTS_ENABLED = True
+SNAPSHOT_GROUPS = 10
+SNAPSHOT_PROFILES = 10
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+SNAPSHOT_HOST = 'localhost'
+
+# замер запросов: доля запросов, для которых считаются SQL, шаблоны и
+# кэш (0 — замер выключен); бюджеты вьюх в миллисекундах по имени
+# маршрута, запросы дольше бюджета пишутся в журнал медленных запросов
+REQUEST_TIMING_SAMPLE_RATE = 0
+REQUEST_TIMING_DEFAULT_BUDGET = 500
+REQUEST_TIMING_BUDGETS = {
+    'index': 200,
+    'group_posts': 200,
+    'profile': 200,
+    'post': 200,
+    'follow_index': 200,
+}
+SLOW_REQUEST_LOG = os.path.join(BASE_DIR, 'slow_requests.log')
+
+# поиск N+1: шаблон SQL-запроса, выполненный больше порога раз за
+# запрос или тест, считается повтором; REPEATED_QUERIES_LOG включает
+# запись таких запросов в журнал (для стейджинга)
+REPEATED_QUERIES_THRESHOLD = 5
+REPEATED_QUERIES_LOG = False
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'posts.instrumentation.JsonFormatter',
+        },
+    },
+    'handlers': {
+        'slow_requests': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_REQUEST_LOG,
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+            'formatter': 'json',
+        },
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'posts.slow_requests': {
+            'handlers': ['slow_requests'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        'posts.repeated_queries': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
 }
@@ -17,7 +17,8 @@ from django.contrib import admin
 from django.urls import include, path
 from django.conf.urls import handler404, handler500
 from django.conf import settings
-from django.conf.urls.static import static
+
+from posts.serving import STATIC_HASHED_NAME, file_urls
 
 handler404 = "posts.views.page_not_found"  # noqa
 handler500 = "posts.views.server_error"  # noqa
@@ -26,6 +27,7 @@ urlpatterns = [
     path('about/', include('about.urls', namespace='about')),
     path('auth/', include('django.contrib.auth.urls')),
     path('auth/', include('users.urls')),
+    path('api/v1/', include('posts.api_urls', namespace='api')),
     path('', include('posts.urls')),
     path('admin/my-admin/', admin.site.urls),
     path('group/<slug>/', include('posts.urls')),
@@ -35,11 +37,11 @@ if settings.DEBUG:
     import debug_toolbar
 
     urlpatterns += (path("__debug__/", include(debug_toolbar.urls)),)
-    urlpatterns += static(
-        settings.MEDIA_URL,
-        document_root=settings.MEDIA_ROOT
-    )
-    urlpatterns += static(
+
+if settings.SERVE_FILES:
+    urlpatterns += file_urls(settings.MEDIA_URL, settings.MEDIA_ROOT)
+    urlpatterns += file_urls(
         settings.STATIC_URL,
-        document_root=settings.STATIC_ROOT
+        settings.STATIC_ROOT,
+        immutable=STATIC_HASHED_NAME
     )